@@ -0,0 +1 @@
+"""Reproducible throughput and latency benchmarks: `python -m benchmarks --help`."""
@@ -0,0 +1,80 @@
+"""Run the benchmark suites, write JSON results and compare them with a stored baseline.
+
+    python -m benchmarks                               # all suites, in-process fakes
+    python -m benchmarks --suites api --concurrency 64
+    python -m benchmarks --save-baseline               # record benchmarks/baseline.json
+    python -m benchmarks --backend real                # clients/pipeline against the configured databases
+
+Exits 1 when a compared metric is worse than the baseline by more than `--tolerance`.
+"""
+import os
+import sys
+
+import click
+
+from . import bench_api, bench_clients, bench_pipeline
+from .fakes import close_clients, fake_clients, real_clients
+from .harness import compare, format_comparison, load_report, make_report, write_report
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SUITES = ('clients', 'pipeline', 'api')
+
+
+@click.command()
+@click.option('--suites', default=','.join(SUITES), show_default=True, help='Comma-separated suites to run')
+@click.option('--backend', type=click.Choice(['fake', 'real']), default='fake', show_default=True,
+              help='Database stand-ins for the clients and pipeline suites')
+@click.option('--rows', default=20000, show_default=True, help='Rows per client write benchmark')
+@click.option('--fields', default=20, show_default=True, help='Fields in the generated pipeline dataset')
+@click.option('--periods', default=500, show_default=True, help='Readings per field and metric in the pipeline dataset')
+@click.option('--requests', default=500, show_default=True, help='Requests per API endpoint')
+@click.option('--concurrency', default=16, show_default=True, help='Concurrent API clients')
+@click.option('--repeat', default=5, show_default=True, help='Runs per benchmark; the fastest is kept')
+@click.option('--out', default=os.path.join(HERE, 'results', 'latest.json'), show_default=True)
+@click.option('--baseline', default=os.path.join(HERE, 'baseline.json'), show_default=True)
+@click.option('--save-baseline', is_flag=True, help='Also write the results as the new baseline')
+@click.option('--tolerance', default=0.25, show_default=True, help='Allowed fractional slowdown before failing')
+def main(suites, backend, rows, fields, periods, requests, concurrency, repeat, out, baseline, save_baseline, tolerance):
+    suites = [s.strip() for s in suites.split(',') if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        raise click.BadParameter(f"unknown suites {sorted(unknown)}; expected {', '.join(SUITES)}")
+    make_clients = fake_clients if backend == 'fake' else real_clients
+    results = {}
+    if 'clients' in suites:
+        clients = make_clients()
+        try:
+            results.update(bench_clients.run(clients, rows=rows, repeat=repeat))
+        finally:
+            close_clients(clients)
+    if 'pipeline' in suites:
+        results.update(bench_pipeline.run(make_clients, fields=fields, periods=periods, repeat=repeat))
+    if 'api' in suites:
+        results.update(bench_api.run(requests=requests, concurrency=concurrency, repeat=repeat))
+
+    params = {'suites': suites, 'backend': backend, 'rows': rows, 'fields': fields, 'periods': periods,
+              'requests': requests, 'concurrency': concurrency, 'repeat': repeat}
+    report = make_report(results, params)
+    write_report(report, out)
+    click.echo(f"results written to {out}")
+    for name, metrics in sorted(results.items()):
+        click.echo(f"{name:<44} " + '  '.join(f"{k}={v}" for k, v in metrics.items()))
+
+    status = 0
+    if os.path.exists(baseline) and not save_baseline:
+        base = load_report(baseline)
+        if base['meta'].get('params') != params:
+            click.echo(f"note: baseline was recorded with different parameters: {base['meta'].get('params')}")
+        rows_ = compare(report, base, tolerance=tolerance)
+        click.echo(f"\ncompared with {baseline} (commit {base['meta'].get('commit')}):")
+        click.echo(format_comparison(rows_))
+        if any(r['regressed'] for r in rows_):
+            status = 1
+    if save_baseline:
+        write_report(report, baseline)
+        click.echo(f"baseline written to {baseline}")
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Latency percentiles of the `src/api.py` endpoints under concurrent requests.
+
+The app runs in-process behind httpx's ASGI transport with its lifespan started, so the numbers
+cover routing, validation, the handlers and serialization. With no database configured the
+handlers answer from the sample data and the in-memory ingest queue; set MONGO_URI etc. (e.g.
+to the docker-compose containers) to include the database round trips. The SSE alert stream is
+a long-lived response and is not timed here.
+"""
+import asyncio
+import contextlib
+import io
+import logging
+import time
+
+from src.columnar import MEDIA_TYPE
+
+from .harness import latency_summary
+
+SENSOR_ROWS = [{'field_id': 'field_bench', 'sensor_ts': f'2025-06-01T{h:02d}:00:00Z', 'sensor_id': 'sensor_soil_moisture',
+                'metric_type': 'soil_moisture', 'metric_value': 15.0 + h, 'quality_flag': 0} for h in range(24)]
+FIELD = {'_id': 'field_bench', 'farm_id': 'farm_bench', 'name': 'Bench Field',
+         'boundary': {'type': 'Polygon', 'coordinates': [[[0, 0], [0, 0.01], [0.01, 0.01], [0.01, 0], [0, 0]]]}}
+
+# (name, method, path, options passed to httpx)
+ENDPOINTS = [
+    ('GET /health', 'GET', '/health', {}),
+    ('GET /api/fields', 'GET', '/api/fields', {}),
+    ('GET /api/fields ndjson', 'GET', '/api/fields', {'headers': {'Accept': 'application/x-ndjson'}}),
+    ('GET /api/fields page', 'GET', '/api/fields?limit=2&projection=-boundary', {}),
+    ('GET /api/fields/{id}', 'GET', '/api/fields/field_1', {}),
+    ('GET /api/fields/near', 'GET', '/api/fields/near?lng=0.025&lat=0.015&radius=2000', {}),
+    ('GET /api/fields/within', 'GET', '/api/fields/within?bbox=-0.02,-0.02,0.05,0.04', {}),
+    ('GET /api/fields/{id}/timeseries', 'GET', '/api/fields/field_1/timeseries?periods=48', {}),
+    ('GET /api/fields/{id}/timeseries columnar', 'GET', '/api/fields/field_1/timeseries?periods=48',
+     {'headers': {'Accept': MEDIA_TYPE}}),
+    ('GET /api/fields/{id}/timeseries hour', 'GET', '/api/fields/field_1/timeseries?resolution=hour', {}),
+    ('POST /api/fields', 'POST', '/api/fields', {'json': FIELD}),
+    ('POST /api/fields/{id}/ingest-sensors', 'POST', '/api/fields/field_bench/ingest-sensors', {'json': SENSOR_ROWS}),
+]
+
+
+async def _hammer(client, method, path, options, requests: int, concurrency: int):
+    samples, errors = [], 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            resp = await client.request(method, path, **options)
+            await resp.aread()
+            samples.append(time.perf_counter() - t0)
+            if resp.status_code >= 400:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    return samples, errors, wall
+
+
+async def _run(requests: int, concurrency: int, endpoints, repeat: int) -> dict:
+    import httpx
+    from src.api import app
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            for name, method, path, options in endpoints:
+                # warm caches and lazily created clients before timing
+                await client.request(method, path, **options)
+                best = None
+                for _ in range(repeat):
+                    samples, errors, wall = await _hammer(client, method, path, options, requests, concurrency)
+                    result = {**latency_summary(samples), 'errors': errors,
+                              'requests_per_sec': round(len(samples) / wall, 1) if wall else 0.0}
+                    if best is None or result['p95_ms'] < best['p95_ms']:
+                        best = result
+                results[f'api.{name}'] = best
+    return results
+
+
+def run(requests: int=500, concurrency: int=16, repeat: int=3, endpoints=ENDPOINTS, quiet: bool=True) -> dict:
+    """`requests` per endpoint spread over `concurrency` concurrent clients, keeping the run with the lowest p95.
+
+    Dry-run and request logging is muted.
+    """
+    if not quiet:
+        return asyncio.run(_run(requests, concurrency, endpoints, repeat))
+    logging.disable(logging.INFO)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return asyncio.run(_run(requests, concurrency, endpoints, repeat))
+    finally:
+        logging.disable(logging.NOTSET)
@@ -0,0 +1,61 @@
+"""Rows/sec through each client wrapper's write path."""
+from datetime import datetime, timedelta
+
+from src.generator import SENSORS
+from src.rollups import ROLLUP_TABLES, rollup_partials
+
+from .harness import best_rate
+
+
+def sensor_rows(n: int, fields: int=50, start: datetime=datetime(2025, 1, 1)) -> list:
+    """`n` sensor rows spread over `fields` fields and every metric, hourly, oldest first."""
+    rows = []
+    for i in range(n):
+        step, metric = divmod(i, len(SENSORS))
+        rows.append({
+            'field_id': f'field_{step % fields + 1}',
+            'sensor_ts': (start + timedelta(hours=step // fields)).isoformat(),
+            'sensor_id': f'sensor_{SENSORS[metric]}',
+            'metric_type': SENSORS[metric],
+            'metric_value': 5.0 + (i * 7919 % 1000) / 40.0,
+            'quality_flag': 0,
+        })
+    return rows
+
+
+def run(clients: dict, rows: int=20000, repeat: int=3) -> dict:
+    data = sensor_rows(rows)
+    cass, mongo, redis, neo4j = clients['cassandra'], clients['mongo'], clients['redis'], clients['neo4j']
+    hourly = rollup_partials(data, 'hour')
+
+    def cassandra_rows():
+        return cass.insert_sensor_rows('sensor_data_by_field', data, ttl=7776000)
+
+    def cassandra_rollups():
+        cass.merge_rollups(ROLLUP_TABLES['hour'], hourly)
+        return len(data)
+
+    def mongo_latest():
+        mongo.update_latest_metrics_many('pasture', data)
+        return len(data)
+
+    def redis_batch():
+        with redis.batch() as b:
+            for r in data:
+                b.hset_latest(r['field_id'], {f"latest_{r['metric_type']}": r['metric_value']})
+        return len(data)
+
+    def neo4j_events():
+        with neo4j.event_batch() as b:
+            for r in data:
+                b.add_event(r['field_id'], r['metric_type'], {'value': r['metric_value'], 'ts': r['sensor_ts']})
+        return len(data)
+
+    benches = {
+        'clients.cassandra.insert_sensor_rows': cassandra_rows,
+        'clients.cassandra.merge_rollups_hour': cassandra_rollups,
+        'clients.mongo.update_latest_metrics_many': mongo_latest,
+        'clients.redis.batch_hset_latest': redis_batch,
+        'clients.neo4j.event_batch': neo4j_events,
+    }
+    return {name: best_rate(fn, repeat) for name, fn in benches.items()}
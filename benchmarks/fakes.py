@@ -0,0 +1,208 @@
+"""In-process stand-ins for the database drivers, so the benchmarks time our code, not a server.
+
+Each fake accepts the calls the client wrappers make and keeps just enough state to answer the
+reads they depend on (rollup rows for the compare-and-merge, alert state hashes). `fake_clients`
+returns sync wrappers wired to them; `real_clients` returns wrappers for the databases configured
+in the environment (e.g. the docker-compose containers) for end-to-end numbers.
+"""
+import os
+
+from src.clients.cassandra_client import CassandraClientWrapper
+from src.clients.mongo_client import MongoClientWrapper
+from src.clients.neo4j_client import Neo4jClientWrapper
+from src.clients.redis_client import RedisClientWrapper
+
+
+class _Result:
+    def __init__(self, rows):
+        self.current_rows = rows
+        self.paging_state = None
+
+
+class _Future:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+
+    def result(self):
+        return _Result(self.rows)
+
+    def add_callbacks(self, callback, errback):
+        callback(self.rows)
+
+
+class _RollupRow:
+    def __init__(self, values):
+        (self.value_count, self.value_sum, self.value_min, self.value_max, self.value_last, self.last_ts,
+         self.readings) = values
+
+
+class FakeCassandraSession:
+    """Accepts inserts and applies the rollup SELECT / INSERT IF NOT EXISTS / UPDATE IF statements."""
+
+    def __init__(self):
+        self.rollups = {}
+        self.writes = 0
+
+    def prepare(self, q):
+        return q
+
+    def execute(self, stmt, params=None):
+        return _Result([])
+
+    def execute_async(self, stmt, params=None):
+        q = stmt if isinstance(stmt, str) else ''
+        if q.startswith('SELECT'):
+            values = self.rollups.get(params)
+            return _Future([_RollupRow(values)] if values else [])
+        if q.endswith('IF NOT EXISTS'):
+            key, values = params[:3], params[3:]
+            applied = key not in self.rollups
+            if applied:
+                self.rollups[key] = values
+            return _Future([(applied,)])
+        if ' IF value_count=' in q:
+            values, key, expected = params[:7], params[7:10], params[10]
+            applied = self.rollups[key][0] == expected
+            if applied:
+                # readings=readings+? appends the fresh ids
+                self.rollups[key] = values[:6] + (set(self.rollups[key][6] or ()) | values[6],)
+            return _Future([(applied,)])
+        self.writes += 1
+        return _Future()
+
+
+class FakeRedisPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def hset(self, key, mapping=None):
+        self.commands.append(('hset', key, mapping))
+
+    def hgetall(self, key):
+        self.commands.append(('hgetall', key, None))
+
+    def xadd(self, stream, body, **options):
+        self.commands.append(('xadd', stream, body))
+
+    def execute(self):
+        out = [self.redis.apply(*command) for command in self.commands]
+        self.commands = []
+        return out
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.stream_length = 0
+        self.connection_pool = self
+
+    def close(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def pipeline(self, transaction=False):
+        return FakeRedisPipeline(self)
+
+    def apply(self, op, key, mapping):
+        if op == 'hset':
+            self.hashes.setdefault(key, {}).update(mapping)
+            return len(mapping)
+        if op == 'hgetall':
+            return dict(self.hashes.get(key, {}))
+        self.stream_length += 1
+        return f'{self.stream_length}-0'
+
+    def hset(self, key, mapping=None):
+        return self.apply('hset', key, mapping)
+
+    def xadd(self, stream, body, **options):
+        return self.apply('xadd', stream, body)
+
+
+class FakeMongoCollection:
+    def __init__(self):
+        self.operations = 0
+
+    def bulk_write(self, requests, ordered=True):
+        self.operations += len(requests)
+
+
+class FakeMongoDb:
+    def __init__(self):
+        self.fields = FakeMongoCollection()
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+class FakeMongoClient:
+    def __init__(self):
+        self.db = FakeMongoDb()
+
+    def __getitem__(self, name):
+        return self.db
+
+    def close(self):
+        pass
+
+
+class _FakeNeo4jTx:
+    def run(self, query, **params):
+        return self
+
+    def consume(self):
+        return None
+
+
+class _FakeNeo4jSession:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, fn, *args):
+        return fn(_FakeNeo4jTx(), *args)
+
+
+class FakeNeo4jDriver:
+    def session(self):
+        return _FakeNeo4jSession()
+
+    def close(self):
+        pass
+
+
+def fake_clients() -> dict:
+    """`{name: wrapper}` for cassandra, mongo, redis and neo4j, each backed by a fake driver."""
+    cass = CassandraClientWrapper(dry_run=True)
+    cass.session = FakeCassandraSession()
+    mongo = MongoClientWrapper(dry_run=True)
+    mongo.client = FakeMongoClient()
+    redis = RedisClientWrapper(dry_run=True)
+    redis.client = FakeRedis()
+    neo4j = Neo4jClientWrapper(dry_run=True)
+    neo4j.driver = FakeNeo4jDriver()
+    wrappers = {'cassandra': cass, 'mongo': mongo, 'redis': redis, 'neo4j': neo4j}
+    for wrapper in wrappers.values():
+        # constructed dry-run so no connection is attempted, then switched to the fake driver
+        wrapper.dry_run = False
+    return wrappers
+
+
+def real_clients() -> dict:
+    """Wrappers for the databases configured in the environment (MONGO_URI, REDIS_URL, ...)."""
+    return {
+        'cassandra': CassandraClientWrapper(keyspace=os.getenv('CASSANDRA_KEYSPACE', 'pasture'), dry_run=False),
+        'mongo': MongoClientWrapper(dry_run=False),
+        'redis': RedisClientWrapper(dry_run=False),
+        'neo4j': Neo4jClientWrapper(dry_run=False),
+    }
+
+
+def close_clients(clients: dict):
+    for wrapper in clients.values():
+        wrapper.close()
@@ -0,0 +1,122 @@
+"""Timing helpers and the JSON results / baseline comparison shared by the benchmark suites.
+
+A results file is `{"meta": {...}, "results": {name: {metric: value}}}`. Metrics ending in
+`_per_sec` are better when higher; metrics ending in `_ms` or `_seconds` are better when lower.
+Other metrics (row counts, error counts, the slowest request) are recorded but not compared.
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+HIGHER_IS_BETTER = ('_per_sec',)
+LOWER_IS_BETTER = ('_ms', '_seconds')
+# a single slow request decides it, so it is too noisy to fail a run on
+NOT_COMPARED = ('max_ms',)
+
+
+def percentile(sorted_samples: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted samples; 0.0 when there are none."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def latency_summary(samples: List[float]) -> dict:
+    """p50/p95/p99/max in milliseconds from per-request durations in seconds."""
+    ordered = sorted(samples)
+    return {
+        'requests': len(ordered),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def best_rate(fn: Callable[[], int], repeat: int=3) -> dict:
+    """Run `fn` (returning the number of rows it handled) `repeat` times and keep the fastest run."""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = fn()
+        seconds = time.perf_counter() - t0
+        if best is None or seconds < best[1]:
+            best = (rows, seconds)
+    rows, seconds = best
+    return {'rows': rows, 'seconds': round(seconds, 4), 'rows_per_sec': round(rows / seconds, 1) if seconds else 0.0}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def make_report(results: Dict[str, dict], params: dict) -> dict:
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'params': params,
+        },
+        'results': results,
+    }
+
+
+def write_report(report: dict, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+        fh.write('\n')
+
+
+def load_report(path: str) -> dict:
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _direction(metric: str) -> int:
+    if metric in NOT_COMPARED:
+        return 0
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(current: dict, baseline: dict, tolerance: float=0.15) -> List[dict]:
+    """One row per metric present in both reports; `regressed` when worse than `tolerance` (a fraction)."""
+    rows = []
+    for name, metrics in sorted(current['results'].items()):
+        base = baseline['results'].get(name, {})
+        for metric, value in sorted(metrics.items()):
+            direction = _direction(metric)
+            old = base.get(metric)
+            if not direction or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            rows.append({'name': name, 'metric': metric, 'baseline': old, 'current': value,
+                         'change': round(change, 4), 'regressed': change * direction < -tolerance})
+    return rows
+
+
+def format_comparison(rows: List[dict]) -> str:
+    lines = []
+    for r in rows:
+        flag = 'REGRESSED' if r['regressed'] else ''
+        lines.append(f"{r['name']:<44} {r['metric']:<13} {r['baseline']:>12} -> {r['current']:>12} "
+                     f"{r['change']:+8.1%} {flag}")
+    return '\n'.join(lines)
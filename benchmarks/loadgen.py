@@ -0,0 +1,214 @@
+"""Closed-loop load driver for `POST /api/fields/{id}/ingest-sensors`.
+
+    python -m benchmarks.loadgen --url http://localhost:8000 --gateways 200 --rate 5000 --duration 60
+    python -m benchmarks.loadgen --url http://localhost:8000 --gateways 200 --rate 1000 --ramp
+
+Each simulated field gateway owns one field and POSTs a batch of `--readings` timestamps (every
+metric) on a fixed schedule, so together they offer `--rate` rows/sec. A gateway waits for each
+response before its next send (closed loop): when the API slows down the gateways fall behind
+their schedule and the achieved rate drops below the target instead of piling up requests.
+Batches refused with 429 are counted and dropped. All gateways share one HTTP client whose
+keep-alive pool is capped at `--connections`.
+
+`--ramp` multiplies the rate by `--ramp-factor` for each `--duration` step until a step misses
+its target by more than `--slack`, is throttled or errors on more than `--max-error-rate` of its
+requests, or its p99 latency passes `--max-p99-ms`; the last step that kept up is the
+saturation point.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import click
+
+from src.generator import SENSORS, generate_sensor_series
+
+from .harness import latency_summary, make_report, write_report
+
+# upper bounds in milliseconds; the last bucket holds everything slower
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def histogram(samples: List[float], buckets=HISTOGRAM_BUCKETS_MS) -> dict:
+    """Request counts per latency bucket, keyed `le_<ms>` plus `gt_<last>`, from durations in seconds."""
+    counts = [0] * (len(buckets) + 1)
+    for s in samples:
+        ms = s * 1000
+        i = 0
+        while i < len(buckets) and ms > buckets[i]:
+            i += 1
+        counts[i] += 1
+    out = {f'le_{b}': c for b, c in zip(buckets, counts)}
+    out[f'gt_{buckets[-1]}'] = counts[-1]
+    return out
+
+
+def gateway_batch(field_id: str, clock: datetime, readings: int, freq_minutes: int) -> List[dict]:
+    """`readings` timestamps of every metric for one field, oldest first, ending at `clock`."""
+    rows = generate_sensor_series(field_id, start=clock, periods=readings, freq_minutes=freq_minutes)
+    rows.reverse()
+    return rows
+
+
+class LoadStats:
+    def __init__(self):
+        self.requests = 0
+        self.ok = 0
+        self.throttled = 0
+        self.errors = 0
+        self.rows_accepted = 0
+        self.late_sends = 0
+        self.latencies = []
+
+    def record(self, seconds: float, status: Optional[int], rows: int):
+        self.requests += 1
+        self.latencies.append(seconds)
+        if status is not None and status < 300:
+            self.ok += 1
+            self.rows_accepted += rows
+        elif status == 429:
+            self.throttled += 1
+        else:
+            self.errors += 1
+
+    def summary(self, target_rows_per_sec: float, wall_seconds: float) -> dict:
+        requests = self.requests or 1
+        return {
+            'target_rows_per_sec': round(target_rows_per_sec, 1),
+            'achieved_rows_per_sec': round(self.rows_accepted / wall_seconds, 1) if wall_seconds else 0.0,
+            'wall_seconds': round(wall_seconds, 3),
+            'ok': self.ok,
+            'throttled': self.throttled,
+            'errors': self.errors,
+            'throttle_rate': round(self.throttled / requests, 4),
+            'error_rate': round(self.errors / requests, 4),
+            'late_sends': self.late_sends,
+            **latency_summary(self.latencies),
+            'histogram_ms': histogram(self.latencies),
+        }
+
+
+async def drive(client, rate: float, gateways: int, duration: float, readings: int=4, freq_minutes: int=15,
+                start: Optional[datetime]=None, field_prefix: str='field_load') -> dict:
+    """Run `gateways` gateways offering `rate` rows/sec for `duration` seconds; returns the summary.
+
+    `client` is an `httpx.AsyncClient` whose base URL points at the API.
+    """
+    rows_per_post = readings * len(SENSORS)
+    interval = gateways * rows_per_post / rate
+    stats = LoadStats()
+    start = start or datetime.utcnow().replace(microsecond=0)
+    t0 = time.monotonic()
+    t_end = t0 + duration
+
+    async def gateway(i):
+        field_id = f'{field_prefix}_{i + 1}'
+        # spread the first sends over one interval so gateways do not fire in lockstep
+        next_at = t0 + interval * i / gateways
+        clock = start
+        while next_at < t_end:
+            now = time.monotonic()
+            if next_at > now:
+                await asyncio.sleep(next_at - now)
+            elif now - next_at > interval:
+                stats.late_sends += 1
+            rows = gateway_batch(field_id, clock, readings, freq_minutes)
+            clock += timedelta(minutes=freq_minutes * readings)
+            t = time.perf_counter()
+            status = None
+            try:
+                resp = await client.post(f'/api/fields/{field_id}/ingest-sensors', json=rows)
+                status = resp.status_code
+            except Exception:
+                pass
+            stats.record(time.perf_counter() - t, status, len(rows))
+            next_at += interval
+
+    await asyncio.gather(*(gateway(i) for i in range(gateways)))
+    return stats.summary(rate, time.monotonic() - t0)
+
+
+def saturated(summary: dict, slack: float=0.05, max_error_rate: float=0.01, max_p99_ms: Optional[float]=None) -> List[str]:
+    """Reasons a run did not keep up with its target; empty when it did."""
+    reasons = []
+    if summary['achieved_rows_per_sec'] < summary['target_rows_per_sec'] * (1 - slack):
+        reasons.append('below target rate')
+    if summary['throttle_rate'] > max_error_rate:
+        reasons.append('throttled (429)')
+    if summary['error_rate'] > max_error_rate:
+        reasons.append('errors')
+    if max_p99_ms is not None and summary['p99_ms'] > max_p99_ms:
+        reasons.append('p99 latency')
+    return reasons
+
+
+def _http_client(url: str, connections: int, timeout: float):
+    import httpx
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    return httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout)
+
+
+async def run(url: str, rate: float, gateways: int, duration: float, readings: int, connections: int, timeout: float,
+              ramp: bool=False, ramp_factor: float=1.5, ramp_max: Optional[float]=None, slack: float=0.05,
+              max_error_rate: float=0.01, max_p99_ms: Optional[float]=None, echo=print) -> dict:
+    """One run at `rate`, or a ramp; returns `{name: summary}` plus a `saturation` entry for ramps."""
+    results = {}
+    async with _http_client(url, connections, timeout) as client:
+        while True:
+            summary = await drive(client, rate, gateways, duration, readings=readings)
+            reasons = saturated(summary, slack=slack, max_error_rate=max_error_rate, max_p99_ms=max_p99_ms)
+            results[f'load.rate_{int(rate)}'] = summary
+            echo(f"target {summary['target_rows_per_sec']:>10} rows/s  achieved {summary['achieved_rows_per_sec']:>10}  "
+                 f"p50 {summary['p50_ms']:>8} ms  p99 {summary['p99_ms']:>8} ms  "
+                 f"429 {summary['throttle_rate']:.2%}  errors {summary['error_rate']:.2%}  "
+                 f"{', '.join(reasons) or 'ok'}")
+            if not ramp:
+                return results
+            if reasons or (ramp_max is not None and rate * ramp_factor > ramp_max):
+                break
+            rate *= ramp_factor
+    kept_up = [s['target_rows_per_sec'] for s in results.values() if not saturated(
+        s, slack=slack, max_error_rate=max_error_rate, max_p99_ms=max_p99_ms)]
+    results['load.saturation'] = {
+        'sustained_rows_per_sec': max(kept_up) if kept_up else 0.0,
+        'failed_at_rows_per_sec': summary['target_rows_per_sec'] if reasons else None,
+        'reasons': reasons,
+    }
+    return results
+
+
+@click.command()
+@click.option('--url', default='http://localhost:8000', show_default=True, help='Base URL of the API')
+@click.option('--gateways', default=100, show_default=True, help='Simulated field gateways, one field each')
+@click.option('--rate', default=1000.0, show_default=True, help='Aggregate target rate in rows/sec (ramp start)')
+@click.option('--duration', default=30.0, show_default=True, help='Seconds per run (per step when ramping)')
+@click.option('--readings', default=4, show_default=True, help='Timestamps per POST; each carries every metric')
+@click.option('--connections', default=100, show_default=True, help='Keep-alive connections shared by the gateways')
+@click.option('--timeout', default=30.0, show_default=True, help='Per-request timeout in seconds')
+@click.option('--ramp', is_flag=True, help='Raise the rate step by step until the API saturates')
+@click.option('--ramp-factor', default=1.5, show_default=True)
+@click.option('--ramp-max', default=None, type=float, help='Stop ramping above this rate')
+@click.option('--slack', default=0.05, show_default=True, help='Allowed shortfall from the target rate')
+@click.option('--max-error-rate', default=0.01, show_default=True, help='Allowed fraction of 429s, and of errors')
+@click.option('--max-p99-ms', default=None, type=float, help='Treat a step over this p99 latency as saturated')
+@click.option('--out', default=None, help='Write the results as JSON to this path')
+def main(url, gateways, rate, duration, readings, connections, timeout, ramp, ramp_factor, ramp_max, slack,
+         max_error_rate, max_p99_ms, out):
+    results = asyncio.run(run(url, rate, gateways, duration, readings, connections, timeout, ramp=ramp,
+                              ramp_factor=ramp_factor, ramp_max=ramp_max, slack=slack,
+                              max_error_rate=max_error_rate, max_p99_ms=max_p99_ms, echo=click.echo))
+    if ramp:
+        sat = results['load.saturation']
+        click.echo(f"sustained {sat['sustained_rows_per_sec']} rows/s"
+                   + (f"; saturated at {sat['failed_at_rows_per_sec']} rows/s ({', '.join(sat['reasons'])})"
+                      if sat['failed_at_rows_per_sec'] else ''))
+    if out:
+        params = {'url': url, 'gateways': gateways, 'rate': rate, 'duration': duration, 'readings': readings,
+                  'connections': connections, 'ramp': ramp, 'ramp_factor': ramp_factor}
+        write_report(make_report(results, params), out)
+        click.echo(f"results written to {out}")
+
+
+if __name__ == '__main__':
+    main()
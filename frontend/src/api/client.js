@@ -19,5 +19,77 @@ client.interceptors.response.use(
   }
 )
 
+// Columnar timeseries bodies (application/x-pasture-columnar, see src/columnar.py):
+// 'PTS1' + uint32, then frames of uint32 n, uint16 nameLen, uint16 reserved, name, padding to 8,
+// int64[n] epoch-ms timestamps and float64[n] values, all little-endian.
+export const COLUMNAR_TYPE = 'application/x-pasture-columnar'
+
+export function decodeColumnar(buffer) {
+  const view = new DataView(buffer)
+  if (view.getUint32(0, true) !== 0x31535450) throw new Error('Not a columnar timeseries body')
+  const frames = {}
+  const decoder = new TextDecoder()
+  let offset = 8
+  while (offset < buffer.byteLength) {
+    const n = view.getUint32(offset, true)
+    const nameLen = view.getUint16(offset + 4, true)
+    const metric = decoder.decode(new Uint8Array(buffer, offset + 8, nameLen))
+    offset += 8 + nameLen
+    offset += (8 - (offset % 8)) % 8
+    // int64 ms -> Number from the two 32-bit halves (exact below 2^53)
+    const halves = new Uint32Array(buffer, offset, 2 * n)
+    const timestamps = new Float64Array(n)
+    for (let i = 0; i < n; i++) timestamps[i] = halves[2 * i + 1] * 4294967296 + halves[2 * i]
+    const values = new Float64Array(buffer, offset + 8 * n, n)
+    offset += 16 * n
+    if (!frames[metric]) frames[metric] = []
+    frames[metric].push({ timestamps, values })
+  }
+  // a metric may span several frames (one per server page); join them in order
+  const series = {}
+  for (const [metric, parts] of Object.entries(frames)) {
+    if (parts.length === 1) {
+      series[metric] = parts[0]
+      continue
+    }
+    const total = parts.reduce((sum, p) => sum + p.values.length, 0)
+    const timestamps = new Float64Array(total)
+    const values = new Float64Array(total)
+    let at = 0
+    for (const p of parts) {
+      timestamps.set(p.timestamps, at)
+      values.set(p.values, at)
+      at += p.values.length
+    }
+    series[metric] = { timestamps, values }
+  }
+  return series
+}
+
+// Fetch a timeseries as { metric: { timestamps: Float64Array, values: Float64Array } }
+export async function getTimeseriesColumns(fieldId, params = {}) {
+  const buffer = await client.get(`/api/fields/${fieldId}/timeseries`, {
+    params,
+    responseType: 'arraybuffer',
+    headers: { Accept: COLUMNAR_TYPE }
+  })
+  return decodeColumnar(buffer)
+}
+
+// Fields near a point ({ lng, lat, radius, projection }) or inside an area ({ bbox } or { polygon }),
+// filtered by the server's geo index instead of downloading every field
+export const getFieldsNear = (params) => client.get('/api/fields/near', { params })
+export const getFieldsWithin = (params) => client.get('/api/fields/within', { params })
+
+// Live alert transitions over server-sent events; EventSource reconnects on its own and sends
+// Last-Event-ID so the API replays what was missed. Returns a function that closes the stream.
+export function subscribeAlerts(onAlert, onStatus = () => {}) {
+  const source = new EventSource(`${API_BASE}/api/alerts/stream`)
+  source.addEventListener('alert', e => onAlert({ id: e.lastEventId, ...JSON.parse(e.data) }))
+  source.onopen = () => onStatus('open')
+  source.onerror = () => onStatus(source.readyState === EventSource.CLOSED ? 'closed' : 'reconnecting')
+  return () => source.close()
+}
+
 export const apiClient = client
 export default client
@@ -1,8 +1,9 @@
-"""Simple aggregation job: reads sensor JSONL, computes 7-point rolling soil moisture average and NDVI anomaly, writes latest to Redis and pushes alerts."""
+"""Simple aggregation job: reads sensor JSONL, computes 7-point rolling stats per metric, writes the final values to Redis and pushes the alerts raised by the `alerts` threshold rules."""
 import json
 import sys
 import os
-from collections import defaultdict, deque
+from collections import defaultdict
+from itertools import islice
 
 # Ensure project root is on sys.path so `from src...` works when running this script directly
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -10,30 +11,31 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from src.clients.redis_client import RedisClientWrapper
+from src.pipeline.aggregates import RollingAggregator
 
 
-def aggregate(jsonl_path, dry_run=True):
+CHUNK_SIZE = 100000
+
+
+def aggregate(jsonl_path, dry_run=True, chunk_size=CHUNK_SIZE):
     r = RedisClientWrapper(dry_run=dry_run)
-    window = defaultdict(lambda: deque(maxlen=7))
-    with open(jsonl_path) as fh:
-        for line in fh:
-            row = json.loads(line)
-            fid = row['field_id']
-            mt = row['metric_type']
-            val = row['metric_value']
-            if mt == 'soil_moisture':
-                window[fid].append(val)
-                avg = sum(window[fid])/len(window[fid])
-                # write latest to redis
-                r.hset_latest(fid, {'latest_soil_moisture': avg})
-                if avg < 12.0:
-                    r.push_alert(fid, 'low_soil_moisture', {'value': avg})
-            if mt == 'ndvi':
-                # compare to a simple long-term baseline (placeholder)
-                baseline = 0.55
-                if val < baseline - 0.15:
-                    r.hset_latest(fid, {'latest_ndvi': val})
-                    r.push_alert(fid, 'ndvi_drop', {'value': val})
+    agg = RollingAggregator(window=7, state=None if dry_run else r)
+    latest = defaultdict(dict)
+    with open(jsonl_path) as fh, r.batch() as b:
+        while True:
+            chunk = [json.loads(line) for line in islice(fh, chunk_size)]
+            if not chunk:
+                break
+            result = agg.update(chunk)
+            for fid, mapping in result.latest.items():
+                latest[fid].update(mapping)
+            for fid, alert_type, payload in result.alerts:
+                b.push_alert(fid, alert_type, payload)
+            b.flush()
+            agg.commit(result)
+        # only the final per-field values are written
+        for fid, mapping in latest.items():
+            b.hset_latest(fid, mapping)
 
 
 if __name__ == '__main__':
@@ -13,13 +13,20 @@ if ROOT not in sys.path:
 
 from src.clients.mongo_client import MongoClientWrapper
 from src.clients.cassandra_client import CassandraClientWrapper
+from src.rollups import ROLLUP_TABLES
 
 
 def main(dry_run=True):
     mongo = MongoClientWrapper(dry_run=dry_run)
     cass = CassandraClientWrapper(dry_run=dry_run)
-    mongo.create_indexes('pasture')
+    # idempotent: only indexes missing from the spec are created
+    for collection, result in mongo.create_indexes('pasture').items():
+        if result['conflicts']:
+            print(f"mongo {collection}: indexes with the same name but other keys left alone: {result['conflicts']}")
     cass.ensure_sensor_table('sensor_data_by_field')
+    cass.ensure_sensor_table('sensor_data_by_field_metric', by_metric=True)
+    for table in ROLLUP_TABLES.values():
+        cass.ensure_rollup_table(table)
 
 
 if __name__ == '__main__':
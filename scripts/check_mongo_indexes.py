@@ -0,0 +1,43 @@
+"""Check that the MongoDB queries used by the code run on an index (no COLLSCAN).
+
+Usage: python scripts/check_mongo_indexes.py [--apply]
+
+`--apply` first creates any missing indexes from the spec in src/clients/mongo_client.py.
+Exits 1 when a query falls back to a collection scan or a covered query fetches documents.
+"""
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.clients.mongo_client import MongoClientWrapper
+from src.index_advisor import check_queries
+
+load_dotenv(os.path.join(ROOT, '.env'))
+
+
+def main(apply=False):
+    mongo = MongoClientWrapper(dry_run=False)
+    if apply:
+        for collection, result in mongo.create_indexes('pasture').items():
+            print(f"{collection}: created {result['created'] or '-'}, conflicts {result['conflicts'] or '-'}")
+    failed = 0
+    for result in check_queries(mongo.get_db('pasture')):
+        status = ', '.join(result['problems']) or 'ok'
+        print(f"{result['name']:<28} {status:<22} {' > '.join(result['stages'])}  [{', '.join(result['indexes']) or 'no index'}]")
+        if result['problems']:
+            failed += 1
+            print(f"    from {result['source']}")
+    mongo.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('--apply', action='store_true', help='create missing indexes before checking')
+    sys.exit(main(apply=p.parse_args().apply))
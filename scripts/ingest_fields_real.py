@@ -19,6 +19,9 @@ from src.clients.mongo_client import MongoClientWrapper
 python_dotenv.load_dotenv(os.path.join(ROOT, '.env'))
 
 
+CHUNK_SIZE = 1000
+
+
 def ingest_fields(jsonl_path):
     """Read field JSONL and write to MongoDB."""
     mongo = MongoClientWrapper(dry_run=False)  # Real mode
@@ -26,12 +29,17 @@ def ingest_fields(jsonl_path):
     
     p = Path(jsonl_path)
     count = 0
+    chunk = []
     with p.open() as fh:
         for line in fh:
-            field_doc = json.loads(line)
-            mongo.insert_field('pasture', field_doc)
-            count += 1
-            print(f"Inserted field: {field_doc['_id']}")
+            chunk.append(json.loads(line))
+            if len(chunk) >= CHUNK_SIZE:
+                mongo.bulk_upsert_fields('pasture', chunk)
+                count += len(chunk)
+                chunk = []
+    if chunk:
+        mongo.bulk_upsert_fields('pasture', chunk)
+        count += len(chunk)
     
     print(f"\nTotal fields ingested: {count}")
 
@@ -1,34 +1,26 @@
-"""Prototype ingestion pipeline: reads generated sensor JSONL and ingests to Cassandra and updates Mongo metadata."""
-import json
+"""Prototype ingestion pipeline: reads generated sensor JSONL and ingests to Cassandra and updates Mongo metadata.
+
+For all four stores in one pass use `python -m src.pipeline`.
+"""
 import sys
 import os
-from pathlib import Path
 
 # Make project root importable when running script directly
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
-from src.clients.mongo_client import MongoClientWrapper
-from src.clients.cassandra_client import CassandraClientWrapper
+from src.pipeline.cli import build_engine
 
 
-def ingest(jsonl_path, dry_run=True):
-    mongo = MongoClientWrapper(dry_run=dry_run)
-    cass = CassandraClientWrapper(dry_run=dry_run)
-    # ensure table exists in real mode (omitted in dry-run)
-    p = Path(jsonl_path)
-    with p.open() as fh:
-        for line in fh:
-            row = json.loads(line)
-            field_id = row.get('field_id')
-            # insert into cassandra
-            cass.insert_sensor_row('sensor_data_by_field', row)
-            # update mongo latest_metrics in real pipeline
-            # simplified: patch latest_metrics from metric_type
-            if row.get('metric_type') in ('ndvi','soil_moisture','grass_height'):
-                # upsertField omitted for brevity
-                mongo.insert_field('pasture', {'_id': field_id, 'latest_metrics': {row['metric_type']: row['metric_value']}})
+def ingest(jsonl_path, dry_run=True, batch_size=5000):
+    """Cassandra rows plus Mongo latest_metrics, via the single-pass engine in `src.pipeline`."""
+    engine, clients = build_engine(sinks=('cassandra', 'rollups', 'mongo'), dry_run=dry_run, batch_size=batch_size)
+    try:
+        return engine.run([jsonl_path])
+    finally:
+        for client in clients:
+            client.close()
 
 
 if __name__ == '__main__':
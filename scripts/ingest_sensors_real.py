@@ -14,23 +14,45 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from src.clients.cassandra_client import CassandraClientWrapper
+from src.rollups import ROLLUP_TABLES, rollup_partials
 
 # Load .env
 python_dotenv.load_dotenv(os.path.join(ROOT, '.env'))
 
 
-def ingest_sensors(jsonl_path):
-    """Read sensor JSONL and write to Cassandra."""
+CHUNK_SIZE = 5000
+TABLES = ('sensor_data_by_field', 'sensor_data_by_field_metric')
+# same retention as the API's writes
+TTL = int(os.getenv('SENSOR_TTL_DAYS', 90)) * 24 * 3600
+
+
+def _write_chunk(cass, chunk):
+    """Write to every table and merge the chunk into the rollups; returns the rows written to the per-field table."""
+    written = [cass.insert_sensor_rows(table, chunk, ttl=TTL) for table in TABLES]
+    for resolution, table in ROLLUP_TABLES.items():
+        cass.merge_rollups(table, rollup_partials(chunk, resolution))
+    return written[0]
+
+
+def ingest_sensors(jsonl_path, chunk_size=CHUNK_SIZE):
+    """Read sensor JSONL and write to Cassandra in concurrent chunks."""
     cass = CassandraClientWrapper(dry_run=False)  # Real mode
     cass.ensure_sensor_table('sensor_data_by_field')
+    cass.ensure_sensor_table('sensor_data_by_field_metric', by_metric=True)
+    for table in ROLLUP_TABLES.values():
+        cass.ensure_rollup_table(table)
     
     p = Path(jsonl_path)
     count = 0
+    chunk = []
     with p.open() as fh:
         for line in fh:
-            row = json.loads(line)
-            cass.insert_sensor_row('sensor_data_by_field', row, ttl=7776000)  # 90 days TTL
-            count += 1
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                count += _write_chunk(cass, chunk)
+                chunk = []
+    if chunk:
+        count += _write_chunk(cass, chunk)
     
     print(f"Ingested {count} sensor rows into Cassandra from {jsonl_path}")
 
@@ -0,0 +1,74 @@
+"""Copy sensor rows from an unbucketed Cassandra table into a time-bucketed one.
+
+Cassandra cannot change a primary key in place, so bucketing means a new table. This script
+creates it with `PRIMARY KEY ((field_id[, metric_type], bucket), sensor_ts, sensor_id)`, streams
+the source table page by page and writes each chunk with the bucket-aware bulk insert. Afterwards
+point the API and ingest at the new tables with CASSANDRA_TABLE / CASSANDRA_METRIC_TABLE and
+set CASSANDRA_BUCKET to the same granularity.
+
+Usage:
+  python scripts/migrate_sensor_buckets.py --source sensor_data_by_field --target sensor_data_by_field_daily --bucket day --real
+  python scripts/migrate_sensor_buckets.py --source sensor_data_by_field_metric --target sensor_data_by_field_metric_daily --by-metric --real
+
+Rows are written with a fresh `--ttl` (default 90 days, 0 for none) rather than their remaining TTL.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from dotenv import load_dotenv
+
+from src.clients.cassandra_client import CassandraClientWrapper
+
+load_dotenv(os.path.join(ROOT, '.env'))
+
+COLUMNS = ('field_id', 'sensor_ts', 'sensor_id', 'metric_type', 'metric_value', 'quality_flag')
+CHUNK_SIZE = 5000
+
+
+def migrate(source, target, bucket='day', by_metric=False, ttl=7776000, chunk_size=CHUNK_SIZE,
+            concurrency=64, dry_run=True):
+    cass = CassandraClientWrapper(keyspace=os.getenv('CASSANDRA_KEYSPACE', 'pasture'), dry_run=dry_run, bucket=bucket)
+    try:
+        cass.ensure_sensor_table(target, by_metric=by_metric)
+        if dry_run:
+            print(f"[cassandra dry-run] would copy {source} -> {target} in {bucket} buckets")
+            return 0
+        from cassandra.query import SimpleStatement
+        # the driver fetches the next page only when iteration reaches it
+        scan = SimpleStatement(f"SELECT {', '.join(COLUMNS)} FROM {source}", fetch_size=chunk_size)
+        copied = 0
+        chunk = []
+        t0 = time.perf_counter()
+        for r in cass.session.execute(scan):
+            chunk.append({c: getattr(r, c) for c in COLUMNS})
+            if len(chunk) >= chunk_size:
+                copied += cass.insert_sensor_rows(target, chunk, ttl=ttl or None, concurrency=concurrency)
+                chunk = []
+                print(f"copied {copied} rows ({copied / (time.perf_counter() - t0):.0f} rows/s)")
+        if chunk:
+            copied += cass.insert_sensor_rows(target, chunk, ttl=ttl or None, concurrency=concurrency)
+        print(f"Copied {copied} rows from {source} to {target}")
+        return copied
+    finally:
+        cass.close()
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('--source', default='sensor_data_by_field')
+    p.add_argument('--target', required=True)
+    p.add_argument('--bucket', choices=['day', 'week'], default='day')
+    p.add_argument('--by-metric', action='store_true', help='target is partitioned by (field_id, metric_type, bucket)')
+    p.add_argument('--ttl', type=int, default=7776000, help='TTL in seconds for copied rows (0 = none)')
+    p.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    p.add_argument('--concurrency', type=int, default=64)
+    p.add_argument('--real', action='store_true', help='perform real operations (use env vars)')
+    args = p.parse_args()
+    migrate(args.source, args.target, bucket=args.bucket, by_metric=args.by_metric, ttl=args.ttl,
+            chunk_size=args.chunk_size, concurrency=args.concurrency, dry_run=not args.real)
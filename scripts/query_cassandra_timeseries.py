@@ -1,4 +1,4 @@
-"""Cassandra query: Time-series aggregation (average grass height per field).
+"""Cassandra query: Time-series aggregation (average grass height per field) from the hourly rollups.
 
 Usage: python scripts/query_cassandra_timeseries.py
 """
@@ -24,30 +24,30 @@ def query_timeseries():
     print("Cassandra Query: Grass Height Time-Series (Last 48 Hours)")
     print("=" * 60)
     
-    # Query time-series for grass_height metric
-    # Note: this is a simplified example; full Cassandra queries would include proper date ranges
+    # Hourly rollups: one row per hour with count/sum/min/max/last, instead of every raw reading
     try:
+        since = datetime.utcnow() - timedelta(hours=48)
         rows = cass.session.execute("""
-            SELECT field_id, sensor_ts, metric_value 
-            FROM sensor_data_by_field
-            WHERE field_id = 'field_1' AND metric_type = 'grass_height'
-            LIMIT 20
-        """)
+            SELECT period, value_count, value_sum, value_min, value_max
+            FROM sensor_rollup_hour
+            WHERE field_id = 'field_1' AND metric_type = 'grass_height' AND period >= %s
+        """, (since,))
         
-        print(f"\nGrass Height readings for field_1:\n")
+        print(f"\nHourly grass height for field_1:\n")
         data = list(rows)
         if data:
             for row in data[:10]:  # Show first 10
-                print(f"  Time: {row.sensor_ts}")
-                print(f"  Height (cm): {row.metric_value}")
+                print(f"  Hour: {row.period}")
+                print(f"  Height (cm): mean {row.value_sum / row.value_count:.2f}, min {row.value_min}, max {row.value_max}")
                 print()
             
             if len(data) > 10:
-                print(f"  ... and {len(data) - 10} more records")
+                print(f"  ... and {len(data) - 10} more hours")
             
-            # Compute simple average
-            avg_height = sum(r.metric_value for r in data) / len(data)
-            print(f"\nAverage grass height: {avg_height:.2f} cm")
+            # Exact average over all readings from the stored sums and counts
+            readings = sum(r.value_count for r in data)
+            avg_height = sum(r.value_sum for r in data) / readings
+            print(f"\nAverage grass height: {avg_height:.2f} cm over {readings} readings")
         else:
             print("  No data found. Run ingestion first.")
     
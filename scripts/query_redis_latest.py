@@ -41,9 +41,10 @@ def query_latest_metrics():
     
     # Check for alerts
     print("\n" + "-" * 60)
-    print("Active Alerts (from Redis Streams):")
+    print("Latest Alerts (from Redis Streams):")
     try:
-        alerts = r.client.xrange('alerts', count=5)
+        # newest entries first; the stream is trimmed, so its start is no longer meaningful
+        alerts = r.recent_alerts(count=5)
         if alerts:
             for alert_id, alert_data in alerts:
                 print(f"  Alert ID: {alert_id}")
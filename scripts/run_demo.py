@@ -6,10 +6,8 @@ This script runs the complete pipeline:
 1. Generate fields and sensor data
 2. Bootstrap databases (create indexes/tables)
 3. Ingest field metadata to MongoDB
-4. Ingest sensor data to Cassandra
-5. Aggregate metrics to Redis
-6. Create events in Neo4j
-7. Run cross-DB queries
+4. Stream sensor data once through src.pipeline into Cassandra, Redis, MongoDB and Neo4j
+5. Run cross-DB queries
 """
 import subprocess
 import sys
@@ -57,23 +55,8 @@ def main():
         ("python scripts/ingest_fields_real.py fields.jsonl",
          "Ingest field metadata into MongoDB"),
         
-        ("python scripts/ingest_sensors_real.py sensors_field1.jsonl",
-         "Ingest sensor data (field_1) into Cassandra"),
-        
-        ("python scripts/ingest_sensors_real.py sensors_field2.jsonl",
-         "Ingest sensor data (field_2) into Cassandra"),
-        
-        ("python scripts/aggregate_to_redis_real.py sensors_field1.jsonl",
-         "Aggregate metrics for field_1 and write to Redis"),
-        
-        ("python scripts/aggregate_to_redis_real.py sensors_field2.jsonl",
-         "Aggregate metrics for field_2 and write to Redis"),
-        
-        ("python scripts/update_neo4j_real.py sensors_field1.jsonl",
-         "Create Neo4j events for field_1 threshold crossings"),
-        
-        ("python scripts/update_neo4j_real.py sensors_field2.jsonl",
-         "Create Neo4j events for field_2 threshold crossings"),
+        ("python -m src.pipeline sensors_field1.jsonl sensors_field2.jsonl --real",
+         "Ingest sensor data in one pass: Cassandra rows, Redis aggregates, MongoDB latest metrics, Neo4j events"),
     ]
     
     failed_steps = []
@@ -1,7 +1,8 @@
-"""Create Neo4j events when fields cross thresholds."""
+"""Create Neo4j events for readings matched by the threshold rules (see src/rules.json)."""
 import json
 import sys
 import os
+from itertools import islice
 
 # Ensure project root is on sys.path so imports like `from src...` work
 ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -9,16 +10,27 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from src.clients.neo4j_client import Neo4jClientWrapper
+from src.clients.redis_client import RedisClientWrapper
+from src.rules import RuleEngine, load_rules
 
 
-def update(jsonl_path, dry_run=True):
+CHUNK_SIZE = 100000
+
+
+def update(jsonl_path, dry_run=True, chunk_size=CHUNK_SIZE):
     n = Neo4jClientWrapper(dry_run=dry_run)
-    with open(jsonl_path) as fh:
-        for line in fh:
-            row = json.loads(line)
-            fid = row['field_id']
-            if row['metric_type'] == 'soil_moisture' and row['metric_value'] < 10.0:
-                n.create_event_for_field(fid, 'low_soil_moisture', {'value': row['metric_value'], 'ts': row['sensor_ts']})
+    # dry runs keep alert state in-process; real runs share it through Redis
+    engine = RuleEngine(load_rules().for_sink('events'), state=None if dry_run else RedisClientWrapper(dry_run=False))
+    with open(jsonl_path) as fh, n.event_batch() as batch:
+        while True:
+            chunk = [json.loads(line) for line in islice(fh, chunk_size)]
+            if not chunk:
+                break
+            matches, changed = engine.evaluate(chunk)
+            for fid, event_type, props in matches:
+                batch.add_event(fid, event_type, props)
+            batch.flush()
+            engine.commit(changed)
 
 
 if __name__ == '__main__':
@@ -5,6 +5,7 @@ Usage: python scripts/update_neo4j_real.py sensors.jsonl
 import json
 import sys
 import os
+from itertools import islice
 import python_dotenv
 
 # Add project root to sys.path
@@ -13,73 +14,41 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from src.clients.neo4j_client import Neo4jClientWrapper
+from src.clients.redis_client import RedisClientWrapper
+from src.rules import RuleEngine, load_rules
 
 # Load .env
 python_dotenv.load_dotenv(os.path.join(ROOT, '.env'))
 
 
-def update_neo4j_real(jsonl_path):
-    """Read sensor JSONL and create Neo4j events for threshold crossings."""
+CHUNK_SIZE = 100000
+
+
+def update_neo4j_real(jsonl_path, chunk_size=CHUNK_SIZE):
+    """Read sensor JSONL and create Neo4j events for readings matched by the threshold rules."""
     n = Neo4jClientWrapper(dry_run=False)  # Real mode
+    # alert state per field lives in Redis, so only entered/cleared transitions become events
+    r = RedisClientWrapper(dry_run=False)
+    engine = RuleEngine(load_rules().for_sink('events'), state=r)
     
     event_count = 0
-    with open(jsonl_path) as fh:
-        for line in fh:
-            row = json.loads(line)
-            fid = row['field_id']
-            
-            # Create event for low soil moisture
-            if row['metric_type'] == 'soil_moisture' and row['metric_value'] < 10.0:
-                n.create_event_for_field(
-                    fid,
-                    'low_soil_moisture',
-                    {
-                        'value': row['metric_value'],
-                        'ts': row['sensor_ts'],
-                        'severity': 'high' if row['metric_value'] < 8.0 else 'medium'
-                    }
-                )
-                event_count += 1
-            
-            # Create event for NDVI drop
-            if row['metric_type'] == 'ndvi' and row['metric_value'] < 0.40:
-                n.create_event_for_field(
-                    fid,
-                    'low_ndvi',
-                    {
-                        'value': row['metric_value'],
-                        'ts': row['sensor_ts'],
-                        'baseline': 0.55
-                    }
-                )
-                event_count += 1
-            
-            # Create event for high air temperature
-            if row['metric_type'] == 'air_temp' and row['metric_value'] > 30.0:
-                n.create_event_for_field(
-                    fid,
-                    'high_temperature',
-                    {
-                        'value': row['metric_value'],
-                        'ts': row['sensor_ts']
-                    }
-                )
-                event_count += 1
-            
-            # Create event for low grass height
-            if row['metric_type'] == 'grass_height' and row['metric_value'] < 4.0:
-                n.create_event_for_field(
-                    fid,
-                    'low_grass_height',
-                    {
-                        'value': row['metric_value'],
-                        'ts': row['sensor_ts']
-                    }
-                )
+    with open(jsonl_path) as fh, n.event_batch() as batch:
+        while True:
+            chunk = [json.loads(line) for line in islice(fh, chunk_size)]
+            if not chunk:
+                break
+            # one vectorized pass per metric over the chunk (src/rules.json)
+            matches, changed = engine.evaluate(chunk)
+            for fid, event_type, props in matches:
+                batch.add_event(fid, event_type, props)
                 event_count += 1
+            # save the alert state only once the chunk's events are in Neo4j
+            batch.flush()
+            engine.commit(changed)
     
     print(f"Neo4j events created: {event_count}")
     n.close()
+    r.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+"""Fan-out of the Redis `alerts` stream to server-sent-event clients.
+
+Each API process reads the stream through its own consumer group, so every process sees every
+alert and hands it to all of its connected dashboards; XREADGROUP blocks in Redis and returns as
+soon as an alert is added, so delivery does not wait for a polling interval. Subscribers get a
+bounded queue each; a dashboard that stops reading loses its oldest undelivered alerts instead of
+holding memory. The same task periodically trims the stream by age (approximate MINID) and removes
+the groups of processes that died without cleaning up, once their consumer has been idle for
+`stale_ms` (env ALERTS_GROUP_STALE_MS).
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Optional, Set
+
+logger = logging.getLogger('pasture.alerts')
+
+# per-process group names start with this; stale ones are pruned by any running process
+GROUP_PREFIX = 'sse-'
+
+
+class AlertBroadcaster:
+    def __init__(self, group: Optional[str]=None, queue_size: int=100, block_ms: int=1000,
+                 max_age: Optional[float]=None, trim_interval: float=60.0, stale_ms: Optional[int]=None):
+        """`max_age` (seconds, env ALERTS_STREAM_MAX_AGE) bounds the stream by age; None keeps MAXLEN only."""
+        self.group = group or f"{GROUP_PREFIX}{socket.gethostname()}-{os.getpid()}"
+        self.consumer = 'api'
+        self.queue_size = queue_size
+        self.block_ms = block_ms
+        if max_age is None and os.getenv('ALERTS_STREAM_MAX_AGE'):
+            max_age = float(os.getenv('ALERTS_STREAM_MAX_AGE'))
+        self.max_age = max_age
+        self.trim_interval = trim_interval
+        # a live reader's consumer is never idle longer than one blocking read
+        self.stale_ms = int(os.getenv('ALERTS_GROUP_STALE_MS', 600000)) if stale_ms is None else stale_ms
+        self.redis = None
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self, redis_wrapper):
+        """Create this process's group at the stream tail and start reading; skipped without Redis."""
+        if redis_wrapper is None or redis_wrapper.dry_run:
+            return
+        self.redis = redis_wrapper
+        await self.redis.create_alert_group(self.group, start='$')
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+            try:
+                await self.redis.destroy_alert_group(self.group)
+            except Exception as e:
+                logger.warning(f"Could not remove alert consumer group {self.group}: {e}")
+        self.redis = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, entries):
+        """Hand `(entry_id, alert)` pairs to every subscriber, dropping a slow one's oldest alerts."""
+        for queue in self._subscribers:
+            for entry in entries:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(entry)
+
+    async def _run(self):
+        next_trim = 0.0
+        while True:
+            try:
+                entries = await self.redis.read_alert_group(self.group, self.consumer, block_ms=self.block_ms)
+                if entries:
+                    self.publish(entries)
+                    await self.redis.ack_alerts(self.group, [entry_id for entry_id, _ in entries])
+                if time.monotonic() >= next_trim:
+                    next_trim = time.monotonic() + self.trim_interval
+                    if self.max_age is not None:
+                        await self.redis.trim_alerts(max_age=self.max_age)
+                    removed = await self.redis.prune_alert_groups(GROUP_PREFIX, self.stale_ms, keep=self.group)
+                    if removed:
+                        logger.info(f"Removed {len(removed)} stale alert consumer groups: {', '.join(removed)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Alert stream reader error, retrying: {e}")
+                await asyncio.sleep(1.0)
+                try:
+                    # the group may have been lost (e.g. Redis restarted); recreate it at the tail
+                    await self.redis.create_alert_group(self.group, start='$')
+                except Exception:
+                    pass
@@ -1,25 +1,82 @@
 import os
+import json
+import base64
+import asyncio
+import binascii
+import heapq
 import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any
 
 from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import BackgroundTasks, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from fastapi import BackgroundTasks, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field
 
 try:
-    from src.clients.mongo_client import MongoClientWrapper
+    from bson import ObjectId
 except Exception:
-    MongoClientWrapper = None
-
-try:
-    from src.clients.cassandra_client import CassandraClientWrapper
-except Exception:
-    CassandraClientWrapper = None
-
-from src.generator import generate_field
-
-app = FastAPI(title="Pasture Manager API")
+    ObjectId = None
+
+from src import columnar, metrics
+from src.alert_stream import AlertBroadcaster
+from src.cache import FieldCache, etag_matches, field_keys, make_etag
+from src.clients.cassandra_client import ROLLUP_COLUMNS, rollup_from_row, timeseries_query
+from src.clients.registry import AsyncClientRegistry
+from src.generator import SENSORS, generate_field
+from src.geo import FieldIndex, bbox_polygon
+from src.ingest_queue import IngestWorkers, MemoryIngestQueue, RedisStreamIngestQueue
+from src.rollups import ROLLUP_TABLES, choose_resolution, period_start, rollup_partials, rollup_point
+from src.rules import RuleEngine, load_rules
+
+# Long-lived, pooled async database clients shared by all requests in this process
+clients = AsyncClientRegistry()
+# Serialized field documents: in-process LRU in front of a shared Redis tier
+field_cache = FieldCache()
+# Workers draining the sensor ingest queue; started with the app
+ingest_workers = None
+# Fans the Redis `alerts` stream out to /api/alerts/stream clients; started with the app
+alert_broadcaster = AlertBroadcaster()
+# Threshold rules that turn ingested readings into Neo4j events (src/rules.json)
+event_rules = RuleEngine(load_rules().for_sink('events'))
+
+
+def _make_ingest_queue(redis_client):
+    """Redis stream when Redis is configured (or INGEST_QUEUE=redis), else the in-memory queue."""
+    live = redis_client is not None and not redis_client.dry_run
+    kind = os.getenv('INGEST_QUEUE') or ('redis' if live else 'memory')
+    if kind == 'redis' and not live:
+        logger.warning('INGEST_QUEUE=redis but Redis is not configured; using the in-memory ingest queue, '
+                       'queued rows are lost on restart')
+        kind = 'memory'
+    if kind == 'redis':
+        return RedisStreamIngestQueue(redis_client.client,
+                                      max_deliveries=int(os.getenv('INGEST_MAX_DELIVERIES', 5)))
+    return MemoryIngestQueue()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ingest_workers
+    # clients are created lazily on first use; close their pools on shutdown
+    redis_client = await clients.redis()
+    await field_cache.start(redis_client)
+    ingest_workers = IngestWorkers.from_env(_make_ingest_queue(redis_client), _write_sensor_batch)
+    await ingest_workers.start()
+    await alert_broadcaster.start(redis_client)
+    yield
+    await alert_broadcaster.stop()
+    await ingest_workers.stop()
+    ingest_workers = None
+    await field_cache.stop()
+    await clients.close()
+
+
+app = FastAPI(title="Pasture Manager API", lifespan=lifespan)
 
 # CORS - allow frontend origins via env or allow all in dev
 allow_origins = [o.strip() for o in os.getenv('FRONTEND_ORIGINS', '*').split(',')] if os.getenv('FRONTEND_ORIGINS') else ["*"]
@@ -30,32 +87,152 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Next-After"],
 )
 
 logger = logging.getLogger('pasture.api')
 logging.basicConfig(level=logging.INFO)
 
 
+@app.middleware('http')
+async def record_request_latency(request: Request, call_next):
+    if not metrics.ENABLED:
+        return await call_next(request)
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # the route template keeps label cardinality bounded (`/api/fields/{field_id}`, not every id)
+        route = request.scope.get('route')
+        metrics.observe_request(request.method, route.path if route is not None else 'unmatched', status,
+                                time.perf_counter() - t0)
+
+
 @app.get('/health')
-def health() -> Dict[str, str]:
+async def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get('/metrics', include_in_schema=False)
+async def get_metrics() -> Response:
+    """Prometheus text exposition of the request, database client and ingest metrics."""
+    if ingest_workers is not None and metrics.ENABLED:
+        try:
+            metrics.ingest_backlog_rows.set(await ingest_workers.queue.depth())
+        except Exception as e:
+            logger.warning(f"Could not read the ingest backlog for /metrics: {e}")
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def _json_body(data) -> bytes:
+    return json.dumps(jsonable_encoder(data), separators=(',', ':')).encode()
+
+
+def _etag_response(request: Request, etag: str, body: bytes, headers: Dict[str, str] | None = None) -> Response:
+    """Answer 304 when the client already holds this representation."""
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', **(headers or {})}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+NDJSON = 'application/x-ndjson'
+
+
+def _accepts(request: Request, media_type: str) -> bool:
+    return media_type in request.headers.get('accept', '')
+
+
+def _ndjson_line(doc) -> bytes:
+    return json.dumps(doc, default=str, separators=(',', ':')).encode() + b'\n'
+
+
+def _parse_projection(projection: str | None) -> Dict[str, int] | None:
+    """`name,farm_id` keeps only those fields (plus `_id`); `-boundary,-notes` drops them."""
+    if not projection:
+        return None
+    names = [p.strip() for p in projection.split(',') if p.strip()]
+    excluded = [n[1:] for n in names if n.startswith('-')]
+    if excluded and len(excluded) != len(names):
+        raise HTTPException(status_code=400, detail="projection cannot mix included and excluded fields")
+    return {n: 0 for n in excluded} if excluded else {n: 1 for n in names}
+
+
+def _project(doc: dict, projection: Dict[str, int] | None) -> dict:
+    if not projection:
+        return doc
+    if 0 in projection.values():
+        return {k: v for k, v in doc.items() if k not in projection}
+    return {k: v for k, v in doc.items() if k in projection or k == '_id'}
+
+
+def _keyset_id(after: str):
+    # field ids are strings; documents inserted without one get ObjectIds
+    return ObjectId(after) if ObjectId is not None and ObjectId.is_valid(after) else after
+
+
+async def _stream_docs(cursor):
+    try:
+        async for d in cursor:
+            yield _ndjson_line(d)
+    except Exception as e:
+        # headers are already sent; the client sees a truncated stream
+        logger.error(f"Field stream from MongoDB failed: {e}")
+
+
+def _sample_fields() -> List[dict]:
+    return [generate_field(field_id=f"field_{i+1}", farm_id=f"farm_{(i//5)+1}", center=(0.0 + i*0.01, 0.0 + i*0.005)) for i in range(5)]
+
+
+_sample_index: FieldIndex | None = None
+
+
+def _sample_field_index() -> FieldIndex:
+    """Spatial index over the sample fields, answering geo queries when MongoDB is not configured."""
+    global _sample_index
+    if _sample_index is None:
+        _sample_index = FieldIndex(_sample_fields())
+    return _sample_index
+
+
 @app.get('/api/fields', response_model=List[Dict[str, Any]])
-def get_fields() -> List[Dict[str, Any]]:
+async def get_fields(request: Request, after: str | None = None, limit: int | None = Query(None, ge=1, le=10000),
+                     projection: str | None = None):
     """Return list of fields.
 
     Attempts to read from MongoDB if configured; otherwise returns generated sample fields.
+    `after` and `limit` page through fields in `_id` order: each page starts after the last `_id`
+    seen, and `X-Next-After` names it while more remain. `projection` keeps or (with `-`) drops
+    fields, e.g. `-boundary`. With `Accept: application/x-ndjson` documents are streamed one per
+    line, straight from the MongoDB cursor unless a `limit` page is asked for. The full, unprojected list is served from the field
+    cache until a write invalidates it.
     """
+    stream = _accepts(request, NDJSON)
+    plain = after is None and limit is None and projection is None and not stream
+    if plain:
+        cached = await field_cache.get('list')
+        if cached is not None:
+            return _etag_response(request, *cached)
+    fields = _parse_projection(projection)
+
     # Try to use MongoDB client if available and MONGO_URI is set
-    mongo_uri = os.getenv('MONGO_URI')
-    if MongoClientWrapper is not None and mongo_uri:
+    client = await clients.mongo()
+    if client is not None and not client.dry_run:
         try:
-            client = MongoClientWrapper(dry_run=False, uri=mongo_uri)
             db = client.get_db('pasture')
             if db is not None:
+                query = {'_id': {'$gt': _keyset_id(after)}} if after is not None else {}
+                cursor = db.fields.find(query, fields).sort('_id', 1)
+                if stream and not limit:
+                    return StreamingResponse(_stream_docs(cursor), media_type=NDJSON)
+                if limit:
+                    # one extra document tells whether another page exists
+                    cursor = cursor.limit(limit + 1)
                 docs = []
-                for d in db.fields.find({}):
+                async for d in cursor:
                     # Convert _id to string if needed
                     if '_id' in d:
                         try:
@@ -64,84 +241,324 @@ def get_fields() -> List[Dict[str, Any]]:
                             pass
                     docs.append(d)
                 logger.info(f"Returned {len(docs)} fields from MongoDB")
-                return docs
+                if plain:
+                    return _etag_response(request, *await field_cache.set('list', _json_body(docs)))
+                headers = {}
+                if limit and len(docs) > limit:
+                    docs = docs[:limit]
+                    headers['X-Next-After'] = docs[-1]['_id']
+                if stream:
+                    # a page is read whole so its X-Next-After is known before the first line is sent
+                    return StreamingResponse(iter([_ndjson_line(d) for d in docs]), media_type=NDJSON, headers=headers)
+                body = _json_body(docs)
+                return _etag_response(request, make_etag(body), body, headers)
         except Exception as e:
             logger.warning(f"Could not connect to MongoDB (MONGO_URI provided): {e}")
 
     # Fallback: return generated sample fields
-    samples = [generate_field(field_id=f"field_{i+1}", farm_id=f"farm_{(i//5)+1}", center=(0.0 + i*0.01, 0.0 + i*0.005)) for i in range(5)]
+    samples = _sample_fields()
+    samples = sorted((d for d in samples if after is None or d['_id'] > after), key=lambda d: d['_id'])
+    headers = {}
+    if limit and len(samples) > limit:
+        samples = samples[:limit]
+        headers['X-Next-After'] = samples[-1]['_id']
+    samples = [_project(d, fields) for d in samples]
     logger.info(f"Returning {len(samples)} sample fields")
-    return samples
+    if stream:
+        return StreamingResponse(iter([_ndjson_line(d) for d in samples]), media_type=NDJSON, headers=headers)
+    body = _json_body(samples)
+    return _etag_response(request, make_etag(body), body, headers)
+
+
+async def _mongo_fields_db():
+    client = await clients.mongo()
+    if client is None or client.dry_run:
+        return None
+    return client.get_db('pasture')
 
 
+def _geo_response(request: Request, docs: List[dict]) -> Response:
+    for d in docs:
+        if '_id' in d:
+            d['_id'] = str(d['_id'])
+    body = _json_body(docs)
+    return _etag_response(request, make_etag(body), body)
+
+
+@app.get('/api/fields/near', response_model=List[Dict[str, Any]])
+async def get_fields_near(request: Request, lng: float = Query(..., ge=-180, le=180), lat: float = Query(..., ge=-90, le=90),
+                          radius: float = Query(5000, gt=0, le=500000), limit: int = Query(100, ge=1, le=1000),
+                          projection: str | None = None):
+    """Fields within `radius` metres of a point, nearest first, each with `distance_m`.
+
+    Runs `$geoNear` on the `fields.boundary` 2dsphere index; without MongoDB the sample fields
+    are searched through an in-process R-tree.
+    """
+    fields = _parse_projection(projection)
+    if fields and 1 in fields.values():
+        # keep the computed distance when only some fields are included
+        fields['distance_m'] = 1
+    db = await _mongo_fields_db()
+    if db is not None:
+        try:
+            pipeline = [
+                {'$geoNear': {'near': {'type': 'Point', 'coordinates': [lng, lat]}, 'key': 'boundary',
+                              'distanceField': 'distance_m', 'maxDistance': radius, 'spherical': True}},
+                {'$limit': limit},
+            ]
+            if fields:
+                pipeline.append({'$project': fields})
+            docs = [d async for d in await db.fields.aggregate(pipeline)]
+            return _geo_response(request, docs)
+        except Exception as e:
+            logger.warning(f"Geo query on MongoDB failed, using sample fields: {e}")
+
+    hits = _sample_field_index().near(lng, lat, radius, limit=limit)
+    docs = [_project({**doc, 'distance_m': dist}, fields) for dist, doc in hits]
+    return _geo_response(request, docs)
+
+
+def _parse_area(bbox: str | None, polygon: str | None) -> dict:
+    """GeoJSON Polygon from `bbox=minLng,minLat,maxLng,maxLat` or `polygon=lng,lat;lng,lat;...`."""
+    if (bbox is None) == (polygon is None):
+        raise HTTPException(status_code=400, detail="give exactly one of bbox or polygon")
+    try:
+        if bbox is not None:
+            min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(','))
+            if min_lng >= max_lng or min_lat >= max_lat:
+                raise ValueError
+            return bbox_polygon((min_lng, min_lat, max_lng, max_lat))
+        ring = [[float(v) for v in point.split(',')] for point in polygon.split(';') if point.strip()]
+        if len(ring) < 3 or any(len(p) != 2 for p in ring):
+            raise ValueError
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid bbox or polygon")
+    if ring[0] != ring[-1]:
+        ring.append(ring[0])
+    return {'type': 'Polygon', 'coordinates': [ring]}
+
+
+@app.get('/api/fields/within', response_model=List[Dict[str, Any]])
+async def get_fields_within(request: Request, bbox: str | None = None, polygon: str | None = None,
+                            limit: int = Query(1000, ge=1, le=10000), projection: str | None = None):
+    """Fields whose boundary lies inside a bounding box or polygon, in `_id` order.
+
+    Runs `$geoWithin` on the `fields.boundary` 2dsphere index; without MongoDB the sample fields
+    are searched through an in-process R-tree.
+    """
+    area = _parse_area(bbox, polygon)
+    fields = _parse_projection(projection)
+    db = await _mongo_fields_db()
+    if db is not None:
+        try:
+            cursor = db.fields.find({'boundary': {'$geoWithin': {'$geometry': area}}}, fields).sort('_id', 1).limit(limit)
+            return _geo_response(request, [d async for d in cursor])
+        except Exception as e:
+            logger.warning(f"Geo query on MongoDB failed, using sample fields: {e}")
+
+    return _geo_response(request, [_project(d, fields) for d in _sample_field_index().within(area, limit=limit)])
+
 
 @app.get('/api/fields/{field_id}', response_model=Dict[str, Any])
-def get_field(field_id: str) -> Dict[str, Any]:
-    """Return single field by id. Try MongoDB first, otherwise generate a sample."""
-    mongo_uri = os.getenv('MONGO_URI')
-    if MongoClientWrapper is not None and mongo_uri:
+async def get_field(field_id: str, request: Request):
+    """Return single field by id. Try the field cache and MongoDB first, otherwise generate a sample."""
+    cached = await field_cache.get(f'doc:{field_id}')
+    if cached is not None:
+        return _etag_response(request, *cached)
+
+    client = await clients.mongo()
+    if client is not None and not client.dry_run:
         try:
-            client = MongoClientWrapper(dry_run=False, uri=mongo_uri)
             db = client.get_db('pasture')
             if db is not None:
-                doc = db.fields.find_one({'_id': field_id})
+                doc = await db.fields.find_one({'_id': field_id})
                 if doc:
                     try:
                         doc['_id'] = str(doc['_id'])
                     except Exception:
                         pass
-                    return doc
+                    return _etag_response(request, *await field_cache.set(f'doc:{field_id}', _json_body(doc)))
         except Exception as e:
             logger.warning(f"Could not fetch field {field_id} from MongoDB: {e}")
 
     # Fallback
-    return generate_field(field_id=field_id)
+    body = _json_body(generate_field(field_id=field_id))
+    return _etag_response(request, make_etag(body), body)
+
+
+def _encode_cursor(paging_state: bytes | None) -> str | None:
+    return base64.urlsafe_b64encode(paging_state).rstrip(b'=').decode() if paging_state else None
+
+
+def _decode_cursor(cursor: str | None) -> bytes | None:
+    if not cursor:
+        return None
+    try:
+        return base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    # generated sample timestamps are naive UTC
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def _read_rollups(client, field_id, metric, resolution, start, end, limit, paging_state):
+    """One page of rollup rows, newest period first.
+
+    Without `metric` every sensor metric is read (one page each) and merged by period, with no cursor.
+    """
+    table = ROLLUP_TABLES[resolution]
+    # include the period that contains `start`
+    start = period_start(start, resolution) if start is not None else None
+
+    async def _one(m, state):
+        q, params = timeseries_query(table, field_id, metric=m, start=start, end=end,
+                                     columns=('period',) + ROLLUP_COLUMNS, time_column='period')
+        rows, next_state = await client.execute_page(await client.prepare(q), params, fetch_size=limit, paging_state=state)
+        return [rollup_point(field_id, m, r.period, rollup_from_row(r)) for r in rows], next_state
+
+    if metric:
+        return await _one(metric, paging_state)
+    pages = await asyncio.gather(*(_one(m, None) for m in SENSORS))
+    return list(heapq.merge(*(rows for rows, _ in pages), key=lambda r: r['sensor_ts'], reverse=True)), None
+
+
+def _raw_point(r) -> Dict[str, Any]:
+    return {
+        'field_id': r.field_id,
+        'sensor_ts': getattr(r, 'sensor_ts', None).isoformat() if getattr(r, 'sensor_ts', None) else None,
+        'sensor_id': getattr(r, 'sensor_id', None),
+        'metric_type': getattr(r, 'metric_type', None),
+        'metric_value': getattr(r, 'metric_value', None),
+    }
+
+
+async def _timeseries_page(client, field_id, metric, resolution, start, end, periods, paging_state):
+    """Fetch one page of rows from Cassandra; returns `(rows, paging_state)` for the next page or None."""
+    if resolution != 'raw':
+        return await _read_rollups(client, field_id, metric, resolution, start, end, periods, paging_state)
+    table = os.getenv('CASSANDRA_METRIC_TABLE', 'sensor_data_by_field_metric') if metric else os.getenv('CASSANDRA_TABLE', 'sensor_data_by_field')
+    if client.bucket:
+        rows, next_state = await client.read_buckets(table, field_id, start, end, limit=periods,
+                                                     metric=metric, cursor=paging_state)
+    else:
+        q, params = timeseries_query(table, field_id, metric=metric, start=start, end=end)
+        prepared = await client.prepare(q)
+        # only the requested page is fetched; later pages are read when the client asks for them
+        rows, next_state = await client.execute_page(prepared, params, fetch_size=periods, paging_state=paging_state)
+    return [_raw_point(r) for r in rows], next_state
+
+
+def _ndjson_rows(rows) -> bytes:
+    return b''.join(_ndjson_line(r) for r in rows)
+
+
+# streamed timeseries representations: media type -> (body prefix, encoder for one page of rows)
+TIMESERIES_STREAMS = {
+    NDJSON: (b'', _ndjson_rows),
+    columnar.MEDIA_TYPE: (columnar.HEADER, columnar.encode_frames),
+}
+
+
+async def _stream_pages(first_rows, next_state, fetch_page, encode=_ndjson_rows, prefix=b''):
+    """Encoded first page, then each further page as the client reads on."""
+    rows = first_rows
+    if prefix:
+        yield prefix
+    while True:
+        yield encode(rows)
+        if next_state is None:
+            return
+        try:
+            rows, next_state = await fetch_page(next_state)
+        except Exception as e:
+            logger.error(f"Timeseries stream failed: {e}")
+            return
+
+
+def _sample_timeseries(field_id, metric, resolution, start, end, periods):
+    from src.generator import generate_sensor_series
+    rows = generate_sensor_series(field_id=field_id, periods=periods)
+    start, end = _naive_utc(start), _naive_utc(end)
+    if metric:
+        rows = [r for r in rows if r.get('metric_type') == metric]
+    if start is not None:
+        rows = [r for r in rows if datetime.fromisoformat(r['sensor_ts']) >= start]
+    if end is not None:
+        rows = [r for r in rows if datetime.fromisoformat(r['sensor_ts']) < end]
+    if resolution != 'raw':
+        partials = sorted(rollup_partials(rows, resolution).items(), key=lambda item: item[0][2], reverse=True)
+        return [rollup_point(fid, m, period, agg) for (fid, m, period), agg in partials]
+    return rows
 
 
 @app.get('/api/fields/{field_id}/timeseries')
-def get_field_timeseries(field_id: str, metric: str = None, periods: int = 48) -> List[Dict[str, Any]]:
-    """Return time-series for a field. If Cassandra is configured, query it; otherwise generate sample series."""
-    contact = os.getenv('CASSANDRA_CONTACT_POINTS')
-    table = os.getenv('CASSANDRA_TABLE', 'sensor_data_by_field')
-    if CassandraClientWrapper is not None and contact:
+async def get_field_timeseries(field_id: str, request: Request, response: Response, metric: str = None,
+                               periods: int = Query(48, ge=1, le=10000),
+                               start: datetime | None = None, end: datetime | None = None,
+                               cursor: str | None = None,
+                               resolution: str = Query('auto', pattern='^(auto|raw|hour|day)$')) -> List[Dict[str, Any]]:
+    """Return one page of time-series rows for a field, newest first.
+
+    `resolution` selects raw readings or the hourly/daily rollups (one row per period with
+    count/sum/min/max/last and the mean as `metric_value`); `auto` picks by the `start`..`end` span.
+
+    `metric`, `start` (inclusive) and `end` (exclusive) are applied by Cassandra; a metric read goes to
+    the `(field_id, metric_type)`-partitioned table, and time-bucketed tables are read bucket by bucket.
+    `periods` is the page size. When more rows match,
+    the `X-Next-Cursor` response header holds an opaque cursor to pass back as `cursor`.
+    With `Accept: application/x-ndjson` every matching row is streamed instead, one Cassandra page
+    of `periods` rows at a time; `Accept: application/x-pasture-columnar` streams the same pages as
+    packed per-metric timestamp/value arrays (see `src.columnar`).
+    Without Cassandra, a generated sample series is filtered instead.
+    """
+    if resolution == 'auto':
+        resolution = choose_resolution(start, end)
+    stream = next((m for m in TIMESERIES_STREAMS if _accepts(request, m)), None)
+    client = await clients.cassandra()
+    if client is not None and not client.dry_run:
+        paging_state = _decode_cursor(cursor)
+        if client.bucket and resolution == 'raw':
+            # bucketed partitions: fan out over the buckets in range, bounded by the data TTL
+            end = end or datetime.now(timezone.utc)
+            start = start or end - timedelta(days=int(os.getenv('SENSOR_TTL_DAYS', 90)))
         try:
-            client = CassandraClientWrapper(contact_points=contact.split(','), dry_run=False)
-            session = client.session
-            if session is not None:
-                # Query sensor rows for field_id
-                q = f"SELECT field_id, sensor_ts, sensor_id, metric_type, metric_value FROM {table} WHERE field_id=%s LIMIT %s"
-                prepared = session.prepare(q)
-                rows = session.execute(prepared, (field_id, periods))
-                result = []
-                for r in rows:
-                    result.append({
-                        'field_id': r.field_id,
-                        'sensor_ts': getattr(r, 'sensor_ts', None).isoformat() if getattr(r, 'sensor_ts', None) else None,
-                        'sensor_id': getattr(r, 'sensor_id', None),
-                        'metric_type': getattr(r, 'metric_type', None),
-                        'metric_value': getattr(r, 'metric_value', None),
-                    })
+            if client.session is not None:
+                result, next_state = await _timeseries_page(client, field_id, metric, resolution, start, end, periods, paging_state)
+                if stream:
+                    def _fetch(state):
+                        return _timeseries_page(client, field_id, metric, resolution, start, end, periods, state)
+                    prefix, encode = TIMESERIES_STREAMS[stream]
+                    return StreamingResponse(_stream_pages(result, next_state, _fetch, encode, prefix), media_type=stream)
+                next_cursor = _encode_cursor(next_state)
+                if next_cursor:
+                    response.headers['X-Next-Cursor'] = next_cursor
                 return result
         except Exception as e:
             logger.warning(f"Could not query Cassandra for timeseries: {e}")
 
     # Fallback: generate sample sensor series
     try:
-        from src.generator import generate_sensor_series
-        rows = generate_sensor_series(field_id=field_id, periods=periods)
-        if metric:
-            rows = [r for r in rows if r.get('metric_type') == metric]
-        return rows
+        rows = _sample_timeseries(field_id, metric, resolution, start, end, periods)
     except Exception as e:
         logger.error(f"Failed to generate sample timeseries: {e}")
-        return []
+        rows = []
+    if stream:
+        prefix, encode = TIMESERIES_STREAMS[stream]
+        return Response(content=prefix + encode(rows), media_type=stream)
+    return rows
 
 
 # ------ Ingestion models and endpoints ------
 
 
 class FieldDoc(BaseModel):
-    _id: str
+    # `_id` would be a private attribute, never parsed nor dumped
+    id: str = Field(alias='_id')
     farm_id: str
     name: str
     boundary: Dict[str, Any]
@@ -159,111 +576,173 @@ class SensorRow(BaseModel):
     quality_flag: int | None = 0
 
 
-def _make_mongo_client():
-    uri = os.getenv('MONGO_URI')
-    if MongoClientWrapper is None:
-        return None
-    try:
-        return MongoClientWrapper(dry_run=(uri is None), uri=uri)
-    except Exception:
-        return None
-
-
-def _make_cassandra_client():
-    contact = os.getenv('CASSANDRA_CONTACT_POINTS')
-    if CassandraClientWrapper is None:
-        return None
-    try:
-        return CassandraClientWrapper(contact_points=contact.split(',') if contact else None, dry_run=(contact is None))
-    except Exception:
-        return None
-
-
-def _make_redis_client():
-    url = os.getenv('REDIS_URI') or os.getenv('REDIS_URL')
-    if RedisClientWrapper is None:
-        return None
-    try:
-        return RedisClientWrapper(url=url, dry_run=(url is None))
-    except Exception:
-        return None
-
-
-def _make_neo4j_client():
-    uri = os.getenv('NEO4J_URI')
-    user = os.getenv('NEO4J_USER')
-    pw = os.getenv('NEO4J_PASSWORD') or os.getenv('NEO4J_AUTH')
-    if Neo4jClientWrapper is None:
-        return None
-    try:
-        return Neo4jClientWrapper(uri=uri, user=user, password=pw, dry_run=(uri is None))
-    except Exception:
-        return None
-
-
 @app.post('/api/fields', status_code=201)
-def ingest_field(field: FieldDoc, background_tasks: BackgroundTasks):
+async def ingest_field(field: FieldDoc, background_tasks: BackgroundTasks):
     """Ingest or upsert a field document into MongoDB. Runs insert in background when possible."""
-    client = _make_mongo_client()
+    client = await clients.mongo()
     if client is None:
         # No Mongo client available; return accepted but not stored
         logger.warning('Mongo client unavailable; skipping persistent storage for field')
         return {"status": "accepted", "stored": False}
 
     # Use background task to avoid blocking
-    def _do_insert(fdoc: dict):
+    async def _do_insert(fdoc: dict):
         try:
-            client.insert_field('pasture', fdoc)
+            await client.insert_field('pasture', fdoc)
             logger.info(f"Inserted/updated field {fdoc.get('_id')}")
+            # drop the cached list and document here and, via pub/sub, in every other worker
+            await field_cache.invalidate(*field_keys([fdoc['_id']]))
         except Exception as e:
             logger.error(f"Failed to insert field: {e}")
 
-    background_tasks.add_task(_do_insert, field.dict())
+    background_tasks.add_task(_do_insert, field.model_dump(by_alias=True))
     return {"status": "accepted", "stored": True}
 
 
+async def _write_sensor_batch(rlist: List[dict]):
+    """Write one batch of queued sensor rows (possibly from many requests and fields) to every store."""
+    cass_client, redis_client, neo4j_client = await asyncio.gather(clients.cassandra(), clients.redis(), clients.neo4j())
+
+    async def _to_cassandra():
+        # Insert into Cassandra (one concurrent bulk write per table for the whole batch)
+        try:
+            tables = (os.getenv('CASSANDRA_TABLE', 'sensor_data_by_field'),
+                      os.getenv('CASSANDRA_METRIC_TABLE', 'sensor_data_by_field_metric'))
+            await asyncio.gather(*(cass_client.insert_sensor_rows(
+                table, rlist,
+                ttl=int(os.getenv('SENSOR_TTL_DAYS', 90)) * 24 * 3600,
+                concurrency=int(os.getenv('CASSANDRA_WRITE_CONCURRENCY', 64)),
+            ) for table in tables))
+        except Exception as e:
+            logger.error(f"Cassandra bulk insert failed for {len(rlist)} rows: {e}")
+            raise
+        try:
+            await asyncio.gather(*(cass_client.merge_rollups(table, rollup_partials(rlist, resolution))
+                                   for resolution, table in ROLLUP_TABLES.items()))
+        except Exception as e:
+            logger.error(f"Rollup merge failed for {len(rlist)} rows: {e}")
+            raise
+
+    async def _to_redis():
+        # Update Redis latest metrics for metric types (one pipelined flush per batch)
+        try:
+            async with redis_client.batch() as rb:
+                for row in rlist:
+                    # update a simple hash with latest metric value and timestamp
+                    rb.hset_latest(row['field_id'], {row['metric_type']: row['metric_value'], 'last_ts': row['sensor_ts']})
+        except Exception as e:
+            logger.error(f"Redis update failed for {len(rlist)} rows: {e}")
+            raise
+
+    async def _to_neo4j():
+        # push Neo4j events for alert transitions of the `events` threshold rules; the per-field
+        # alert state is shared through Redis when it is configured
+        try:
+            shared = redis_client is not None and not redis_client.dry_run
+            # workers writing batches of the same field take turns from evaluation to commit
+            async with event_rules.alocked(rlist):
+                if shared:
+                    matches, changed = await event_rules.aevaluate(rlist, redis_client)
+                else:
+                    matches, changed = event_rules.evaluate(rlist)
+                async with neo4j_client.event_batch() as events:
+                    for fid, event_type, props in matches:
+                        events.add_event(fid, event_type, props)
+                # the state moves on only once its events are written
+                if shared:
+                    await event_rules.acommit(changed, redis_client)
+                else:
+                    event_rules.commit(changed)
+        except Exception as e:
+            logger.error(f"Neo4j event creation failed for {len(rlist)} rows: {e}")
+            raise
+
+    # the sinks are independent, so their writes overlap on the event loop; every sink is tried
+    # before a failure is raised, which leaves the queue entries unacknowledged for redelivery
+    sinks = []
+    if cass_client is not None:
+        sinks.append(_to_cassandra())
+    if redis_client is not None:
+        sinks.append(_to_redis())
+    if neo4j_client is not None:
+        sinks.append(_to_neo4j())
+    results = await asyncio.gather(*sinks, return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(sinks)} sinks failed for {len(rlist)} rows; first error: {errors[0]}")
+
+
 @app.post('/api/fields/{field_id}/ingest-sensors')
-def ingest_sensors(field_id: str, rows: List[SensorRow], background_tasks: BackgroundTasks):
-    """Accept list of sensor rows and ingest to Cassandra; update Redis latest metrics and push events to Neo4j as needed in background."""
-    cass_client = _make_cassandra_client()
-    redis_client = _make_redis_client()
-    neo4j_client = _make_neo4j_client()
+async def ingest_sensors(field_id: str, rows: List[SensorRow]):
+    """Accept list of sensor rows and enqueue them for the ingest workers.
+
+    The workers write batches spanning many requests to Cassandra, update Redis latest metrics and
+    push events to Neo4j as needed. When the queue backlog is over its limit the request is refused
+    with 429 and a Retry-After hint instead of being buffered.
+    """
+    if ingest_workers is None:
+        raise HTTPException(status_code=503, detail="Ingest queue is not running")
+    cass_client, redis_client, neo4j_client = await asyncio.gather(clients.cassandra(), clients.redis(), clients.neo4j())
 
     if cass_client is None and redis_client is None and neo4j_client is None:
         raise HTTPException(status_code=503, detail="No database clients available to ingest data")
 
-    def _process_rows(rlist: List[dict]):
-        # Insert into Cassandra
-        try:
-            table = os.getenv('CASSANDRA_TABLE', 'sensor_data_by_field')
-            for r in rlist:
-                row = r
-                if cass_client is not None:
-                    try:
-                        cass_client.insert_sensor_row(table, row, ttl=int(os.getenv('SENSOR_TTL_DAYS', 90)) * 24 * 3600)
-                    except Exception as e:
-                        logger.error(f"Cassandra insert failed for {row}: {e}")
+    retry_after = await ingest_workers.admit([r.model_dump() for r in rows])
+    if retry_after is not None:
+        raise HTTPException(status_code=429, detail="Ingest queue is full", headers={'Retry-After': str(retry_after)})
+    return {"status": "accepted", "rows": len(rows)}
 
-                # Update Redis latest metrics for metric types
-                if redis_client is not None:
-                    try:
-                        # update a simple hash with latest metric value and timestamp
-                        redis_client.hset_latest(field_id, {row['metric_type']: row['metric_value'], 'last_ts': row['sensor_ts']})
-                    except Exception as e:
-                        logger.error(f"Redis update failed for {row}: {e}")
 
-                # Example: push Neo4j event when thresholds are exceeded (simple threshold check)
-                if neo4j_client is not None:
-                    try:
-                        # simple rule: if soil_moisture < critical threshold, create event
-                        if row.get('metric_type') == 'soil_moisture' and float(row.get('metric_value', 0)) < float(os.getenv('MOISTURE_CRITICAL', 20)):
-                            neo4j_client.create_event_for_field(field_id, 'LOW_MOISTURE', {'value': row.get('metric_value'), 'ts': row.get('sensor_ts')})
-                    except Exception as e:
-                        logger.error(f"Neo4j event creation failed for {row}: {e}")
+SSE_HEARTBEAT = 15.0
 
-        except Exception as e:
-            logger.error(f"Background ingestion failed: {e}")
 
-    # schedule background processing
-    background_tasks.add_task(_process_rows, [r.dict() for r in rows])
-    return {"status": "accepted", "rows": len(rows)}
+def _sse_event(entry_id: str, alert: dict) -> bytes:
+    return f"id: {entry_id}\nevent: alert\ndata: {json.dumps(alert, separators=(',', ':'))}\n\n".encode()
+
+
+def _stream_id(entry_id: str):
+    ms, _, seq = entry_id.partition('-')
+    return (int(ms), int(seq or 0))
+
+
+@app.get('/api/alerts/stream')
+async def stream_alerts(request: Request):
+    """Server-sent events for alert transitions as they are added to the Redis `alerts` stream.
+
+    A reconnecting EventSource sends `Last-Event-ID`; alerts added since that id are replayed first.
+    """
+    if not alert_broadcaster.running:
+        raise HTTPException(status_code=503, detail="Alert stream is not available")
+    queue = alert_broadcaster.subscribe()
+    last_id = request.headers.get('last-event-id')
+
+    async def events():
+        seen = None
+        try:
+            yield b'retry: 2000\n\n'
+            if last_id:
+                try:
+                    replay = await alert_broadcaster.redis.alerts_after(last_id, count=1000)
+                except Exception as e:
+                    logger.warning(f"Alert replay after {last_id} failed: {e}")
+                    replay = []
+                for entry_id, alert in replay:
+                    seen = _stream_id(entry_id)
+                    yield _sse_event(entry_id, alert)
+            while True:
+                try:
+                    entry_id, alert = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b': keepalive\n\n'
+                    continue
+                # skip alerts the replay already sent
+                if seen is not None and _stream_id(entry_id) <= seen:
+                    continue
+                yield _sse_event(entry_id, alert)
+        finally:
+            alert_broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
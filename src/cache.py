@@ -0,0 +1,162 @@
+"""Two-tier read cache for field metadata served by the API.
+
+L1 is a per-process LRU with a TTL; L2 is a shared Redis string per key. Entries hold the
+serialized JSON body and its ETag, so a hit costs no Mongo query and no re-serialization. Writes
+invalidate L2 and publish the keys on a pub/sub channel; every worker listens on it and drops
+its own L1 copies, so all uvicorn workers stay consistent. Without Redis (dry-run) only L1 is used.
+Writers outside the API, such as the pipeline's `MongoLatestSink`, call `invalidate_shared` with
+their synchronous Redis client after changing field documents.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger('pasture.cache')
+
+INVALIDATE_CHANNEL = 'cache:fields:invalidate'
+
+
+def field_keys(field_ids: Iterable[str]) -> List[str]:
+    """Cache keys holding the documents of `field_ids`: their own entries and the field list."""
+    return ['list'] + [f'doc:{fid}' for fid in field_ids]
+
+
+def invalidate_shared(redis, keys: List[str], prefix='cache:fields:'):
+    """`FieldCache.invalidate` for processes without a `FieldCache`, given a redis-py client."""
+    if keys:
+        redis.delete(*[prefix + k for k in keys])
+        redis.publish(INVALIDATE_CHANNEL, json.dumps(list(keys)))
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+class LRUTTLCache:
+    def __init__(self, maxsize: int=1024, ttl: float=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+class FieldCache:
+    """`(etag, body)` entries keyed by short names such as `list` or `doc:{field_id}`."""
+
+    def __init__(self, maxsize: Optional[int]=None, l1_ttl: Optional[float]=None, l2_ttl: Optional[int]=None, prefix='cache:fields:'):
+        self.l1 = LRUTTLCache(maxsize=int(maxsize or os.getenv('FIELD_CACHE_SIZE', 1024)),
+                              ttl=float(l1_ttl or os.getenv('FIELD_CACHE_L1_TTL', 30)))
+        self.l2_ttl = int(l2_ttl or os.getenv('FIELD_CACHE_L2_TTL', 300))
+        self.prefix = prefix
+        self.redis = None
+        self._listener = None
+
+    async def start(self, redis_wrapper):
+        """Attach the shared Redis tier and start listening for invalidations from other workers."""
+        if redis_wrapper is None or redis_wrapper.dry_run:
+            return
+        self.redis = redis_wrapper.client
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+        self.redis = None
+
+    async def get(self, key) -> Optional[Tuple[str, bytes]]:
+        entry = self.l1.get(key)
+        if entry is not None or self.redis is None:
+            return entry
+        try:
+            raw = await self.redis.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"L2 cache read failed for {key}: {e}")
+            return None
+        if raw is None:
+            return None
+        etag, _, body = raw.partition(b'\n')
+        entry = (etag.decode(), body)
+        self.l1.set(key, entry)
+        return entry
+
+    async def set(self, key, body: bytes) -> Tuple[str, bytes]:
+        entry = (make_etag(body), body)
+        self.l1.set(key, entry)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.prefix + key, entry[0].encode() + b'\n' + body, ex=self.l2_ttl)
+            except Exception as e:
+                logger.warning(f"L2 cache write failed for {key}: {e}")
+        return entry
+
+    async def invalidate(self, *keys):
+        for key in keys:
+            self.l1.delete(key)
+        if self.redis is not None and keys:
+            try:
+                await self.redis.delete(*[self.prefix + k for k in keys])
+                await self.redis.publish(INVALIDATE_CHANNEL, json.dumps(list(keys)))
+            except Exception as e:
+                logger.warning(f"Cache invalidation failed for {keys}: {e}")
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                while True:
+                    # poll with a timeout: a blocking read would hit the pool's socket_timeout while idle
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is None or message.get('type') != 'message':
+                        continue
+                    for key in json.loads(message['data']):
+                        self.l1.delete(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # a missed message could leave stale L1 entries, so start clean after reconnecting
+                logger.warning(f"Cache invalidation listener error, resubscribing: {e}")
+                self.l1.clear()
+                await asyncio.sleep(1.0)
+            finally:
+                # give the subscription's connection back on errors and on shutdown
+                await pubsub.aclose()
@@ -3,9 +3,12 @@
 Each client supports `dry_run` mode so scripts can be tested without actual databases.
 """
 
-from .mongo_client import MongoClientWrapper
-from .cassandra_client import CassandraClientWrapper
-from .redis_client import RedisClientWrapper
-from .neo4j_client import Neo4jClientWrapper
+from .mongo_client import MongoClientWrapper, AsyncMongoClientWrapper
+from .cassandra_client import CassandraClientWrapper, AsyncCassandraClientWrapper
+from .redis_client import RedisClientWrapper, AsyncRedisClientWrapper
+from .neo4j_client import Neo4jClientWrapper, AsyncNeo4jClientWrapper
+from .registry import AsyncClientRegistry
 
-__all__ = ["MongoClientWrapper","CassandraClientWrapper","RedisClientWrapper","Neo4jClientWrapper"]
+__all__ = ["MongoClientWrapper","CassandraClientWrapper","RedisClientWrapper","Neo4jClientWrapper",
+           "AsyncMongoClientWrapper","AsyncCassandraClientWrapper","AsyncRedisClientWrapper","AsyncNeo4jClientWrapper",
+           "AsyncClientRegistry"]
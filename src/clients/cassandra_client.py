@@ -1,23 +1,129 @@
+import asyncio
 import os
-from typing import Optional
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from src import metrics
+from src.rollups import merge_rollup, unseen
 
 try:
     from cassandra.cluster import Cluster
+    from cassandra.query import BatchStatement, BatchType
 except Exception:
     Cluster = None
+    BatchStatement = None
+    BatchType = None
+
+
+def _to_timestamp(value):
+    """Coerce ISO-8601 strings (as produced by the generator) into datetimes for binding."""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value
+
+
+# Partition time buckets: a bucket is `epoch_seconds // size`, stored in an int `bucket` column
+BUCKET_SECONDS = {'day': 86400, 'week': 7 * 86400}
+
+
+def time_bucket(ts, granularity='day') -> int:
+    """Bucket number of a timestamp (datetime or ISO string; naive values are UTC)."""
+    ts = _to_timestamp(ts)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() // BUCKET_SECONDS[granularity])
+
+
+def bucket_range(start, end, granularity='day'):
+    """Buckets overlapping `[start, end)`, newest first (the order rows are read in)."""
+    return list(range(time_bucket(end, granularity), time_bucket(start, granularity) - 1, -1))
+
+
+def _pack_cursor(bucket: int, paging_state: Optional[bytes]) -> bytes:
+    return b'%d:' % bucket + (paging_state or b'')
+
+
+def _unpack_cursor(cursor: bytes):
+    bucket, _, state = cursor.partition(b':')
+    return int(bucket), state or None
+
+
+TIMESERIES_COLUMNS = ('field_id', 'sensor_ts', 'sensor_id', 'metric_type', 'metric_value')
+
+
+def timeseries_query(table, field_id, metric=None, start=None, end=None, columns=TIMESERIES_COLUMNS, bucket=None,
+                     time_column='sensor_ts'):
+    """Return `(cql, params)` reading one field's rows newest first, with every filter in the WHERE clause.
+
+    With `metric`, `table` must be partitioned by `(field_id, metric_type)`
+    (see `ensure_sensor_table(by_metric=True)`) so the filter selects a partition. `bucket`
+    selects one time bucket of a bucketed table.
+    """
+    where = ['field_id=?']
+    params = [field_id]
+    if metric is not None:
+        where.append('metric_type=?')
+        params.append(metric)
+    if bucket is not None:
+        where.append('bucket=?')
+        params.append(bucket)
+    if start is not None:
+        where.append(f'{time_column}>=?')
+        params.append(_to_timestamp(start))
+    if end is not None:
+        where.append(f'{time_column}<?')
+        params.append(_to_timestamp(end))
+    return f"SELECT {', '.join(columns)} FROM {table} WHERE {' AND '.join(where)}", tuple(params)
+
+
+ROLLUP_COLUMNS = ('value_count', 'value_sum', 'value_min', 'value_max', 'value_last', 'last_ts')
+
+
+# the merge also reads and writes the ids of the readings each period already holds
+MERGE_COLUMNS = ROLLUP_COLUMNS + ('readings',)
+
+
+def rollup_from_row(row) -> dict:
+    return {'count': row.value_count, 'sum': row.value_sum, 'min': row.value_min, 'max': row.value_max,
+            'last': row.value_last, 'last_ts': row.last_ts,
+            'readings': dict.fromkeys(getattr(row, 'readings', None) or ())}
+
+
+def _rollup_values(agg: dict) -> tuple:
+    return (agg['count'], agg['sum'], agg['min'], agg['max'], agg['last'], agg['last_ts'])
+
+
+def _applied(rows) -> bool:
+    # conditional statements return one row whose first column is `[applied]`
+    return bool(rows and rows[0][0])
 
 
 class CassandraClientWrapper:
-    def __init__(self, contact_points=None, keyspace='pasture', dry_run=True):
+    def __init__(self, contact_points=None, keyspace='pasture', dry_run=True, request_timeout: Optional[float]=None,
+                 bucket: Optional[str]=None, **cluster_options):
+        """`cluster_options` are passed to `Cluster` (e.g. connect_timeout); `request_timeout` sets the session default.
+
+        `bucket` ('day' or 'week', default `CASSANDRA_BUCKET`) adds a time bucket to the partition key of
+        the sensor tables, so partitions stay bounded; rows are routed to their bucket on write.
+        """
         self.dry_run = dry_run
         self.contact_points = contact_points or os.getenv('CASSANDRA_CONTACT_POINTS', '127.0.0.1').split(',')
         self.keyspace = keyspace
+        self.bucket = bucket if bucket is not None else (os.getenv('CASSANDRA_BUCKET') or None)
+        if self.bucket is not None and self.bucket not in BUCKET_SECONDS:
+            raise ValueError(f"bucket must be one of {sorted(BUCKET_SECONDS)}, got {self.bucket!r}")
+        self.cluster = None
         self.session = None
+        # prepared INSERT statements keyed by (table, columns, ttl)
+        self._prepared = {}
         if not dry_run and Cluster is None:
             raise RuntimeError('cassandra-driver not available')
         if not dry_run:
-            cluster = Cluster(self.contact_points)
-            self.session = cluster.connect()
+            self.cluster = Cluster(self.contact_points, **cluster_options)
+            self.session = self.cluster.connect()
+            if request_timeout is not None:
+                self.session.default_timeout = request_timeout
             # create keyspace if not exists
             self.session.execute("""
                 CREATE KEYSPACE IF NOT EXISTS %s
@@ -25,31 +131,398 @@ class CassandraClientWrapper:
             """ % self.keyspace)
             self.session.set_keyspace(self.keyspace)
 
-    def ensure_sensor_table(self, table='sensor_data_by_field'):
+    def close(self):
+        if self.cluster:
+            self.cluster.shutdown()
+
+    def ensure_sensor_table(self, table='sensor_data_by_field', by_metric=False):
+        """Create the sensor table; `by_metric` partitions by `(field_id, metric_type)` for per-metric reads.
+
+        With `self.bucket` set, the time bucket is part of the partition key as well.
+        """
         if self.dry_run:
-            print(f"[cassandra dry-run] would ensure table {table} in keyspace {self.keyspace}")
+            print(f"[cassandra dry-run] would ensure table {table} in keyspace {self.keyspace} bucket={self.bucket}")
             return
+        keys = ['field_id'] + (['metric_type'] if by_metric else []) + (['bucket'] if self.bucket else [])
+        partition = f"({', '.join(keys)})"
+        bucket_col = "bucket int," if self.bucket else ""
         q = f"""
         CREATE TABLE IF NOT EXISTS {table} (
           field_id text,
+          {bucket_col}
           sensor_ts timestamp,
           sensor_id text,
           metric_type text,
           metric_value double,
           quality_flag int,
-          PRIMARY KEY ((field_id), sensor_ts, sensor_id)
+          PRIMARY KEY ({partition}, sensor_ts, sensor_id)
         ) WITH CLUSTERING ORDER BY (sensor_ts DESC);
         """
         self.session.execute(q)
 
+    def _prepared_insert(self, table, cols: tuple, ttl: Optional[int]=None):
+        """Return a cached prepared INSERT for this column set and TTL, preparing it on first use."""
+        key = (table, cols, ttl)
+        stmt = self._prepared.get(key)
+        if stmt is None:
+            q = f"INSERT INTO {table} ({','.join(cols)}) VALUES ({','.join(['?']*len(cols))})"
+            if ttl:
+                q += f" USING TTL {int(ttl)}"
+            stmt = self.session.prepare(q)
+            self._prepared[key] = stmt
+        return stmt
+
+    @staticmethod
+    def _bind_values(row: dict):
+        return tuple(_to_timestamp(v) if k == 'sensor_ts' else v for k, v in row.items())
+
+    def _route(self, row: dict) -> dict:
+        """Add the `bucket` column for bucketed tables; rows pass through unchanged otherwise."""
+        if self.bucket is None:
+            return row
+        return {**row, 'bucket': time_bucket(row['sensor_ts'], self.bucket)}
+
     def insert_sensor_row(self, table, row: dict, ttl: Optional[int]=None):
         if self.dry_run:
             print(f"[cassandra dry-run] would insert into {table}: {row} TTL={ttl}")
+            metrics.dry_run('cassandra', 'insert', 1)
             return True
-        cols = ",".join(row.keys())
-        placeholders = ",".join(["%s"]*len(row))
-        q = f"INSERT INTO {table} ({cols}) VALUES ({placeholders})"
-        if ttl:
-            q += f" USING TTL {ttl}"
-        prepared = self.session.prepare(q)
-        self.session.execute(prepared, tuple(row.values()))
+        row = self._route(row)
+        prepared = self._prepared_insert(table, tuple(row.keys()), ttl)
+        with metrics.timed('cassandra', 'insert', 1):
+            self.session.execute(prepared, self._bind_values(row))
+
+    def insert_sensor_rows(self, table, rows: Iterable[dict], ttl: Optional[int]=None,
+                           concurrency: int=64, batch_by_partition: bool=False, batch_size: int=50):
+        """Write many rows with bounded in-flight `execute_async` requests.
+
+        With `batch_by_partition`, rows sharing a `field_id` (and bucket) are grouped into UNLOGGED batches of
+        at most `batch_size` statements, which stay single-partition and therefore cheap for the
+        coordinator. Returns the number of rows written.
+        """
+        rows = list(rows)
+        if self.dry_run:
+            print(f"[cassandra dry-run] would insert {len(rows)} rows into {table} TTL={ttl} "
+                  f"concurrency={concurrency} batch_by_partition={batch_by_partition}")
+            metrics.dry_run('cassandra', 'insert', len(rows))
+            return len(rows)
+        with metrics.timed('cassandra', 'insert', len(rows)):
+            return self._insert_planned(table, rows, ttl, concurrency, batch_by_partition, batch_size)
+
+    def _insert_planned(self, table, rows: list, ttl, concurrency, batch_by_partition, batch_size):
+        work = self._write_plan(table, rows, ttl, batch_by_partition, batch_size)
+        written = 0
+        errors = []
+        in_flight = deque()
+
+        def _drain_one():
+            nonlocal written
+            future, count = in_flight.popleft()
+            try:
+                future.result()
+                written += count
+            except Exception as e:
+                errors.append(e)
+
+        for stmt, params, count in work:
+            if len(in_flight) >= concurrency:
+                _drain_one()
+            in_flight.append((self.session.execute_async(stmt, params), count))
+        while in_flight:
+            _drain_one()
+
+        if errors:
+            raise RuntimeError(f"{len(errors)} of {len(work)} Cassandra writes failed "
+                               f"({written}/{len(rows)} rows written); first error: {errors[0]}")
+        return written
+
+    def _write_plan(self, table, rows: list, ttl, batch_by_partition, batch_size):
+        """Turn rows into `(statement, params, row_count)` work items for `execute_async`."""
+        work = []
+        rows = [self._route(row) for row in rows]
+        if batch_by_partition:
+            by_partition = defaultdict(list)
+            for row in rows:
+                by_partition[(row.get('field_id'), row.get('bucket'))].append(row)
+            for part_rows in by_partition.values():
+                for i in range(0, len(part_rows), batch_size):
+                    chunk = part_rows[i:i+batch_size]
+                    batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+                    for row in chunk:
+                        batch.add(self._prepared_insert(table, tuple(row.keys()), ttl), self._bind_values(row))
+                    work.append((batch, None, len(chunk)))
+        else:
+            for row in rows:
+                work.append((self._prepared_insert(table, tuple(row.keys()), ttl), self._bind_values(row), 1))
+        return work
+
+    def ensure_rollup_table(self, table):
+        if self.dry_run:
+            print(f"[cassandra dry-run] would ensure rollup table {table} in keyspace {self.keyspace}")
+            return
+        self.session.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+          field_id text,
+          metric_type text,
+          period timestamp,
+          value_count bigint,
+          value_sum double,
+          value_min double,
+          value_max double,
+          value_last double,
+          last_ts timestamp,
+          readings set<text>,
+          PRIMARY KEY ((field_id, metric_type), period)
+        ) WITH CLUSTERING ORDER BY (period DESC);
+        """)
+        # tables created before the merge tracked reading ids
+        keyspace = self.cluster.metadata.keyspaces.get(self.keyspace) if self.cluster else None
+        existing = keyspace.tables.get(table) if keyspace else None
+        if existing is not None and 'readings' not in existing.columns:
+            self.session.execute(f"ALTER TABLE {table} ADD readings set<text>")
+
+    def _rollup_statements(self, table):
+        """Prepared (select, insert-if-absent, update-if-unchanged) statements for one rollup table."""
+        key = ('rollup', table)
+        stmts = self._prepared.get(key)
+        if stmts is None:
+            where = "field_id=? AND metric_type=? AND period=?"
+            stmts = (
+                self.session.prepare(f"SELECT {', '.join(MERGE_COLUMNS)} FROM {table} WHERE {where}"),
+                self.session.prepare(f"INSERT INTO {table} (field_id, metric_type, period, {', '.join(MERGE_COLUMNS)}) "
+                                     f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) IF NOT EXISTS"),
+                # readings are appended, not rewritten: no tombstone and no growing write per merge
+                self.session.prepare(f"UPDATE {table} SET {', '.join(c + '=?' for c in ROLLUP_COLUMNS)}, "
+                                     f"readings=readings+? "
+                                     f"WHERE {where} IF value_count=?"),
+            )
+            self._prepared[key] = stmts
+        return stmts
+
+    def _rollup_writes(self, table, pending: dict, current: list):
+        """`(key, statement, params)` conditional writes merging each pending partial into its stored row.
+
+        Readings the stored row already holds are left out, and keys with nothing new get no write.
+        """
+        _, insert, update = self._rollup_statements(table)
+        writes = []
+        for (key, partial), rows in zip(pending.items(), current):
+            if not rows:
+                writes.append((key, insert, key + _rollup_values(partial) + (set(partial['readings']),)))
+                continue
+            stored = rollup_from_row(rows[0])
+            fresh = unseen(partial, stored['readings'].keys())
+            if fresh is not None:
+                writes.append((key, update, _rollup_values(merge_rollup(stored, fresh)) + (set(fresh['readings']),)
+                               + key + (stored['count'],)))
+        return writes
+
+    def _execute_all(self, work, concurrency):
+        """Run `(statement, params)` items with bounded in-flight requests; returns each first page, in order."""
+        results = [None] * len(work)
+        in_flight = deque()
+        for i, (stmt, params) in enumerate(work):
+            if len(in_flight) >= concurrency:
+                j, future = in_flight.popleft()
+                results[j] = list(future.result().current_rows)
+            in_flight.append((i, self.session.execute_async(stmt, params)))
+        while in_flight:
+            j, future = in_flight.popleft()
+            results[j] = list(future.result().current_rows)
+        return results
+
+    def merge_rollups(self, table, partials: dict, concurrency: int=64, max_rounds: int=10):
+        """Compare-and-merge `{(field_id, metric_type, period): aggregate}` into a rollup table.
+
+        Each round reads the stored rows, then writes the merged values with a lightweight
+        transaction that only applies if `value_count` is unchanged (or the row is still absent).
+        Keys that lost a race to another writer are re-read and retried in the next round.
+        Readings already merged into a period are skipped, so replaying a batch changes nothing.
+        Returns the number of periods merged.
+        """
+        if self.dry_run:
+            print(f"[cassandra dry-run] would merge {len(partials)} rollup periods into {table}")
+            metrics.dry_run('cassandra', 'rollup_merge', len(partials))
+            return len(partials)
+        with metrics.timed('cassandra', 'rollup_merge', len(partials)):
+            return self._merge_rollups(table, partials, concurrency, max_rounds)
+
+    def _merge_rollups(self, table, partials: dict, concurrency: int, max_rounds: int):
+        select = self._rollup_statements(table)[0]
+        pending = dict(partials)
+        for _ in range(max_rounds):
+            if not pending:
+                return len(partials)
+            current = self._execute_all([(select, key) for key in pending], concurrency)
+            writes = self._rollup_writes(table, pending, current)
+            results = self._execute_all([(stmt, params) for _, stmt, params in writes], concurrency)
+            pending = {key: pending[key] for (key, _, _), rows in zip(writes, results) if not _applied(rows)}
+        if pending:
+            raise RuntimeError(f"{len(pending)} rollup periods in {table} still conflicting after {max_rounds} rounds")
+        return len(partials)
+
+
+def _as_asyncio_future(response_future):
+    """Bridge a driver `ResponseFuture` (completed on the driver's IO thread) to the running loop."""
+    loop = asyncio.get_running_loop()
+    aio_future = loop.create_future()
+
+    def _set(setter, value):
+        if not aio_future.done():
+            setter(value)
+
+    response_future.add_callbacks(
+        lambda rows: loop.call_soon_threadsafe(_set, aio_future.set_result, rows),
+        lambda exc: loop.call_soon_threadsafe(_set, aio_future.set_exception, exc),
+    )
+    return aio_future
+
+
+class AsyncCassandraClientWrapper:
+    """asyncio front-end for `CassandraClientWrapper`.
+
+    Requests go out with `execute_async` and are awaited as asyncio futures, so no worker thread
+    blocks on the driver. Connecting and preparing still use the driver's blocking calls and are
+    pushed to a thread. `execute` resolves to the first page of rows; `execute_page` fetches
+    exactly one page and returns the driver's paging state for the next one.
+    """
+
+    def __init__(self, sync_client: CassandraClientWrapper):
+        self.sync = sync_client
+        self.dry_run = sync_client.dry_run
+        self.keyspace = sync_client.keyspace
+        self.bucket = sync_client.bucket
+        self.session = sync_client.session
+        self._prepared = {}
+
+    @classmethod
+    async def connect(cls, **kwargs):
+        """Create the underlying `CassandraClientWrapper` (same arguments) off the event loop."""
+        return cls(await asyncio.to_thread(CassandraClientWrapper, **kwargs))
+
+    async def close(self):
+        await asyncio.to_thread(self.sync.close)
+
+    async def prepare(self, query):
+        stmt = self._prepared.get(query)
+        if stmt is None:
+            stmt = await asyncio.to_thread(self.session.prepare, query)
+            self._prepared[query] = stmt
+        return stmt
+
+    async def execute(self, stmt, params=None):
+        return await _as_asyncio_future(self.session.execute_async(stmt, params))
+
+    async def execute_page(self, stmt, params=None, fetch_size: int=100, paging_state: Optional[bytes]=None):
+        """Fetch a single page of a prepared query; returns `(rows, paging_state)` for the next page or None."""
+        bound = stmt.bind(params or ())
+        bound.fetch_size = fetch_size
+        response_future = self.session.execute_async(bound, paging_state=paging_state)
+        await _as_asyncio_future(response_future)
+        # already complete, so this does not block; the ResultSet exposes the next page's state
+        result = response_future.result()
+        return list(result.current_rows), result.paging_state
+
+    async def read_buckets(self, table, field_id, start, end, limit: int, metric=None,
+                           cursor: Optional[bytes]=None, parallelism: int=8):
+        """Read up to `limit` rows of `[start, end)` from a bucketed table, newest first.
+
+        Buckets are queried in waves that widen from 1 to `parallelism` concurrent partition reads,
+        so a recent window usually costs one query. Buckets cover disjoint time ranges and each
+        returns rows newest first, so concatenating them in bucket order is the merged order.
+        Returns `(rows, cursor)`; the cursor (bucket plus that bucket's paging state) resumes the read.
+        """
+        buckets = bucket_range(start, end, self.bucket)
+        state = None
+        if cursor:
+            resume, state = _unpack_cursor(cursor)
+            buckets = [b for b in buckets if b <= resume]
+            if not buckets or buckets[0] != resume:
+                state = None
+
+        async def _page(bucket, fetch_size, paging_state=None):
+            q, params = timeseries_query(table, field_id, metric=metric, start=start, end=end, bucket=bucket)
+            return await self.execute_page(await self.prepare(q), params, fetch_size=fetch_size, paging_state=paging_state)
+
+        rows = []
+        i, width = 0, 1
+        while i < len(buckets) and len(rows) < limit:
+            wave = buckets[i:i + width]
+            need = limit - len(rows)
+            # only the first bucket of a wave can be resuming from a paging state
+            starts = [state] + [None] * (len(wave) - 1)
+            pages = await asyncio.gather(*(_page(b, need, st) for b, st in zip(wave, starts)))
+            state = None
+            for bucket, start_state, (page, next_state) in zip(wave, starts, pages):
+                need = limit - len(rows)
+                if len(page) > need:
+                    # prefetched with a larger page size: re-read exactly `need` rows to get a resumable state
+                    page, next_state = await _page(bucket, need, start_state)
+                while next_state is not None and len(page) < need:
+                    more, next_state = await _page(bucket, need - len(page), next_state)
+                    page = page + more
+                rows.extend(page)
+                i += 1
+                if next_state is not None:
+                    return rows, _pack_cursor(bucket, next_state)
+                if len(rows) >= limit:
+                    break
+            width = min(width * 2, parallelism)
+        more_buckets = i < len(buckets)
+        return rows, (_pack_cursor(buckets[i], None) if more_buckets and len(rows) >= limit else None)
+
+    async def merge_rollups(self, table, partials: dict, concurrency: int=64, max_rounds: int=10):
+        """Async `CassandraClientWrapper.merge_rollups`."""
+        if self.dry_run:
+            return self.sync.merge_rollups(table, partials)
+        with metrics.timed('cassandra', 'rollup_merge', len(partials)):
+            return await self._merge_rollups(table, partials, concurrency, max_rounds)
+
+    async def _merge_rollups(self, table, partials: dict, concurrency: int, max_rounds: int):
+        # preparing blocks, so do it off the loop once per table
+        select = (await asyncio.to_thread(self.sync._rollup_statements, table))[0]
+        limit = asyncio.Semaphore(concurrency)
+
+        async def _run(stmt, params):
+            async with limit:
+                return await self.execute(stmt, params)
+
+        pending = dict(partials)
+        for _ in range(max_rounds):
+            if not pending:
+                return len(partials)
+            current = await asyncio.gather(*(_run(select, key) for key in pending))
+            writes = self.sync._rollup_writes(table, pending, current)
+            results = await asyncio.gather(*(_run(stmt, params) for _, stmt, params in writes))
+            pending = {key: pending[key] for (key, _, _), rows in zip(writes, results) if not _applied(rows)}
+        if pending:
+            raise RuntimeError(f"{len(pending)} rollup periods in {table} still conflicting after {max_rounds} rounds")
+        return len(partials)
+
+    async def insert_sensor_rows(self, table, rows: Iterable[dict], ttl: Optional[int]=None,
+                                 concurrency: int=64, batch_by_partition: bool=False, batch_size: int=50):
+        """Async `CassandraClientWrapper.insert_sensor_rows`: at most `concurrency` requests in flight."""
+        rows = list(rows)
+        if self.dry_run:
+            return self.sync.insert_sensor_rows(table, rows, ttl=ttl, concurrency=concurrency,
+                                                batch_by_partition=batch_by_partition, batch_size=batch_size)
+        with metrics.timed('cassandra', 'insert', len(rows)):
+            return await self._insert_planned(table, rows, ttl, concurrency, batch_by_partition, batch_size)
+
+    async def _insert_planned(self, table, rows: list, ttl, concurrency, batch_by_partition, batch_size):
+        # the plan may prepare statements on first use, which blocks
+        work = await asyncio.to_thread(self.sync._write_plan, table, rows, ttl, batch_by_partition, batch_size)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def _write(stmt, params, count):
+            async with limit:
+                await self.execute(stmt, params)
+            return count
+
+        results = await asyncio.gather(*(_write(*item) for item in work), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        written = sum(r for r in results if not isinstance(r, Exception))
+        if errors:
+            raise RuntimeError(f"{len(errors)} of {len(work)} Cassandra writes failed "
+                               f"({written}/{len(rows)} rows written); first error: {errors[0]}")
+        return written
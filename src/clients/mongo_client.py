@@ -1,21 +1,85 @@
 import os
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from src import metrics
 
 try:
-    from pymongo import MongoClient, GEO2D
+    from pymongo import MongoClient, GEO2D, ReplaceOne, UpdateOne
 except Exception:
     MongoClient = None
 
+try:
+    from pymongo import AsyncMongoClient
+except Exception:
+    AsyncMongoClient = None
+
+
+# Declarative index spec, applied idempotently by `create_indexes` (scripts/bootstrap_databases.py).
+# Every query in `src/index_advisor.QUERIES` should be answered by one of these; the advisor's
+# explain check flags any that fall back to a collection scan.
+INDEXES = {
+    'fields': [
+        {'name': 'boundary_2dsphere', 'keys': [('boundary', '2dsphere')]},
+        {'name': 'farm_id_1', 'keys': [('farm_id', 1)]},
+        # covers the low-NDVI threshold query: filter and projection are all in the index
+        {'name': 'ndvi_threshold_covering',
+         'keys': [('latest_metrics.ndvi', 1), ('_id', 1), ('name', 1), ('farm_id', 1), ('soil_type', 1)]},
+        {'name': 'soil_moisture_threshold', 'keys': [('latest_metrics.soil_moisture', 1), ('farm_id', 1)]},
+    ],
+}
+
+
+def _index_keys(keys) -> list:
+    # the server may report directions as floats (e.g. 1.0 for indexes made in the shell)
+    return [(k, int(v) if isinstance(v, (int, float)) else v) for k, v in keys]
+
+
+_OLDEST = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _reading_time(ts) -> datetime:
+    """`sensor_ts` (ISO string with `Z`/offset/fraction, or datetime) as aware UTC; missing or bad sorts oldest."""
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+        except ValueError:
+            return _OLDEST
+    if not isinstance(ts, datetime):
+        return _OLDEST
+    # naive timestamps are UTC, as the generator writes them
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def _latest_metric_updates(readings: Iterable[dict]) -> dict:
+    """Fold sensor readings into `{field_id: {'latest_metrics.<metric>': newest value}}`."""
+    latest = {}
+    for r in readings:
+        key = (r['field_id'], r['metric_type'])
+        when = _reading_time(r.get('sensor_ts'))
+        # on equal timestamps the later reading wins
+        if key not in latest or when >= latest[key][0]:
+            latest[key] = (when, r)
+    updates = {}
+    for (field_id, metric_type), (_, r) in latest.items():
+        updates.setdefault(field_id, {})[f'latest_metrics.{metric_type}'] = r['metric_value']
+    return updates
+
 
 class MongoClientWrapper:
-    def __init__(self, uri: Optional[str]=None, dry_run: bool=True):
+    def __init__(self, uri: Optional[str]=None, dry_run: bool=True, **client_options):
+        """`client_options` are passed to `MongoClient` (e.g. maxPoolSize, serverSelectionTimeoutMS)."""
         self.dry_run = dry_run
         self.uri = uri or os.getenv('MONGO_URI')
         self.client = None
         if not dry_run and MongoClient is None:
             raise RuntimeError("pymongo not available")
         if not dry_run:
-            self.client = MongoClient(self.uri)
+            self.client = MongoClient(self.uri, **client_options)
+
+    def close(self):
+        if self.client:
+            self.client.close()
 
     def get_db(self, name='pasture'):
         if self.dry_run:
@@ -25,9 +89,11 @@ class MongoClientWrapper:
     def insert_field(self, db_name, field_doc):
         if self.dry_run:
             print(f"[mongo dry-run] would insert field into {db_name}: {field_doc.get('_id')}")
+            metrics.dry_run('mongo', 'insert_field', 1)
             return True
         db = self.get_db(db_name)
-        return db.fields.replace_one({'_id': field_doc['_id']}, field_doc, upsert=True)
+        with metrics.timed('mongo', 'insert_field', 1):
+            return db.fields.replace_one({'_id': field_doc['_id']}, field_doc, upsert=True)
 
     def update_latest_metrics(self, db_name, field_id, metric_key, metric_value):
         """Atomically update nested latest_metrics for a field."""
@@ -37,10 +103,106 @@ class MongoClientWrapper:
         db = self.get_db(db_name)
         return db.fields.update_one({'_id': field_id}, {'$set': {f'latest_metrics.{metric_key}': metric_value}}, upsert=True)
 
-    def create_indexes(self, db_name):
+    def bulk_upsert_fields(self, db_name, field_docs: Iterable[dict]):
+        """Upsert many field documents with one unordered `bulk_write`."""
+        docs = list(field_docs)
         if self.dry_run:
-            print(f"[mongo dry-run] would create 2dsphere index on fields.boundary in {db_name}")
-            return
+            print(f"[mongo dry-run] would bulk upsert {len(docs)} fields into {db_name}")
+            metrics.dry_run('mongo', 'upsert_fields', len(docs))
+            return len(docs)
+        if not docs:
+            return None
+        db = self.get_db(db_name)
+        requests = [ReplaceOne({'_id': d['_id']}, d, upsert=True) for d in docs]
+        with metrics.timed('mongo', 'upsert_fields', len(requests)):
+            return db.fields.bulk_write(requests, ordered=False)
+
+    def update_latest_metrics_many(self, db_name, readings: Iterable[dict]):
+        """Fold sensor readings into one `$set` of the newest value per metric for each field.
+
+        `readings` are sensor rows (`field_id`, `metric_type`, `metric_value`, `sensor_ts`); only
+        `latest_metrics.*` is touched, so the rest of the field document is left alone.
+        """
+        updates = _latest_metric_updates(readings)
+        if self.dry_run:
+            print(f"[mongo dry-run] would $set latest_metrics on {len(updates)} fields in {db_name}")
+            metrics.dry_run('mongo', 'upsert', len(updates))
+            return len(updates)
+        if not updates:
+            return None
+        db = self.get_db(db_name)
+        requests = [UpdateOne({'_id': fid}, {'$set': fields}, upsert=True) for fid, fields in updates.items()]
+        with metrics.timed('mongo', 'upsert', len(requests)):
+            return db.fields.bulk_write(requests, ordered=False)
+
+    def create_indexes(self, db_name, spec: dict=INDEXES) -> dict:
+        """Create the indexes in `spec` that are missing; safe to run repeatedly.
+
+        Returns `{collection: {'created': [...], 'existing': [...], 'conflicts': [...]}}`. An index
+        whose name exists with different keys is reported as a conflict and left alone.
+        """
+        report = {}
+        for collection, indexes in spec.items():
+            result = report[collection] = {'created': [], 'existing': [], 'conflicts': []}
+            if self.dry_run:
+                for index in indexes:
+                    print(f"[mongo dry-run] would ensure index {collection}.{index['name']} {index['keys']}")
+                    result['created'].append(index['name'])
+                continue
+            coll = self.get_db(db_name)[collection]
+            existing = {name: _index_keys(info['key']) for name, info in coll.index_information().items()}
+            by_keys = {tuple(keys): name for name, keys in existing.items()}
+            for index in indexes:
+                keys = _index_keys(index['keys'])
+                if existing.get(index['name']) == keys or tuple(keys) in by_keys:
+                    result['existing'].append(index['name'])
+                elif index['name'] in existing:
+                    result['conflicts'].append(index['name'])
+                else:
+                    coll.create_index(keys, name=index['name'], **index.get('options', {}))
+                    result['created'].append(index['name'])
+        return report
+
+
+class AsyncMongoClientWrapper:
+    """asyncio counterpart of `MongoClientWrapper`, built on pymongo's native `AsyncMongoClient`."""
+
+    def __init__(self, uri: Optional[str]=None, dry_run: bool=True, **client_options):
+        self.dry_run = dry_run
+        self.uri = uri or os.getenv('MONGO_URI')
+        self.client = None
+        if not dry_run and AsyncMongoClient is None:
+            raise RuntimeError("pymongo with AsyncMongoClient (>=4.13) not available")
+        if not dry_run:
+            self.client = AsyncMongoClient(self.uri, **client_options)
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
+
+    def get_db(self, name='pasture'):
+        if self.dry_run:
+            return None
+        return self.client[name]
+
+    async def insert_field(self, db_name, field_doc):
+        if self.dry_run:
+            print(f"[mongo dry-run] would insert field into {db_name}: {field_doc.get('_id')}")
+            metrics.dry_run('mongo', 'insert_field', 1)
+            return True
+        db = self.get_db(db_name)
+        with metrics.timed('mongo', 'insert_field', 1):
+            return await db.fields.replace_one({'_id': field_doc['_id']}, field_doc, upsert=True)
+
+    async def update_latest_metrics_many(self, db_name, readings: Iterable[dict]):
+        updates = _latest_metric_updates(readings)
+        if self.dry_run:
+            print(f"[mongo dry-run] would $set latest_metrics on {len(updates)} fields in {db_name}")
+            metrics.dry_run('mongo', 'upsert', len(updates))
+            return len(updates)
+        if not updates:
+            return None
         db = self.get_db(db_name)
-        db.fields.create_index([('boundary','2dsphere')])
-        db.fields.create_index([('farm_id',1)])
+        requests = [UpdateOne({'_id': fid}, {'$set': fields}, upsert=True) for fid, fields in updates.items()]
+        with metrics.timed('mongo', 'upsert', len(requests)):
+            return await db.fields.bulk_write(requests, ordered=False)
@@ -1,14 +1,102 @@
 import os
+import time
 from typing import Optional
 
+from src import metrics
+
 try:
-    from neo4j import GraphDatabase
+    from neo4j import GraphDatabase, AsyncGraphDatabase
 except Exception:
     GraphDatabase = None
+    AsyncGraphDatabase = None
+
+
+# One round trip per batch: every event row merges its Field and hangs a new Event off it
+CREATE_EVENTS_QUERY = """
+UNWIND $events AS ev
+MERGE (f:Field {id: ev.field_id})
+CREATE (e:Event)
+SET e = ev.props, e.type = ev.event_type
+CREATE (f)-[:HAS_EVENT]->(e)
+"""
+
+
+def _create_events_tx(tx, events):
+    tx.run(CREATE_EVENTS_QUERY, events=events).consume()
+
+
+async def _acreate_events_tx(tx, events):
+    result = await tx.run(CREATE_EVENTS_QUERY, events=events)
+    await result.consume()
+
+
+class Neo4jEventBatch:
+    """Collects events and writes them with one `UNWIND` query per managed write transaction.
+
+    Flushes once `batch_size` events are buffered, when `flush_interval` seconds have passed since
+    the previous flush (checked on each add), and on leaving the `with` block.
+    """
+
+    def __init__(self, wrapper, batch_size: int=500, flush_interval: float=1.0):
+        self.wrapper = wrapper
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._events = []
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def add_event(self, field_id, event_type, props: dict):
+        self._events.append({'field_id': field_id, 'event_type': event_type, 'props': props})
+        if self.due:
+            self.flush()
+
+    @property
+    def due(self):
+        return len(self._events) >= self.batch_size or (bool(self._events) and time.monotonic() - self._last_flush >= self.flush_interval)
+
+    def _take(self):
+        events, self._events = self._events, []
+        self._last_flush = time.monotonic()
+        return events
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of events written."""
+        events = self._take()
+        if events:
+            self.wrapper.create_events(events)
+            self.written += len(events)
+        return len(events)
+
+
+class AsyncNeo4jEventBatch(Neo4jEventBatch):
+    """`Neo4jEventBatch` for the async driver: adds only buffer, use `async with` or `await flush()`."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.flush()
+
+    def add_event(self, field_id, event_type, props: dict):
+        self._events.append({'field_id': field_id, 'event_type': event_type, 'props': props})
+
+    async def flush(self):
+        events = self._take()
+        if events:
+            await self.wrapper.create_events(events)
+            self.written += len(events)
+        return len(events)
 
 
 class Neo4jClientWrapper:
-    def __init__(self, uri: Optional[str]=None, user: Optional[str]=None, password: Optional[str]=None, dry_run: bool=True):
+    def __init__(self, uri: Optional[str]=None, user: Optional[str]=None, password: Optional[str]=None, dry_run: bool=True, **driver_options):
+        """`driver_options` are passed to `GraphDatabase.driver` (e.g. max_connection_pool_size)."""
         self.dry_run = dry_run
         self.uri = uri or os.getenv('NEO4J_URI')
         self.user = user or os.getenv('NEO4J_USER')
@@ -17,7 +105,7 @@ class Neo4jClientWrapper:
         if not dry_run and GraphDatabase is None:
             raise RuntimeError('neo4j package not available')
         if not dry_run:
-            self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
+            self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password), **driver_options)
 
     def close(self):
         if self.driver:
@@ -26,7 +114,57 @@ class Neo4jClientWrapper:
     def create_event_for_field(self, field_id, event_type, props: dict):
         if self.dry_run:
             print(f"[neo4j dry-run] create Event node for {field_id} type={event_type} props={props}")
+            metrics.dry_run('neo4j', 'event_write', 1)
             return True
-        with self.driver.session() as s:
-            q = "MERGE (f:Field {id:$field_id}) CREATE (e:Event {props}) CREATE (f)-[:HAS_EVENT]->(e)"
-            s.run(q, field_id=field_id, props=props)
+        self.create_events([{'field_id': field_id, 'event_type': event_type, 'props': props}])
+
+    def create_events(self, events: list):
+        """Write `{field_id, event_type, props}` dicts in a single UNWIND write transaction."""
+        if self.dry_run:
+            print(f"[neo4j dry-run] UNWIND {len(events)} Event nodes in one write transaction")
+            metrics.dry_run('neo4j', 'event_write', len(events))
+            return True
+        with metrics.timed('neo4j', 'event_write', len(events)), self.driver.session() as s:
+            s.execute_write(_create_events_tx, events)
+
+    def event_batch(self, batch_size: int=500, flush_interval: float=1.0) -> Neo4jEventBatch:
+        """Return a buffering writer; use as `with n.event_batch() as b: b.add_event(...)`."""
+        return Neo4jEventBatch(self, batch_size=batch_size, flush_interval=flush_interval)
+
+
+class AsyncNeo4jClientWrapper:
+    """asyncio counterpart of `Neo4jClientWrapper`, built on `AsyncGraphDatabase`."""
+
+    def __init__(self, uri: Optional[str]=None, user: Optional[str]=None, password: Optional[str]=None, dry_run: bool=True, **driver_options):
+        self.dry_run = dry_run
+        self.uri = uri or os.getenv('NEO4J_URI')
+        self.user = user or os.getenv('NEO4J_USER')
+        self.password = password or os.getenv('NEO4J_PASSWORD')
+        self.driver = None
+        if not dry_run and AsyncGraphDatabase is None:
+            raise RuntimeError('neo4j package not available')
+        if not dry_run:
+            self.driver = AsyncGraphDatabase.driver(self.uri, auth=(self.user, self.password), **driver_options)
+
+    async def close(self):
+        if self.driver:
+            await self.driver.close()
+
+    async def create_event_for_field(self, field_id, event_type, props: dict):
+        if self.dry_run:
+            print(f"[neo4j dry-run] create Event node for {field_id} type={event_type} props={props}")
+            metrics.dry_run('neo4j', 'event_write', 1)
+            return True
+        await self.create_events([{'field_id': field_id, 'event_type': event_type, 'props': props}])
+
+    async def create_events(self, events: list):
+        if self.dry_run:
+            print(f"[neo4j dry-run] UNWIND {len(events)} Event nodes in one write transaction")
+            metrics.dry_run('neo4j', 'event_write', len(events))
+            return True
+        with metrics.timed('neo4j', 'event_write', len(events)):
+            async with self.driver.session() as s:
+                await s.execute_write(_acreate_events_tx, events)
+
+    def event_batch(self, batch_size: int=500, flush_interval: float=1.0) -> AsyncNeo4jEventBatch:
+        return AsyncNeo4jEventBatch(self, batch_size=batch_size, flush_interval=flush_interval)
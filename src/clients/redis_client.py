@@ -1,21 +1,208 @@
+import json
 import os
+import time
 from typing import Optional
 
+from src import metrics
+from src.rules import VERSION_KEY, AlertStateConflict
+
 try:
     import redis
+    import redis.asyncio as aioredis
 except Exception:
     redis = None
+    aioredis = None
+
+
+# per-field alert state of the transition rules in src/rules.py: one JSON value per `{sink}:{rule}`
+ALERT_STATE_PREFIX = 'alerts:state:'
+
+# Alert transitions stream. XADD trims it to about ALERTS_STREAM_MAXLEN entries (approximate, so
+# Redis trims whole macro nodes); `trim_alerts` can also drop entries older than an age (MINID).
+ALERTS_STREAM = 'alerts'
+ALERTS_MAXLEN = int(os.getenv('ALERTS_STREAM_MAXLEN', 100000))
+
+
+def _text(v):
+    return v.decode() if isinstance(v, bytes) else v
+
+
+def _decode_alerts(entries) -> list:
+    """`[(entry_id, {field: value})]` with bytes decoded."""
+    return [(_text(entry_id), {_text(k): _text(v) for k, v in fields.items()}) for entry_id, fields in entries]
+
+
+def _min_id(max_age: float) -> str:
+    return f"{int((time.time() - max_age) * 1000)}-0"
+
+
+def _decode_states(raw: dict) -> dict:
+    return {(k.decode() if isinstance(k, bytes) else k): json.loads(v) for k, v in raw.items()}
+
+
+def _encode_states(states: dict) -> dict:
+    return {k: json.dumps(v, default=str) for k, v in states.items()}
+
+
+# Compare-and-set of several state hashes: every `_version` must still be the one loaded, then all
+# hashes are written and their versions bumped. Returns 0, or the 1-based index of a stale key.
+# KEYS: state hashes; ARGV per key: expected version, number of pairs, then state key/value pairs
+_SAVE_STATES_SCRIPT = """
+local pos = 1
+for i = 1, #KEYS do
+    if tonumber(redis.call('HGET', KEYS[i], '_version') or '0') ~= tonumber(ARGV[pos]) then
+        return i
+    end
+    pos = pos + 2 + 2 * tonumber(ARGV[pos + 1])
+end
+pos = 1
+for i = 1, #KEYS do
+    local n = tonumber(ARGV[pos + 1])
+    local args = {'_version', tonumber(ARGV[pos]) + 1}
+    for j = 1, 2 * n do
+        args[#args + 1] = ARGV[pos + 1 + j]
+    end
+    redis.call('HSET', KEYS[i], unpack(args))
+    pos = pos + 2 + 2 * n
+end
+return 0
+"""
+
+
+def _save_states_call(changed: dict):
+    """KEYS and ARGV of `_SAVE_STATES_SCRIPT` for `{field_id: states with their loaded _version}`."""
+    keys, args, field_ids = [], [], []
+    for fid, states in changed.items():
+        states = dict(states)
+        version = states.pop(VERSION_KEY, 0)
+        encoded = _encode_states(states)
+        keys.append(f"{ALERT_STATE_PREFIX}{fid}")
+        field_ids.append(fid)
+        args += [version, len(encoded)]
+        for k, v in encoded.items():
+            args += [k, v]
+    return keys, args, field_ids
+
+
+def _check_saved(result, field_ids):
+    if result:
+        raise AlertStateConflict(f"alert state of {field_ids[int(result) - 1]} changed since it was loaded")
+
+
+class RedisBatch:
+    """Buffers `hset_latest`/`push_alert` calls and sends them in one pipeline per flush.
+
+    Hash writes to the same key are merged (last value wins) so a flush issues at most one HSET
+    per field. A flush happens once `max_ops` calls are buffered, when `max_interval` seconds have
+    passed since the previous flush (checked on each call), and on leaving the `with` block.
+    """
+
+    def __init__(self, wrapper, transaction: bool=False, max_ops: int=1000, max_interval: float=1.0):
+        self.wrapper = wrapper
+        self.transaction = transaction
+        self.max_ops = max_ops
+        self.max_interval = max_interval
+        self.flushes = 0
+        self._hashes = {}
+        self._alerts = []
+        self._ops = 0
+        self._last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def hset_latest(self, field_id, mapping: dict):
+        self._hashes.setdefault(f"field:{field_id}", {}).update(mapping)
+        self._added()
+
+    def push_alert(self, field_id, alert_type, payload: dict):
+        body = { 'field': field_id, 'type': alert_type }
+        body.update(payload)
+        self._alerts.append(body)
+        self._added()
+
+    def _added(self):
+        self._ops += 1
+        if self.due:
+            self.flush()
+
+    @property
+    def due(self):
+        return self._ops >= self.max_ops or (self._ops > 0 and time.monotonic() - self._last_flush >= self.max_interval)
+
+    def _pipeline(self):
+        """Queue the buffered commands on a fresh pipeline and reset the buffer; None when empty."""
+        if not self._ops:
+            return None, 0
+        commands = len(self._hashes) + len(self._alerts)
+        pipe = None
+        if self.wrapper.dry_run:
+            print(f"[redis dry-run] pipeline ({'MULTI' if self.transaction else 'no tx'}): "
+                  f"{len(self._hashes)} HSET, {len(self._alerts)} XADD alerts")
+            metrics.dry_run('redis', 'pipeline', commands)
+        else:
+            pipe = self.wrapper.client.pipeline(transaction=self.transaction)
+            for key, mapping in self._hashes.items():
+                pipe.hset(key, mapping=mapping)
+            for body in self._alerts:
+                pipe.xadd(ALERTS_STREAM, body, maxlen=ALERTS_MAXLEN, approximate=True)
+        self._hashes = {}
+        self._alerts = []
+        self._ops = 0
+        self._last_flush = time.monotonic()
+        self.flushes += 1
+        return pipe, commands
+
+    def flush(self):
+        """Send everything buffered so far; returns the number of commands sent."""
+        pipe, commands = self._pipeline()
+        if pipe is not None:
+            with metrics.timed('redis', 'pipeline', commands):
+                pipe.execute()
+        return commands
+
+
+class AsyncRedisBatch(RedisBatch):
+    """`RedisBatch` for `redis.asyncio`: calls only buffer, use `async with` or `await flush()`.
+
+    Callers streaming many rows can check `due` and `await flush()` to keep the size/time bounds.
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.flush()
+
+    def _added(self):
+        self._ops += 1
+
+    async def flush(self):
+        pipe, commands = self._pipeline()
+        if pipe is not None:
+            with metrics.timed('redis', 'pipeline', commands):
+                await pipe.execute()
+        return commands
 
 
 class RedisClientWrapper:
-    def __init__(self, url: Optional[str]=None, dry_run: bool=True):
+    def __init__(self, url: Optional[str]=None, dry_run: bool=True, **pool_options):
+        """`pool_options` are passed to `redis.from_url` (e.g. max_connections, socket_timeout)."""
         self.dry_run = dry_run
         self.url = url or os.getenv('REDIS_URL')
         self.client = None
         if not dry_run and redis is None:
             raise RuntimeError('redis package not available')
         if not dry_run:
-            self.client = redis.from_url(self.url)
+            self.client = redis.from_url(self.url, **pool_options)
+
+    def close(self):
+        if self.client:
+            self.client.close()
+            self.client.connection_pool.disconnect()
 
     def initialize(self):
         if self.dry_run:
@@ -24,6 +211,10 @@ class RedisClientWrapper:
         # example: ensure streams exist (no-op for Redis)
         return True
 
+    def batch(self, transaction: bool=False, max_ops: int=1000, max_interval: float=1.0) -> RedisBatch:
+        """Return a buffering writer; use as `with r.batch() as b: b.hset_latest(...)`."""
+        return RedisBatch(self, transaction=transaction, max_ops=max_ops, max_interval=max_interval)
+
     def get_latest(self, field_id):
         key = f"field:{field_id}"
         if self.dry_run:
@@ -35,13 +226,222 @@ class RedisClientWrapper:
         key = f"field:{field_id}"
         if self.dry_run:
             print(f"[redis dry-run] HSET {key} {mapping}")
+            metrics.dry_run('redis', 'hset', 1)
             return True
-        return self.client.hset(key, mapping=mapping)
+        with metrics.timed('redis', 'hset', 1):
+            return self.client.hset(key, mapping=mapping)
 
     def push_alert(self, field_id, alert_type, payload: dict):
         if self.dry_run:
             print(f"[redis dry-run] XADD alerts * field {field_id} type {alert_type} payload {payload}")
+            metrics.dry_run('redis', 'xadd', 1)
+            return True
+        body = { 'field': field_id, 'type': alert_type }
+        body.update(payload)
+        with metrics.timed('redis', 'xadd', 1):
+            return self.client.xadd(ALERTS_STREAM, body, maxlen=ALERTS_MAXLEN, approximate=True)
+
+    def trim_alerts(self, max_age: Optional[float]=None, maxlen: Optional[int]=None):
+        """Approximately trim the alerts stream to entries newer than `max_age` seconds, or to `maxlen`."""
+        if self.dry_run:
+            print(f"[redis dry-run] XTRIM {ALERTS_STREAM} ~ max_age={max_age} maxlen={maxlen}")
+            return 0
+        if max_age is not None:
+            return self.client.xtrim(ALERTS_STREAM, minid=_min_id(max_age), approximate=True)
+        return self.client.xtrim(ALERTS_STREAM, maxlen=ALERTS_MAXLEN if maxlen is None else maxlen, approximate=True)
+
+    def recent_alerts(self, count: int=10) -> list:
+        """The newest `count` alerts, newest first."""
+        if self.dry_run:
+            print(f"[redis dry-run] would XREVRANGE {ALERTS_STREAM} + - COUNT {count}")
+            return []
+        return _decode_alerts(self.client.xrevrange(ALERTS_STREAM, count=count))
+
+    def create_alert_group(self, group: str, start: str='$'):
+        """Create consumer group `group` on the alerts stream (reading from `start`); existing groups are kept."""
+        if self.dry_run:
+            print(f"[redis dry-run] XGROUP CREATE {ALERTS_STREAM} {group} {start} MKSTREAM")
+            return True
+        try:
+            return self.client.xgroup_create(ALERTS_STREAM, group, id=start, mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+            return False
+
+    def read_alert_group(self, group: str, consumer: str, count: int=100, block_ms: Optional[int]=1000) -> list:
+        """New alerts delivered to `consumer` of `group`; acknowledge them with `ack_alerts`."""
+        if self.dry_run:
+            print(f"[redis dry-run] would XREADGROUP GROUP {group} {consumer} COUNT {count} STREAMS {ALERTS_STREAM} >")
+            return []
+        resp = self.client.xreadgroup(group, consumer, {ALERTS_STREAM: '>'}, count=count, block=block_ms)
+        return _decode_alerts(resp[0][1]) if resp else []
+
+    def ack_alerts(self, group: str, ids):
+        if self.dry_run or not ids:
+            return 0
+        return self.client.xack(ALERTS_STREAM, group, *ids)
+
+    def load_alert_states(self, field_ids) -> dict:
+        """`{field_id: {state_key: state}}` for the given fields, in one pipelined round trip."""
+        field_ids = list(field_ids)
+        if self.dry_run:
+            print(f"[redis dry-run] would HGETALL {ALERT_STATE_PREFIX}* for {len(field_ids)} fields")
+            return {}
+        pipe = self.client.pipeline(transaction=False)
+        for fid in field_ids:
+            pipe.hgetall(f"{ALERT_STATE_PREFIX}{fid}")
+        return {fid: _decode_states(raw) for fid, raw in zip(field_ids, pipe.execute())}
+
+    def save_alert_states(self, changed: dict):
+        """Write `changed` atomically if no other process saved these fields since they were loaded.
+
+        Raises `AlertStateConflict` otherwise, and writes nothing.
+        """
+        if self.dry_run:
+            print(f"[redis dry-run] HSET {ALERT_STATE_PREFIX}* for {len(changed)} fields")
+            return True
+        keys, args, field_ids = _save_states_call(changed)
+        if not keys:
+            return True
+        _check_saved(self.client.register_script(_SAVE_STATES_SCRIPT)(keys=keys, args=args), field_ids)
+        return True
+
+
+class AsyncRedisClientWrapper:
+    """asyncio counterpart of `RedisClientWrapper`, built on `redis.asyncio`."""
+
+    def __init__(self, url: Optional[str]=None, dry_run: bool=True, **pool_options):
+        self.dry_run = dry_run
+        self.url = url or os.getenv('REDIS_URL')
+        self.client = None
+        if not dry_run and aioredis is None:
+            raise RuntimeError('redis package not available')
+        if not dry_run:
+            self.client = aioredis.from_url(self.url, **pool_options)
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+
+    def batch(self, transaction: bool=False, max_ops: int=1000, max_interval: float=1.0) -> AsyncRedisBatch:
+        return AsyncRedisBatch(self, transaction=transaction, max_ops=max_ops, max_interval=max_interval)
+
+    async def get_latest(self, field_id):
+        key = f"field:{field_id}"
+        if self.dry_run:
+            print(f"[redis dry-run] would HGETALL {key}")
+            return {}
+        return await self.client.hgetall(key)
+
+    async def hset_latest(self, field_id, mapping: dict):
+        key = f"field:{field_id}"
+        if self.dry_run:
+            print(f"[redis dry-run] HSET {key} {mapping}")
+            metrics.dry_run('redis', 'hset', 1)
+            return True
+        with metrics.timed('redis', 'hset', 1):
+            return await self.client.hset(key, mapping=mapping)
+
+    async def push_alert(self, field_id, alert_type, payload: dict):
+        if self.dry_run:
+            print(f"[redis dry-run] XADD alerts * field {field_id} type {alert_type} payload {payload}")
+            metrics.dry_run('redis', 'xadd', 1)
             return True
         body = { 'field': field_id, 'type': alert_type }
         body.update(payload)
-        return self.client.xadd('alerts', body)
+        with metrics.timed('redis', 'xadd', 1):
+            return await self.client.xadd(ALERTS_STREAM, body, maxlen=ALERTS_MAXLEN, approximate=True)
+
+    async def trim_alerts(self, max_age: Optional[float]=None, maxlen: Optional[int]=None):
+        if self.dry_run:
+            print(f"[redis dry-run] XTRIM {ALERTS_STREAM} ~ max_age={max_age} maxlen={maxlen}")
+            return 0
+        if max_age is not None:
+            return await self.client.xtrim(ALERTS_STREAM, minid=_min_id(max_age), approximate=True)
+        return await self.client.xtrim(ALERTS_STREAM, maxlen=ALERTS_MAXLEN if maxlen is None else maxlen, approximate=True)
+
+    async def alerts_after(self, last_id: str, count: int=100) -> list:
+        """Alerts added after entry `last_id`, oldest first (replay for a reconnecting reader)."""
+        if self.dry_run:
+            return []
+        return _decode_alerts(await self.client.xrange(ALERTS_STREAM, min=f"({last_id}", count=count))
+
+    async def create_alert_group(self, group: str, start: str='$'):
+        if self.dry_run:
+            print(f"[redis dry-run] XGROUP CREATE {ALERTS_STREAM} {group} {start} MKSTREAM")
+            return True
+        try:
+            return await self.client.xgroup_create(ALERTS_STREAM, group, id=start, mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+            return False
+
+    async def destroy_alert_group(self, group: str):
+        if self.dry_run:
+            return True
+        return await self.client.xgroup_destroy(ALERTS_STREAM, group)
+
+    async def prune_alert_groups(self, prefix: str, idle_ms: int, keep: Optional[str]=None) -> list:
+        """Remove groups named `prefix*` (other than `keep`) whose consumers have all been idle for `idle_ms`.
+
+        These are the per-process groups of processes that died without `destroy_alert_group`. Each
+        idle consumer's pending alerts are acknowledged, as nobody else in a per-process group would
+        deliver them, before XGROUP DELCONSUMER; the emptied group is then destroyed. Groups without
+        any consumer yet may belong to a process that is just starting and are left alone. Returns
+        the names of the removed groups.
+        """
+        if self.dry_run:
+            return []
+        removed = []
+        for info in await self.client.xinfo_groups(ALERTS_STREAM):
+            group = _text(info['name'])
+            if not group.startswith(prefix) or group == keep:
+                continue
+            consumers = await self.client.xinfo_consumers(ALERTS_STREAM, group)
+            if not consumers or any(c['idle'] < idle_ms for c in consumers):
+                continue
+            for c in consumers:
+                consumer = _text(c['name'])
+                if c['pending']:
+                    pending = await self.client.xpending_range(ALERTS_STREAM, group, min='-', max='+',
+                                                               count=c['pending'], consumername=consumer)
+                    if pending:
+                        await self.client.xack(ALERTS_STREAM, group, *[p['message_id'] for p in pending])
+                await self.client.xgroup_delconsumer(ALERTS_STREAM, group, consumer)
+            await self.client.xgroup_destroy(ALERTS_STREAM, group)
+            removed.append(group)
+        return removed
+
+    async def read_alert_group(self, group: str, consumer: str, count: int=100, block_ms: Optional[int]=1000) -> list:
+        if self.dry_run:
+            return []
+        resp = await self.client.xreadgroup(group, consumer, {ALERTS_STREAM: '>'}, count=count, block=block_ms)
+        return _decode_alerts(resp[0][1]) if resp else []
+
+    async def ack_alerts(self, group: str, ids):
+        if self.dry_run or not ids:
+            return 0
+        return await self.client.xack(ALERTS_STREAM, group, *ids)
+
+    async def load_alert_states(self, field_ids) -> dict:
+        field_ids = list(field_ids)
+        if self.dry_run:
+            print(f"[redis dry-run] would HGETALL {ALERT_STATE_PREFIX}* for {len(field_ids)} fields")
+            return {}
+        async with self.client.pipeline(transaction=False) as pipe:
+            for fid in field_ids:
+                pipe.hgetall(f"{ALERT_STATE_PREFIX}{fid}")
+            results = await pipe.execute()
+        return {fid: _decode_states(raw) for fid, raw in zip(field_ids, results)}
+
+    async def save_alert_states(self, changed: dict):
+        if self.dry_run:
+            print(f"[redis dry-run] HSET {ALERT_STATE_PREFIX}* for {len(changed)} fields")
+            return True
+        keys, args, field_ids = _save_states_call(changed)
+        if not keys:
+            return True
+        _check_saved(await self.client.register_script(_SAVE_STATES_SCRIPT)(keys=keys, args=args), field_ids)
+        return True
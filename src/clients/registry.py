@@ -0,0 +1,135 @@
+"""Process-wide registry of long-lived, pooled database clients.
+
+The API creates one registry and hands out the same wrapper instances to every request, so
+connection pools (and the Cassandra keyspace DDL) are set up once per process instead of once
+per call. Clients are created lazily on first use and fall back to dry-run mode when the
+corresponding connection env var is not set, matching the scripts. Scripts and the pipeline
+create the blocking wrappers themselves, once per run.
+"""
+import asyncio
+import inspect
+import logging
+import os
+import time
+from typing import Optional
+
+from .mongo_client import AsyncMongoClientWrapper
+from .cassandra_client import AsyncCassandraClientWrapper
+from .redis_client import AsyncRedisClientWrapper
+from .neo4j_client import AsyncNeo4jClientWrapper
+
+logger = logging.getLogger('pasture.clients')
+
+
+class AsyncClientRegistry:
+    """Pool size and timeouts, translated into each driver's options, and the clients built with them.
+
+    Each client is created under its own lock, so a backend that is slow to connect only holds up
+    requests for that backend. A failed creation is remembered: until its backoff (starting at
+    `DB_RETRY_BACKOFF` seconds, doubling up to `DB_RETRY_BACKOFF_MAX`) runs out, asking for that
+    client returns None at once instead of trying to connect again.
+    """
+
+    def __init__(self, pool_size: Optional[int]=None, connect_timeout: Optional[float]=None, request_timeout: Optional[float]=None,
+                 retry_backoff: Optional[float]=None, max_retry_backoff: Optional[float]=None):
+        self.pool_size = int(pool_size or os.getenv('DB_POOL_SIZE', 50))
+        self.connect_timeout = float(connect_timeout or os.getenv('DB_CONNECT_TIMEOUT', 5))
+        self.request_timeout = float(request_timeout or os.getenv('DB_REQUEST_TIMEOUT', 10))
+        self.retry_backoff = float(retry_backoff or os.getenv('DB_RETRY_BACKOFF', 5))
+        self.max_retry_backoff = float(max_retry_backoff or os.getenv('DB_RETRY_BACKOFF_MAX', 60))
+        self._clients = {}
+        self._locks = {}
+        # name -> (monotonic time of the next attempt, backoff that set it)
+        self._failures = {}
+
+    def _mongo_options(self):
+        uri = os.getenv('MONGO_URI')
+        return dict(
+            uri=uri, dry_run=(uri is None),
+            maxPoolSize=self.pool_size,
+            connectTimeoutMS=int(self.connect_timeout * 1000),
+            serverSelectionTimeoutMS=int(self.connect_timeout * 1000),
+            socketTimeoutMS=int(self.request_timeout * 1000),
+        )
+
+    def _cassandra_options(self):
+        contact = os.getenv('CASSANDRA_CONTACT_POINTS')
+        return dict(
+            contact_points=contact.split(',') if contact else None,
+            keyspace=os.getenv('CASSANDRA_KEYSPACE', 'pasture'),
+            dry_run=(contact is None),
+            connect_timeout=self.connect_timeout,
+            request_timeout=self.request_timeout,
+        )
+
+    def _redis_options(self):
+        url = os.getenv('REDIS_URI') or os.getenv('REDIS_URL')
+        return dict(
+            url=url, dry_run=(url is None),
+            max_connections=self.pool_size,
+            socket_connect_timeout=self.connect_timeout,
+            socket_timeout=self.request_timeout,
+        )
+
+    def _neo4j_options(self):
+        uri = os.getenv('NEO4J_URI')
+        return dict(
+            uri=uri, user=os.getenv('NEO4J_USER'),
+            password=os.getenv('NEO4J_PASSWORD') or os.getenv('NEO4J_AUTH'),
+            dry_run=(uri is None),
+            max_connection_pool_size=self.pool_size,
+            connection_timeout=self.connect_timeout,
+        )
+
+    def _backing_off(self, name) -> bool:
+        failure = self._failures.get(name)
+        return failure is not None and time.monotonic() < failure[0]
+
+    async def _get(self, name, factory):
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        if self._backing_off(name):
+            return None
+        async with self._locks.setdefault(name, asyncio.Lock()):
+            client = self._clients.get(name)
+            if client is None:
+                # another request may have failed while this one waited for the lock
+                if self._backing_off(name):
+                    return None
+                try:
+                    client = factory()
+                    if inspect.isawaitable(client):
+                        client = await client
+                except Exception as e:
+                    failure = self._failures.get(name)
+                    delay = self.retry_backoff if failure is None else min(failure[1] * 2, self.max_retry_backoff)
+                    self._failures[name] = (time.monotonic() + delay, delay)
+                    logger.warning(f"Could not create {name} client, retrying in {delay:.0f}s: {e}")
+                    return None
+                self._failures.pop(name, None)
+                self._clients[name] = client
+        return client
+
+    async def mongo(self) -> Optional[AsyncMongoClientWrapper]:
+        return await self._get('mongo', lambda: AsyncMongoClientWrapper(**self._mongo_options()))
+
+    async def cassandra(self) -> Optional[AsyncCassandraClientWrapper]:
+        return await self._get('cassandra', lambda: AsyncCassandraClientWrapper.connect(**self._cassandra_options()))
+
+    async def redis(self) -> Optional[AsyncRedisClientWrapper]:
+        return await self._get('redis', lambda: AsyncRedisClientWrapper(**self._redis_options()))
+
+    async def neo4j(self) -> Optional[AsyncNeo4jClientWrapper]:
+        return await self._get('neo4j', lambda: AsyncNeo4jClientWrapper(**self._neo4j_options()))
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        # fresh locks, so the registry can be reused from another event loop (e.g. a new app lifespan)
+        self._locks = {}
+        self._failures = {}
+        for name, client in clients.items():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Error closing {name} client: {e}")
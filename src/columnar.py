@@ -0,0 +1,78 @@
+"""Compact columnar encoding for timeseries responses (`application/x-pasture-columnar`).
+
+Layout, all little-endian:
+
+    header  b'PTS1' + uint32 reserved (0)
+    frame   uint32 n, uint16 name_len, uint16 reserved, metric name (utf-8), zero padding to 8 bytes,
+            int64[n] timestamps (epoch milliseconds, UTC), float64[n] values
+
+Frames repeat until the end of the body; a metric can appear in several frames (one per page
+read from Cassandra), and decoders append them in order. Arrays start on 8-byte boundaries so
+clients can view them in place (e.g. `Float64Array` in the browser). Missing values are NaN.
+"""
+import struct
+import sys
+from array import array
+from datetime import datetime, timezone
+
+MEDIA_TYPE = 'application/x-pasture-columnar'
+MAGIC = b'PTS1'
+HEADER = MAGIC + struct.pack('<I', 0)
+
+_FRAME = struct.Struct('<IHH')
+
+
+def _epoch_ms(ts) -> int:
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1000)
+
+
+def encode_frames(rows) -> bytes:
+    """Group rows (`sensor_ts`, `metric_type`, `metric_value`) by metric into frames, keeping row order."""
+    columns = {}
+    for r in rows:
+        stamps, values = columns.setdefault(r['metric_type'], (array('q'), array('d')))
+        stamps.append(_epoch_ms(r['sensor_ts']))
+        value = r['metric_value']
+        values.append(float('nan') if value is None else value)
+    out = []
+    for metric, (stamps, values) in columns.items():
+        if sys.byteorder != 'little':
+            stamps.byteswap()
+            values.byteswap()
+        name = metric.encode()
+        head = _FRAME.pack(len(stamps), len(name), 0) + name
+        out += [head, b'\0' * (-len(head) % 8), stamps.tobytes(), values.tobytes()]
+    return b''.join(out)
+
+
+def encode(rows) -> bytes:
+    return HEADER + encode_frames(rows)
+
+
+def decode(body: bytes) -> dict:
+    """Return `{metric: (timestamps_ms, values)}` as lists; the reference for other decoders."""
+    if body[:4] != MAGIC:
+        raise ValueError('not a columnar timeseries body')
+    out = {}
+    offset = len(HEADER)
+    while offset < len(body):
+        n, name_len, _ = _FRAME.unpack_from(body, offset)
+        offset += _FRAME.size
+        metric = body[offset:offset + name_len].decode()
+        offset += name_len
+        offset += -offset % 8
+        stamps, values = array('q'), array('d')
+        stamps.frombytes(body[offset:offset + 8 * n])
+        values.frombytes(body[offset + 8 * n:offset + 16 * n])
+        offset += 16 * n
+        if sys.byteorder != 'little':
+            stamps.byteswap()
+            values.byteswap()
+        acc = out.setdefault(metric, ([], []))
+        acc[0].extend(stamps)
+        acc[1].extend(values)
+    return out
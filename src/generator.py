@@ -2,13 +2,26 @@
 
 This CLI produces JSON lines to stdout or a file. It's intentionally lightweight and
 has a `--dry-run` style default so the rest of the scaffold can be explored without DBs.
+
+For load tests, `sensors --fields N` switches to a vectorized mode that builds whole NumPy
+arrays per field and metric, streams them to disk in chunks, and can spread fields over a
+process pool. With `--seed` the output is identical whatever the chunk size or process count.
 """
 import json
 import math
+import multiprocessing
 import random
-from datetime import datetime, timedelta
+import sys
+from datetime import datetime, timedelta, timezone
 import click
 
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+SENSORS = ["soil_moisture","ndvi","air_temp","grass_height"]
+
 
 def generate_field(field_id="field_01", farm_id="farm_123", center=(0.0,0.0)):
     lng, lat = center
@@ -55,6 +68,73 @@ def generate_sensor_series(field_id="field_01", start=None, periods=48, freq_min
     return rows
 
 
+def sensor_value_arrays(i, rngs):
+    """Vectorized form of the per-reading formulas in `generate_sensor_series` for period indexes `i`."""
+    n = len(i)
+    noise = [rng.uniform(-1, 1, n) for rng in rngs]
+    return {
+        "soil_moisture": np.round(10 + 5*np.sin(i/10.0) + noise[0], 2),
+        "ndvi": np.round(0.5 + 0.1*np.cos(i/20.0) + 0.05*noise[1], 3),
+        "air_temp": np.round(15 + 10*np.sin(i/24.0) + 2*noise[2], 2),
+        "grass_height": np.round(6 + 0.05*i + noise[3], 2),
+    }
+
+
+def _metric_rngs(seed, field_index, offset):
+    """One PCG64 stream per metric, advanced to period `offset` (each reading draws one double)."""
+    rngs = []
+    for m in range(len(SENSORS)):
+        bitgen = np.random.PCG64([seed, field_index, m])
+        bitgen.advance(offset)
+        rngs.append(np.random.Generator(bitgen))
+    return rngs
+
+
+def sensor_chunk_jsonl(field_id, field_index, start, p0, p1, freq_minutes=60, seed=0):
+    """Return JSONL text for periods [p0, p1) of one field, with the same schema as `generate_sensor_series`."""
+    if np is None:
+        raise RuntimeError('numpy not available')
+    if start.tzinfo is not None:
+        # np.datetime64 rejects aware datetimes; stamps are written as naive UTC like the default start
+        start = start.astimezone(timezone.utc).replace(tzinfo=None)
+    i = np.arange(p0, p1)
+    stamps = np.datetime64(start, 'us') - i * np.timedelta64(freq_minutes, 'm')
+    ts = np.datetime_as_string(stamps, unit='us' if start.microsecond else 's').tolist()
+    values = [v.tolist() for v in sensor_value_arrays(i, _metric_rngs(seed, field_index, p0)).values()]
+    head = '{"field_id": ' + json.dumps(field_id) + ', "sensor_ts": "'
+    mids = [f'", "sensor_id": "sensor_{m}", "metric_type": "{m}", "metric_value": ' for m in SENSORS]
+    tail = ', "quality_flag": 0}'
+    lines = []
+    for k, t in enumerate(ts):
+        for mid, vals in zip(mids, values):
+            lines.append(head + t + mid + repr(vals[k]) + tail)
+    return '\n'.join(lines) + '\n'
+
+
+def _chunk_task(args):
+    return sensor_chunk_jsonl(*args)
+
+
+def iter_bulk_sensor_chunks(field_ids, periods, start=None, freq_minutes=60, seed=None, chunk_periods=10000, processes=1):
+    """Yield JSONL chunks for every field in order, at most `processes * 2` chunks in memory at a time."""
+    if np is None:
+        raise RuntimeError('numpy not available')
+    if start is None:
+        start = datetime.utcnow()
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (1 << 63))
+    tasks = [(fid, idx, start, p0, min(p0 + chunk_periods, periods), freq_minutes, seed)
+             for idx, fid in enumerate(field_ids) for p0 in range(0, periods, chunk_periods)]
+    if processes <= 1:
+        for t in tasks:
+            yield _chunk_task(t)
+        return
+    window = processes * 2
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        for w0 in range(0, len(tasks), window):
+            yield from pool.imap(_chunk_task, tasks[w0:w0 + window])
+
+
 @click.group()
 def cli():
     pass
@@ -80,15 +160,29 @@ def fields(count, out):
 @click.option("--field-id", default="field_1")
 @click.option("--periods", default=48)
 @click.option("--out", default=None)
-def sensors(field_id, periods, out):
-    rows = generate_sensor_series(field_id=field_id, periods=periods)
+@click.option("--fields", default=0, help="Generate field_1..field_N in vectorized mode instead of one --field-id")
+@click.option("--vectorized", is_flag=True, help="Use the vectorized generator for --field-id as well")
+@click.option("--freq-minutes", default=60, show_default=True)
+@click.option("--start", default=None, help="ISO timestamp of the newest reading (default: now)")
+@click.option("--seed", default=None, type=int, help="Seed for reproducible vectorized output")
+@click.option("--chunk-periods", default=10000, show_default=True, help="Timestamps per streamed chunk")
+@click.option("--processes", default=1, show_default=True, help="Worker processes for vectorized mode")
+def sensors(field_id, periods, out, fields, vectorized, freq_minutes, start, seed, chunk_periods, processes):
+    start = datetime.fromisoformat(start) if start else None
     sink = open(out, "w") if out else None
-    for r in rows:
-        text = json.dumps(r)
-        if sink:
-            sink.write(text + "\n")
-        else:
-            click.echo(text)
+    if fields or vectorized:
+        field_ids = [f"field_{i+1}" for i in range(fields)] if fields else [field_id]
+        for chunk in iter_bulk_sensor_chunks(field_ids, periods, start=start, freq_minutes=freq_minutes,
+                                             seed=seed, chunk_periods=chunk_periods, processes=processes):
+            (sink or sys.stdout).write(chunk)
+    else:
+        rows = generate_sensor_series(field_id=field_id, start=start, periods=periods, freq_minutes=freq_minutes)
+        for r in rows:
+            text = json.dumps(r)
+            if sink:
+                sink.write(text + "\n")
+            else:
+                click.echo(text)
     if sink:
         sink.close()
 
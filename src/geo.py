@@ -0,0 +1,155 @@
+"""In-process spatial index over field boundaries, used when MongoDB is not available.
+
+`FieldIndex` packs the bounding boxes of the field polygons into a Sort-Tile-Recursive (STR)
+R-tree once, then answers the same two questions the API asks MongoDB's `2dsphere` index:
+fields within `radius` metres of a point (`$geoNear`) and fields lying inside a polygon
+(`$geoWithin`). The tree only narrows the candidates by bounding box; distances and containment
+are then checked exactly on the few candidates. Distances use a local equirectangular projection
+around the query point, which is accurate to well under a percent at field scale.
+"""
+import math
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+_M_PER_DEG = math.pi * EARTH_RADIUS_M / 180
+
+BBox = Tuple[float, float, float, float]  # min_lng, min_lat, max_lng, max_lat
+
+
+def rings(geometry: dict) -> List[list]:
+    """Outer rings of a GeoJSON Polygon or MultiPolygon as lists of `[lng, lat]`."""
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates'][0]]
+    if geometry['type'] == 'MultiPolygon':
+        return [poly[0] for poly in geometry['coordinates']]
+    raise ValueError(f"Unsupported geometry type {geometry['type']!r}")
+
+
+def bbox_of(points: Iterable[Sequence[float]]) -> BBox:
+    lngs, lats = zip(*((p[0], p[1]) for p in points))
+    return (min(lngs), min(lats), max(lngs), max(lats))
+
+
+def bbox_polygon(bbox: BBox) -> dict:
+    min_lng, min_lat, max_lng, max_lat = bbox
+    ring = [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+    return {'type': 'Polygon', 'coordinates': [ring]}
+
+
+def point_in_ring(lng: float, lat: float, ring: list) -> bool:
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lng < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _segment_distance(px, py, ax, ay, bx, by) -> float:
+    dx, dy = bx - ax, by - ay
+    length = dx * dx + dy * dy
+    t = 0.0 if length == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def distance_to_geometry_m(lng: float, lat: float, geometry: dict) -> float:
+    """Metres from a point to the nearest part of a polygon; 0 when the point is inside it."""
+    scale = math.cos(math.radians(lat))
+    best = math.inf
+    for ring in rings(geometry):
+        if point_in_ring(lng, lat, ring):
+            return 0.0
+        xy = [((p[0] - lng) * scale * _M_PER_DEG, (p[1] - lat) * _M_PER_DEG) for p in ring]
+        for (ax, ay), (bx, by) in zip(xy, xy[1:]):
+            best = min(best, _segment_distance(0.0, 0.0, ax, ay, bx, by))
+    return best
+
+
+def _intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class _Node:
+    __slots__ = ('bbox', 'children', 'items')
+
+    def __init__(self, bbox, children=None, items=None):
+        self.bbox = bbox
+        self.children = children
+        self.items = items
+
+
+class STRTree:
+    """Static R-tree over `(bbox, item)` pairs, bulk-loaded with Sort-Tile-Recursive packing."""
+
+    def __init__(self, entries: Iterable[Tuple[BBox, object]], node_capacity: int=16):
+        self.node_capacity = node_capacity
+        level = [_Node(bbox, items=[(bbox, item)]) for bbox, item in entries]
+        self.size = len(level)
+        while len(level) > 1:
+            level = self._pack(level)
+        self.root = level[0] if level else None
+
+    def _pack(self, nodes: List[_Node]) -> List[_Node]:
+        cap = self.node_capacity
+        groups = math.ceil(len(nodes) / cap)
+        slices = math.ceil(math.sqrt(groups))
+        per_slice = slices * cap
+        nodes = sorted(nodes, key=lambda n: n.bbox[0] + n.bbox[2])
+        parents = []
+        for s in range(0, len(nodes), per_slice):
+            column = sorted(nodes[s:s + per_slice], key=lambda n: n.bbox[1] + n.bbox[3])
+            for g in range(0, len(column), cap):
+                children = column[g:g + cap]
+                bbox = (min(c.bbox[0] for c in children), min(c.bbox[1] for c in children),
+                        max(c.bbox[2] for c in children), max(c.bbox[3] for c in children))
+                parents.append(_Node(bbox, children=children))
+        return parents
+
+    def query(self, bbox: BBox) -> list:
+        """Items whose bounding box intersects `bbox`."""
+        out = []
+        stack = [self.root] if self.root is not None and _intersects(self.root.bbox, bbox) else []
+        while stack:
+            node = stack.pop()
+            if node.items is not None:
+                out += [item for item_bbox, item in node.items if _intersects(item_bbox, bbox)]
+                continue
+            stack += [c for c in node.children if _intersects(c.bbox, bbox)]
+        return out
+
+
+class FieldIndex:
+    """Field documents indexed by their `boundary` polygons."""
+
+    def __init__(self, docs: Iterable[dict], node_capacity: int=16):
+        entries = []
+        for doc in docs:
+            boundary = doc.get('boundary')
+            if not boundary:
+                continue
+            entries.append((bbox_of(p for ring in rings(boundary) for p in ring), doc))
+        self.tree = STRTree(entries, node_capacity=node_capacity)
+
+    def __len__(self):
+        return self.tree.size
+
+    def near(self, lng: float, lat: float, radius: float, limit: Optional[int]=None) -> List[Tuple[float, dict]]:
+        """`(distance_m, doc)` for fields within `radius` metres of the point, nearest first."""
+        dlat = radius / _M_PER_DEG
+        dlng = radius / (_M_PER_DEG * max(math.cos(math.radians(lat)), 1e-6))
+        candidates = self.tree.query((lng - dlng, lat - dlat, lng + dlng, lat + dlat))
+        hits = [(distance_to_geometry_m(lng, lat, doc['boundary']), doc) for doc in candidates]
+        hits = sorted((h for h in hits if h[0] <= radius), key=lambda h: (h[0], str(h[1].get('_id'))))
+        return hits[:limit] if limit else hits
+
+    def within(self, polygon: dict, limit: Optional[int]=None) -> List[dict]:
+        """Fields whose whole boundary lies inside `polygon` (GeoJSON Polygon), in `_id` order."""
+        outer = rings(polygon)[0]
+        candidates = self.tree.query(bbox_of(outer))
+        hits = [doc for doc in candidates
+                if all(point_in_ring(p[0], p[1], outer) for ring in rings(doc['boundary']) for p in ring)]
+        hits.sort(key=lambda d: str(d.get('_id')))
+        return hits[:limit] if limit else hits
@@ -0,0 +1,75 @@
+"""Explain-driven check that the MongoDB queries issued by the code use an index.
+
+`QUERIES` lists the filters, projections and sorts the API and scripts send to MongoDB.
+`check_queries` asks the server for each query's winning plan (`explain`, queryPlanner verbosity,
+so nothing is executed) and flags plans containing a COLLSCAN. Queries marked `covered` are also
+flagged when the plan still FETCHes documents, i.e. the index does not hold every projected field.
+Run it with `scripts/check_mongo_indexes.py` after `bootstrap_databases.py`.
+"""
+from typing import Iterable, List, Optional
+
+QUERIES = [
+    {'name': 'low_ndvi_fields', 'source': 'scripts/query_mongo_low_quality.py', 'collection': 'fields',
+     'filter': {'latest_metrics.ndvi': {'$lt': 0.45}},
+     'projection': {'_id': 1, 'name': 1, 'farm_id': 1, 'latest_metrics.ndvi': 1, 'soil_type': 1},
+     'covered': True},
+    {'name': 'low_soil_moisture_fields', 'source': 'threshold rules (src/rules.json)', 'collection': 'fields',
+     'filter': {'latest_metrics.soil_moisture': {'$lt': 20.0}}, 'projection': {'_id': 1, 'farm_id': 1}},
+    {'name': 'fields_by_farm', 'source': 'docs/queries.md', 'collection': 'fields',
+     'filter': {'farm_id': 'farm_1'}},
+    {'name': 'fields_keyset_page', 'source': 'src/api.py get_fields', 'collection': 'fields',
+     'filter': {'_id': {'$gt': 'field_1'}}, 'sort': {'_id': 1}, 'limit': 100},
+    {'name': 'field_by_id', 'source': 'src/api.py get_field', 'collection': 'fields',
+     'filter': {'_id': 'field_1'}},
+    {'name': 'fields_within_area', 'source': 'src/api.py get_fields_within', 'collection': 'fields',
+     'filter': {'boundary': {'$geoWithin': {'$geometry': {
+         'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}}}},
+     'sort': {'_id': 1}, 'limit': 1000},
+]
+
+
+_CHILDREN = ('queryPlan', 'inputStage', 'outerStage', 'innerStage')
+
+
+def _plan_nodes(plan: Optional[dict]):
+    stack = [plan] if plan else []
+    while stack:
+        node = stack.pop()
+        yield node
+        stack += [node[k] for k in _CHILDREN if isinstance(node.get(k), dict)]
+        stack += node.get('inputStages', [])
+
+
+def plan_stages(plan: Optional[dict]) -> List[str]:
+    """Stage names of an explain plan tree, root first."""
+    return [node['stage'] for node in _plan_nodes(plan) if 'stage' in node]
+
+
+def winning_plan(explain: dict) -> Optional[dict]:
+    return explain.get('queryPlanner', {}).get('winningPlan')
+
+
+def assess(query: dict, explain: dict) -> dict:
+    """Summarize one explain result: stages, index names and any problems found."""
+    plan = winning_plan(explain)
+    stages = plan_stages(plan)
+    problems = []
+    if 'COLLSCAN' in stages:
+        problems.append('COLLSCAN')
+    elif query.get('covered') and 'FETCH' in stages:
+        problems.append('not covered (FETCH)')
+    indexes = [node['indexName'] for node in _plan_nodes(plan) if node.get('indexName')]
+    return {'name': query['name'], 'source': query.get('source'), 'stages': stages, 'indexes': indexes,
+            'problems': problems}
+
+
+def explain_find(db, query: dict) -> dict:
+    command = {'find': query['collection'], 'filter': query.get('filter', {})}
+    for key in ('projection', 'sort', 'limit'):
+        if query.get(key) is not None:
+            command[key] = query[key]
+    return db.command({'explain': command, 'verbosity': 'queryPlanner'})
+
+
+def check_queries(db, queries: Iterable[dict]=QUERIES) -> List[dict]:
+    return [assess(q, explain_find(db, q)) for q in queries]
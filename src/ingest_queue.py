@@ -0,0 +1,282 @@
+"""Bounded, batching ingest queue behind `POST /api/fields/{id}/ingest-sensors`.
+
+Requests only enqueue their rows; a small pool of worker tasks drains the queue in large batches
+that span requests and writes each batch to the stores once. Queue depth is counted in rows so the
+API can refuse work with 429 once the backlog passes a limit, instead of growing without bound.
+
+`RedisStreamIngestQueue` keeps entries in a Redis stream read through a consumer group, so rows
+survive a worker restart: entries are acknowledged (and deleted) only after their batch has been
+written, and entries left pending by a dead consumer are reclaimed with XAUTOCLAIM.
+Entries that keep failing are not retried forever: once an entry has been delivered
+`max_deliveries` times it is moved to a dead-letter stream (`{stream}:dead`) and acknowledged.
+`MemoryIngestQueue` has the same interface for development and tests but loses its contents on exit.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import socket
+import time
+from collections import deque
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from src import metrics
+
+logger = logging.getLogger('pasture.ingest')
+
+# (entry id, rows) as handed to workers and back to `ack`
+Entry = Tuple[str, List[dict]]
+
+
+class MemoryIngestQueue:
+    durable = False
+
+    def __init__(self):
+        self._entries = deque()
+        self._rows = 0
+        self._ids = itertools.count(1)
+        self._ready = None
+
+    async def start(self):
+        self._ready = asyncio.Event()
+
+    async def put(self, rows: List[dict]):
+        self._entries.append((str(next(self._ids)), rows))
+        self._rows += len(rows)
+        self._ready.set()
+
+    async def depth(self) -> int:
+        return self._rows
+
+    async def get(self, max_entries: int, block: float) -> List[Entry]:
+        if not self._entries:
+            self._ready.clear()
+            # not wait_for: on Python 3.11 a worker cancelled while wait_for is timing out can hang stop()
+            waiter = asyncio.ensure_future(self._ready.wait())
+            try:
+                done, _ = await asyncio.wait({waiter}, timeout=block)
+            finally:
+                waiter.cancel()
+            if not done:
+                return []
+        return [self._entries.popleft() for _ in range(min(max_entries, len(self._entries)))]
+
+    async def ack(self, entries: List[Entry]):
+        self._rows -= sum(len(rows) for _, rows in entries)
+
+
+# XACK each entry on its own and release only the rows of entries this call acknowledged: an entry
+# reclaimed from a slow consumer can be acked by both, and the depth must drop once
+# KEYS: stream, depth key; ARGV: group, then entry id and row count pairs
+_ACK_SCRIPT = """
+local rows = 0
+for i = 2, #ARGV, 2 do
+    if redis.call('XACK', KEYS[1], ARGV[1], ARGV[i]) == 1 then
+        rows = rows + tonumber(ARGV[i + 1])
+    end
+    redis.call('XDEL', KEYS[1], ARGV[i])
+end
+if rows > 0 then
+    redis.call('DECRBY', KEYS[2], rows)
+end
+return rows
+"""
+
+# Move one pending entry to the dead-letter stream, with its id and delivery count, and release it
+# KEYS: stream, dead-letter stream, depth key; ARGV: group, entry id, delivery count
+_DEAD_LETTER_SCRIPT = """
+local entry = redis.call('XRANGE', KEYS[1], ARGV[2], ARGV[2])[1]
+local rows = 0
+if entry then
+    local fields = entry[2]
+    redis.call('XADD', KEYS[2], '*', 'source_id', ARGV[2], 'deliveries', ARGV[3], unpack(fields))
+    for i = 1, #fields, 2 do
+        if fields[i] == 'rows' then
+            rows = #cjson.decode(fields[i + 1])
+        end
+    end
+end
+if redis.call('XACK', KEYS[1], ARGV[1], ARGV[2]) == 1 and rows > 0 then
+    redis.call('DECRBY', KEYS[3], rows)
+end
+redis.call('XDEL', KEYS[1], ARGV[2])
+return rows
+"""
+
+
+class RedisStreamIngestQueue:
+    durable = True
+
+    def __init__(self, redis, stream='ingest:sensors', group='ingest-workers', consumer: Optional[str]=None,
+                 claim_idle_ms: int=60000, max_deliveries: int=5):
+        """`redis` is a `redis.asyncio` client; `consumer` defaults to host and pid, unique per API process."""
+        self.redis = redis
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        self.dead_stream = f"{stream}:dead"
+        # rows enqueued but not yet acknowledged, across all processes
+        self.depth_key = f"{stream}:rows"
+        self._next_claim = 0.0
+        self._ack = redis.register_script(_ACK_SCRIPT)
+        self._dead_letter = redis.register_script(_DEAD_LETTER_SCRIPT)
+
+    async def start(self):
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def put(self, rows: List[dict]):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(self.stream, {'rows': json.dumps(rows)})
+            pipe.incrby(self.depth_key, len(rows))
+            await pipe.execute()
+
+    async def depth(self) -> int:
+        return int(await self.redis.get(self.depth_key) or 0)
+
+    @staticmethod
+    def _entries(messages) -> List[Entry]:
+        out = []
+        for entry_id, fields in messages:
+            if not fields:
+                continue
+            data = fields.get(b'rows', fields.get('rows'))
+            out.append((entry_id.decode() if isinstance(entry_id, bytes) else entry_id, json.loads(data)))
+        return out
+
+    async def get(self, max_entries: int, block: float) -> List[Entry]:
+        now = time.monotonic()
+        if now >= self._next_claim:
+            # take over entries a crashed or restarted consumer read but never acknowledged
+            self._next_claim = now + self.claim_idle_ms / 2000
+            await self._drop_poison(max_entries)
+            claimed = await self.redis.xautoclaim(self.stream, self.group, self.consumer,
+                                                  min_idle_time=self.claim_idle_ms, start_id='0-0', count=max_entries)
+            entries = self._entries(claimed[1])
+            if entries:
+                logger.warning(f"Reclaimed {len(entries)} unacknowledged ingest entries")
+                return entries
+        resp = await self.redis.xreadgroup(self.group, self.consumer, {self.stream: '>'},
+                                           count=max_entries, block=max(1, int(block * 1000)))
+        return self._entries(resp[0][1]) if resp else []
+
+    async def _drop_poison(self, count: int):
+        """Dead-letter the idle pending entries that already used up their deliveries."""
+        pending = await self.redis.xpending_range(self.stream, self.group, min='-', max='+', count=count,
+                                                  idle=self.claim_idle_ms)
+        for p in pending:
+            if p['times_delivered'] < self.max_deliveries:
+                continue
+            entry_id = p['message_id']
+            entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+            await self._dead_letter(keys=[self.stream, self.dead_stream, self.depth_key],
+                                    args=[self.group, entry_id, p['times_delivered']])
+            logger.error(f"Ingest entry {entry_id} failed {p['times_delivered']} deliveries; moved to {self.dead_stream}")
+
+    async def ack(self, entries: List[Entry]):
+        args = [self.group]
+        for entry_id, rows in entries:
+            args += [entry_id, len(rows)]
+        await self._ack(keys=[self.stream, self.depth_key], args=args)
+
+
+class IngestWorkers:
+    """Worker tasks that drain a queue in batches of about `batch_rows` and pass them to `handler`.
+
+    A batch is cut once it holds `batch_rows` rows or `linger` seconds after its first entry.
+    """
+
+    def __init__(self, queue, handler: Callable[[List[dict]], Awaitable[None]], workers: int=2,
+                 batch_rows: int=5000, linger: float=0.2, max_depth: int=100000, entries_per_read: int=100):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.batch_rows = batch_rows
+        self.linger = linger
+        self.max_depth = max_depth
+        self.entries_per_read = entries_per_read
+        self._tasks = []
+        # rows/s written, smoothed; used to suggest Retry-After
+        self.drain_rate = 0.0
+
+    @classmethod
+    def from_env(cls, queue, handler):
+        return cls(queue, handler,
+                   workers=int(os.getenv('INGEST_WORKERS', 2)),
+                   batch_rows=int(os.getenv('INGEST_BATCH_ROWS', 5000)),
+                   linger=float(os.getenv('INGEST_BATCH_LINGER', 0.2)),
+                   max_depth=int(os.getenv('INGEST_QUEUE_MAX_ROWS', 100000)))
+
+    async def start(self):
+        await self.queue.start()
+        self._tasks = [asyncio.create_task(self._run(), name=f'ingest-worker-{i}') for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def admit(self, rows: List[dict]) -> Optional[int]:
+        """Enqueue `rows`; returns None, or a Retry-After in seconds when the backlog is full."""
+        depth = await self.queue.depth()
+        if metrics.ENABLED:
+            metrics.ingest_backlog_rows.set(depth)
+        if depth + len(rows) > self.max_depth:
+            if metrics.ENABLED:
+                metrics.ingest_rows.inc('rejected', amount=len(rows))
+            rate = self.drain_rate or self.batch_rows
+            return max(1, min(60, math.ceil((depth + len(rows) - self.max_depth / 2) / rate)))
+        await self.queue.put(rows)
+        return None
+
+    async def _next_batch(self) -> List[Entry]:
+        entries = await self.queue.get(self.entries_per_read, block=1.0)
+        if not entries:
+            return entries
+        rows = sum(len(r) for _, r in entries)
+        deadline = time.monotonic() + self.linger
+        while rows < self.batch_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            more = await self.queue.get(self.entries_per_read, block=remaining)
+            entries += more
+            rows += sum(len(r) for _, r in more)
+        return entries
+
+    async def _run(self):
+        while True:
+            entries = []
+            try:
+                entries = await self._next_batch()
+                if not entries:
+                    continue
+                rows = [row for _, batch in entries for row in batch]
+                t0 = time.perf_counter()
+                await self.handler(rows)
+                await self.queue.ack(entries)
+                seconds = time.perf_counter() - t0
+                if metrics.ENABLED:
+                    metrics.ingest_batch_seconds.observe(seconds)
+                    metrics.ingest_rows.inc('ok', amount=len(rows))
+                rate = len(rows) / max(seconds, 1e-6)
+                self.drain_rate = rate if not self.drain_rate else 0.8 * self.drain_rate + 0.2 * rate
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # unacknowledged entries stay pending and are reclaimed by the durable queue;
+                # the in-memory queue has already handed them out, so just release their rows
+                logger.error(f"Ingest worker batch of {len(entries)} entries failed: {e}")
+                if metrics.ENABLED:
+                    metrics.ingest_rows.inc('failed', amount=sum(len(r) for _, r in entries))
+                if entries and not self.queue.durable:
+                    await self.queue.ack(entries)
+                await asyncio.sleep(1.0)
@@ -0,0 +1,224 @@
+"""In-process Prometheus metrics for the API, the database clients and the ingest workers.
+
+Counters, gauges and histograms live in one module-level registry and are rendered in the
+Prometheus text format by `GET /metrics`; there is no dependency on `prometheus_client`. Set
+`METRICS_ENABLED=0` to turn instrumentation off: `timed` then hands back a shared no-op context
+manager and the other helpers return after one flag check, so instrumented code paths cost a
+function call. Values are per process; with several API workers, scrape each one.
+
+Client operations are recorded as
+`pasture_client_op_seconds{client, op}` (histogram, real calls only),
+`pasture_client_ops_total{client, op, outcome}` with outcome `ok`, `error` or `dry_run`, and
+`pasture_client_rows_total{client, op}` for the rows, documents or commands each call carried.
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Dict, Sequence, Tuple
+
+ENABLED = os.getenv('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds; the request and database-call latencies of this service sit between 1 ms and a few seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str='') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str, labels: Sequence[str]=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = self._header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, labels)} {_number(value)}')
+        return lines
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = self._header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets: Sequence[float]=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self):
+        lines = self._header()
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+http_request_seconds = REGISTRY.register(Histogram(
+    'pasture_http_request_seconds', 'API request latency until the response starts, by route template',
+    ('method', 'route', 'status')))
+client_op_seconds = REGISTRY.register(Histogram(
+    'pasture_client_op_seconds', 'Database client call latency', ('client', 'op')))
+client_ops = REGISTRY.register(Counter(
+    'pasture_client_ops_total', 'Database client calls by outcome (ok, error, dry_run)', ('client', 'op', 'outcome')))
+client_rows = REGISTRY.register(Counter(
+    'pasture_client_rows_total', 'Rows, documents or commands carried by database client calls', ('client', 'op')))
+ingest_backlog_rows = REGISTRY.register(Gauge(
+    'pasture_ingest_backlog_rows', 'Sensor rows queued for the ingest workers and not yet acknowledged'))
+ingest_rows = REGISTRY.register(Counter(
+    'pasture_ingest_rows_total', 'Sensor rows by outcome: ok or failed in an ingest batch, rejected with 429', ('outcome',)))
+ingest_batch_seconds = REGISTRY.register(Histogram(
+    'pasture_ingest_batch_seconds', 'Time to write one ingest batch to every store'))
+
+
+class _Timer:
+    __slots__ = ('client', 'op', 'rows', 't0')
+
+    def __init__(self, client: str, op: str, rows: int):
+        self.client = client
+        self.op = op
+        self.rows = rows
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        client_op_seconds.observe(time.perf_counter() - self.t0, self.client, self.op)
+        client_ops.inc(self.client, self.op, 'error' if exc_type else 'ok')
+        if self.rows:
+            client_rows.inc(self.client, self.op, amount=self.rows)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timed(client: str, op: str, rows: int=0):
+    """`with timed('cassandra', 'insert', len(rows)):` records latency, outcome and rows of one call."""
+    if not ENABLED:
+        return _NO_TIMER
+    return _Timer(client, op, rows)
+
+
+def dry_run(client: str, op: str, rows: int=0):
+    """Count a call a dry-run client only printed."""
+    if not ENABLED:
+        return
+    client_ops.inc(client, op, 'dry_run')
+    if rows:
+        client_rows.inc(client, op, amount=rows)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    if ENABLED:
+        http_request_seconds.observe(seconds, method, route, str(status))
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,6 @@
+"""Streaming ingest engine that fans sensor rows out to every store in one pass."""
+
+from .engine import IngestEngine, Stage
+from .sinks import CassandraSink, MongoLatestSink, RedisAggregateSink, Neo4jEventSink, RollupSink
+
+__all__ = ["IngestEngine","Stage","CassandraSink","MongoLatestSink","RedisAggregateSink","Neo4jEventSink","RollupSink"]
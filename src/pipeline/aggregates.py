@@ -0,0 +1,78 @@
+"""Columnar rolling-window aggregation for the Redis `field:{id}` hashes.
+
+Rows are grouped by (field_id, metric_type) into NumPy arrays. Rolling mean/min/max/std over the
+last `window` readings are computed per group with a sliding-window view instead of per-row
+Python arithmetic. The last `window - 1` values of each group carry over to the next batch, so
+results match a row-by-row `deque(maxlen=window)` across batch boundaries. Each batch yields only
+the final per-field hash values plus the alerts raised by the `alerts` rules of `src/rules.py`;
+`commit` a batch once its alerts are written so the alert state only moves on after that.
+
+The hash values are `latest_{metric}` and `{metric}_7day_avg`, both the rolling mean, as the
+aggregation scripts have always written them; min/max/std only feed the rules' window predicates.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from src.rules import RuleEngine, RuleSet, load_rules, rolling_windows
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+
+class AggregateBatch:
+    def __init__(self):
+        # field_id -> mapping for HSET field:{field_id}
+        self.latest: Dict[str, dict] = {}
+        # (field_id, alert_type, payload) in row order per group
+        self.alerts: List[Tuple[str, str, dict]] = []
+        # alert state changed by this batch, saved by `RollingAggregator.commit` once the alerts are pushed
+        self.alert_states: Dict[str, dict] = {}
+
+
+class RollingAggregator:
+    def __init__(self, window: int=7, rules: RuleSet=None, state=None):
+        """`state` stores per-field alert state (see `src/rules.py`); in-process by default."""
+        if np is None:
+            raise RuntimeError('numpy not available')
+        self.window = window
+        self.engine = RuleEngine(load_rules().for_sink('alerts') if rules is None else rules, state=state)
+        self._carry = {}
+
+    def update(self, rows: Iterable[dict]) -> AggregateBatch:
+        """Fold a batch of sensor rows (file order) into the rolling state."""
+        groups = defaultdict(lambda: ([], []))
+        for r in rows:
+            values, stamps = groups[(r['field_id'], r['metric_type'])]
+            values.append(r['metric_value'])
+            stamps.append(r.get('sensor_ts'))
+
+        out = AggregateBatch()
+        w = self.window
+        evaluated = []
+        for (field_id, metric), (values, stamps) in groups.items():
+            x = np.asarray(values, dtype=np.float64)
+            mean, lo, hi, std = self._rolling(field_id, metric, x)
+            out.latest.setdefault(field_id, {}).update({
+                f'latest_{metric}': float(mean[-1]),
+                f'{metric}_7day_avg': float(mean[-1]),
+            })
+            evaluated.append((field_id, metric, x, stamps, {
+                ('mean', w): mean, ('min', w): lo, ('max', w): hi, ('std', w): std}))
+        out.alerts, out.alert_states = self.engine.evaluate_groups(evaluated)
+        return out
+
+    def commit(self, batch: AggregateBatch):
+        """Save the alert state of a batch whose alerts were written."""
+        self.engine.commit(batch.alert_states)
+
+    def _rolling(self, field_id, metric, x):
+        w = self.window
+        key = (field_id, metric)
+        carry = self._carry.get(key)
+        joined = x if carry is None else np.concatenate([carry, x])
+        self._carry[key] = joined[-(w - 1):] if w > 1 else joined[:0]
+        windows = rolling_windows(joined, w, len(x))
+        return (np.nanmean(windows, axis=1), np.nanmin(windows, axis=1),
+                np.nanmax(windows, axis=1), np.nanstd(windows, axis=1))
@@ -0,0 +1,121 @@
+"""Command line entry point: `python -m src.pipeline sensors.jsonl [more.jsonl ...]`.
+
+Dry-run by default like the other scripts; pass `--real` to write to the databases configured in
+the environment (`.env` is loaded when python-dotenv is installed).
+"""
+import json
+import sys
+import os
+
+import click
+
+from src.clients.mongo_client import MongoClientWrapper
+from src.clients.cassandra_client import CassandraClientWrapper
+from src.clients.redis_client import RedisClientWrapper
+from src.clients.neo4j_client import Neo4jClientWrapper
+
+from .engine import IngestEngine, Stage
+from .sinks import CassandraSink, MongoLatestSink, RedisAggregateSink, Neo4jEventSink, RollupSink
+
+ALL_SINKS = ('cassandra', 'rollups', 'redis', 'mongo', 'neo4j')
+
+
+def build_engine(sinks=ALL_SINKS, dry_run=True, batch_size=1000, queue_size=8, workers=None):
+    """Create clients and stages for `sinks`; returns `(engine, clients)` so callers can close them."""
+    workers = workers or {}
+    clients = []
+    stages = []
+    for name in sinks:
+        if name == 'cassandra':
+            client = CassandraClientWrapper(keyspace=os.getenv('CASSANDRA_KEYSPACE', 'pasture'), dry_run=dry_run)
+            sink = CassandraSink(client, table=os.getenv('CASSANDRA_TABLE', 'sensor_data_by_field'),
+                                 metric_table=os.getenv('CASSANDRA_METRIC_TABLE', 'sensor_data_by_field_metric'))
+        elif name == 'rollups':
+            client = CassandraClientWrapper(keyspace=os.getenv('CASSANDRA_KEYSPACE', 'pasture'), dry_run=dry_run)
+            sink = RollupSink(client)
+        elif name == 'redis':
+            client = RedisClientWrapper(dry_run=dry_run)
+            sink = RedisAggregateSink(client)
+        elif name == 'mongo':
+            client = MongoClientWrapper(dry_run=dry_run)
+            cache = None
+            if not dry_run and os.getenv('REDIS_URL'):
+                # drop the API's cached field documents whose latest_metrics change
+                cache = RedisClientWrapper(dry_run=False)
+                clients.append(cache)
+            sink = MongoLatestSink(client, cache=cache)
+        elif name == 'neo4j':
+            client = Neo4jClientWrapper(dry_run=dry_run)
+            state = None
+            if not dry_run and os.getenv('REDIS_URL'):
+                # share event alert state with the API and other jobs
+                state = RedisClientWrapper(dry_run=False)
+                clients.append(state)
+            sink = Neo4jEventSink(client, state=state)
+        else:
+            raise ValueError(f"unknown sink {name!r}; expected one of {', '.join(ALL_SINKS)}")
+        clients.append(client)
+        stages.append(Stage(sink, workers=workers.get(name, 2), queue_size=queue_size))
+    return IngestEngine(stages, batch_size=batch_size), clients
+
+
+def _load_dotenv():
+    try:
+        from dotenv import load_dotenv
+    except Exception:
+        return
+    load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.env'))
+
+
+@click.command()
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--real', is_flag=True, help='Write to the configured databases instead of dry-run')
+@click.option('--sinks', default=','.join(ALL_SINKS), show_default=True, help='Comma-separated sinks to feed')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per batch handed to each sink')
+@click.option('--queue-size', default=8, show_default=True, help='Batches buffered per sink before the reader blocks')
+@click.option('--cassandra-workers', default=4, show_default=True)
+@click.option('--rollup-workers', default=2, show_default=True)
+@click.option('--mongo-workers', default=2, show_default=True)
+@click.option('--neo4j-workers', default=2, show_default=True)
+@click.option('--processes', default=1, show_default=True,
+              help='Shard rows by field_id across this many engine processes (each with its own connections)')
+@click.option('--readers', default=None, type=int, help='Processes scanning byte ranges when --processes > 1')
+@click.option('--chunk-mb', default=8, show_default=True, help='Byte-range size per reader task, in MiB')
+@click.option('--json', 'as_json', is_flag=True, help='Print the stats report as JSON')
+def main(paths, real, sinks, batch_size, queue_size, cassandra_workers, rollup_workers, mongo_workers, neo4j_workers,
+         processes, readers, chunk_mb, as_json):
+    if real:
+        _load_dotenv()
+    engine_options = dict(
+        sinks=[s.strip() for s in sinks.split(',') if s.strip()],
+        dry_run=not real, batch_size=batch_size, queue_size=queue_size,
+        workers={'cassandra': cassandra_workers, 'rollups': rollup_workers, 'mongo': mongo_workers, 'neo4j': neo4j_workers},
+    )
+    if processes > 1:
+        from .parallel import run_parallel
+        report = run_parallel(paths, shards=processes, readers=readers, chunk_bytes=chunk_mb << 20, **engine_options)
+    else:
+        engine, clients = build_engine(**engine_options)
+        try:
+            report = engine.run(paths)
+        finally:
+            for client in clients:
+                client.close()
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    # rows a sink failed to write are lost for this run, so scripts and schedulers must see a failure
+    if report.get('errors') or any(st['errors'] for st in report['stages'].values()):
+        sys.exit(1)
+
+
+def _print_report(report):
+    click.echo(f"Read {report['rows_read']} rows in {report['wall_seconds']}s "
+               f"({report['rows_per_sec']} rows/s, {report['parse_seconds']}s parsing)")
+    for name, st in report['stages'].items():
+        click.echo(f"  {name:<10} {st['rows']:>9} rows  {st['rows_per_busy_sec']:>10} rows/busy-s  "
+                   f"busy {st['busy_seconds']}s  backpressure {st['backpressure_seconds']}s  "
+                   f"max queue {st['max_queue_depth']}  errors {st['errors']}")
+    for error in report.get('errors', []):
+        click.echo(f"  shard failed: {error}")
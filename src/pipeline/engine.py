@@ -0,0 +1,165 @@
+"""Single-pass fan-out ingest: parse each JSONL line once, hand the batch to every sink.
+
+The reader thread groups parsed rows into batches and puts each batch on every stage's bounded
+queue. Stage worker threads drain their queue into the sink, so a slow store only holds back the
+reader once its queue is full. Time the reader spends blocked on a full queue is that stage's
+backpressure.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Iterable, List
+
+logger = logging.getLogger('pasture.pipeline')
+
+_STOP = object()
+
+
+class StageStats:
+    def __init__(self):
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def record(self, rows, seconds, failed=False):
+        with self._lock:
+            self.batches += 1
+            self.busy_seconds += seconds
+            if failed:
+                self.errors += 1
+            else:
+                self.rows += rows
+
+    def as_dict(self, wall_seconds):
+        return {
+            'rows': self.rows,
+            'batches': self.batches,
+            'errors': self.errors,
+            'rows_per_sec': round(self.rows / wall_seconds, 1) if wall_seconds else 0.0,
+            # what one worker sustains while writing, independent of waiting on the reader
+            'rows_per_busy_sec': round(self.rows / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'backpressure_seconds': round(self.blocked_seconds, 3),
+            'max_queue_depth': self.max_depth,
+        }
+
+
+class Stage:
+    """A sink plus its bounded queue of batches and worker threads."""
+
+    def __init__(self, sink, workers: int=1, queue_size: int=8):
+        if sink.max_workers is not None:
+            workers = min(workers, sink.max_workers)
+        self.sink = sink
+        self.name = sink.name
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = StageStats()
+        self._threads = []
+
+    def start(self):
+        self.sink.setup()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def put(self, batch):
+        depth = self.queue.qsize()
+        if depth > self.stats.max_depth:
+            self.stats.max_depth = depth
+        t0 = time.perf_counter()
+        self.queue.put(batch)
+        self.stats.blocked_seconds += time.perf_counter() - t0
+
+    def stop(self):
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _STOP:
+                return
+            t0 = time.perf_counter()
+            try:
+                self.sink.write(batch)
+                self.stats.record(len(batch), time.perf_counter() - t0)
+            except Exception as e:
+                self.stats.record(len(batch), time.perf_counter() - t0, failed=True)
+                logger.error(f"{self.name} stage failed on a batch of {len(batch)} rows: {e}")
+
+
+class IngestEngine:
+    def __init__(self, stages: List[Stage], batch_size: int=1000):
+        self.stages = stages
+        self.batch_size = batch_size
+        self.rows_read = 0
+        self.parse_seconds = 0.0
+        self.wall_seconds = 0.0
+        self._t_start = None
+
+    def run(self, paths: Iterable[str]):
+        """Stream every file through all stages; returns the stats report."""
+        self.start()
+        try:
+            for path in paths:
+                self._read(path)
+        finally:
+            self.finish()
+        return self.report()
+
+    def start(self):
+        self._t_start = time.perf_counter()
+        for stage in self.stages:
+            stage.start()
+
+    def feed(self, rows: List[dict]):
+        """Hand already-parsed rows to the stages in `batch_size` slices."""
+        for i in range(0, len(rows), self.batch_size):
+            self._fan_out(rows[i:i+self.batch_size])
+
+    def finish(self):
+        """Wait for every stage to drain its queue and stop its workers."""
+        for stage in self.stages:
+            stage.stop()
+        self.wall_seconds = time.perf_counter() - self._t_start
+
+    def _read(self, path):
+        batch = []
+        with open(path) as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                t0 = time.perf_counter()
+                batch.append(json.loads(line))
+                self.parse_seconds += time.perf_counter() - t0
+                if len(batch) >= self.batch_size:
+                    self._fan_out(batch)
+                    batch = []
+        if batch:
+            self._fan_out(batch)
+
+    def _fan_out(self, batch):
+        # stages only read the rows, so all of them share the same list
+        self.rows_read += len(batch)
+        for stage in self.stages:
+            stage.put(batch)
+
+    def report(self):
+        wall = self.wall_seconds
+        return {
+            'rows_read': self.rows_read,
+            'wall_seconds': round(wall, 3),
+            'rows_per_sec': round(self.rows_read / wall, 1) if wall else 0.0,
+            'parse_seconds': round(self.parse_seconds, 3),
+            'stages': {s.name: s.stats.as_dict(wall) for s in self.stages},
+        }
@@ -0,0 +1,196 @@
+"""Parallel ingest of large JSONL files across processes, sharded by `field_id`.
+
+The file is cut into newline-aligned byte ranges. A pool of reader processes scans the ranges
+and groups raw lines by `crc32(field_id) % shards`. The parent collects the ranges in file order
+and forwards each group to its shard process. Every shard process runs its own `IngestEngine`
+with its own database connections, so each field's rows reach exactly one engine, in file
+order. That keeps the per-field rolling windows in the Redis aggregates correct.
+
+A shard process that dies (killed, out of memory) cannot report its errors itself. The parent
+only waits on the queues in short timeouts and checks the process in between, stops feeding the
+run once a shard is gone, and reports every shard without a report as an error.
+"""
+import json
+import multiprocessing
+import os
+import queue
+import re
+import time
+import zlib
+from typing import Iterable, List, Tuple
+
+from .cli import build_engine
+
+_FIELD_ID = re.compile(rb'"field_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def shard_for(field_id: str, shards: int) -> int:
+    """Stable across processes, unlike `hash()` which is salted per interpreter."""
+    return zlib.crc32(field_id.encode()) % shards
+
+
+def split_ranges(path, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """Return `(start, end)` byte ranges of about `chunk_bytes`, each ending on a line boundary."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as fh:
+        start = 0
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                fh.seek(end)
+                fh.readline()
+                end = fh.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _route_range(args):
+    """Reader task: return the lines of one byte range grouped into one blob per shard."""
+    path, start, end, shards = args
+    groups = [[] for _ in range(shards)]
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        m = _FIELD_ID.search(line)
+        field_id = json.loads(b'"' + m.group(1) + b'"') if m else json.loads(line)['field_id']
+        groups[shard_for(field_id, shards)].append(line)
+    return [b'\n'.join(g) for g in groups]
+
+
+def _shard_main(inbox, outbox, engine_options):
+    engine = None
+    clients = []
+    error = None
+    try:
+        engine, clients = build_engine(**engine_options)
+        engine.start()
+        while True:
+            blob = inbox.get()
+            if blob is None:
+                break
+            t0 = time.perf_counter()
+            rows = [json.loads(line) for line in blob.splitlines()]
+            engine.parse_seconds += time.perf_counter() - t0
+            engine.feed(rows)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        # keep draining so the parent never blocks on this shard's full queue
+        while inbox.get() is not None:
+            pass
+    finally:
+        report = {'rows_read': 0, 'parse_seconds': 0.0, 'stages': {}}
+        if engine is not None and engine._t_start is not None:
+            engine.finish()
+            report = engine.report()
+        for client in clients:
+            client.close()
+        if error:
+            report['error'] = error
+        report['shard'] = multiprocessing.current_process().name
+        outbox.put(report)
+
+
+# seconds between checks on a shard process while blocked on its queue
+_POLL = 1.0
+
+
+def _put(inbox, proc, item):
+    """Put `item` on a shard's inbox, waiting while it is full; raises once the shard has died."""
+    while True:
+        try:
+            inbox.put(item, timeout=_POLL)
+            return
+        except queue.Full:
+            if not proc.is_alive():
+                raise RuntimeError(f"{proc.name} exited with code {proc.exitcode}")
+
+
+def _collect(outbox, procs) -> Tuple[list, List[str]]:
+    """Reports of every shard, plus an error for each shard that exited without one."""
+    reports = {}
+    while len(reports) < len(procs):
+        try:
+            rep = outbox.get(timeout=_POLL)
+            reports[rep['shard']] = rep
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs if p.name not in reports):
+                # a report put just before its process exited may still be in flight
+                try:
+                    while len(reports) < len(procs):
+                        rep = outbox.get(timeout=_POLL)
+                        reports[rep['shard']] = rep
+                except queue.Empty:
+                    break
+    missing = [f"{p.name} exited with code {p.exitcode} without a report" for p in procs if p.name not in reports]
+    return list(reports.values()), missing
+
+
+def merge_reports(reports, wall_seconds, errors=()):
+    merged = {'rows_read': 0, 'parse_seconds': 0.0, 'stages': {}, 'errors': list(errors)}
+    for rep in reports:
+        if rep.get('error'):
+            merged['errors'].append(rep['error'])
+        merged['rows_read'] += rep['rows_read']
+        merged['parse_seconds'] += rep['parse_seconds']
+        for name, st in rep['stages'].items():
+            acc = merged['stages'].setdefault(name, {'rows': 0, 'batches': 0, 'errors': 0, 'busy_seconds': 0.0,
+                                                     'backpressure_seconds': 0.0, 'max_queue_depth': 0})
+            for key in ('rows', 'batches', 'errors', 'busy_seconds', 'backpressure_seconds'):
+                acc[key] += st[key]
+            acc['max_queue_depth'] = max(acc['max_queue_depth'], st['max_queue_depth'])
+    for st in merged['stages'].values():
+        st['rows_per_sec'] = round(st['rows'] / wall_seconds, 1) if wall_seconds else 0.0
+        st['rows_per_busy_sec'] = round(st['rows'] / st['busy_seconds'], 1) if st['busy_seconds'] else 0.0
+        st['busy_seconds'] = round(st['busy_seconds'], 3)
+        st['backpressure_seconds'] = round(st['backpressure_seconds'], 3)
+    merged['parse_seconds'] = round(merged['parse_seconds'], 3)
+    merged['wall_seconds'] = round(wall_seconds, 3)
+    merged['rows_per_sec'] = round(merged['rows_read'] / wall_seconds, 1) if wall_seconds else 0.0
+    merged['shards'] = len(reports)
+    return merged
+
+
+def run_parallel(paths: Iterable[str], shards: int=None, readers: int=None, chunk_bytes: int=8 << 20,
+                 queue_size: int=4, **engine_options):
+    """Ingest `paths` with `shards` engine processes fed by `readers` range-scanning processes.
+
+    `engine_options` are passed to `build_engine` in every shard (sinks, dry_run, batch_size, ...).
+    Returns the merged stats report.
+    """
+    shards = shards or os.cpu_count() or 1
+    readers = readers or max(1, min(shards, os.cpu_count() or 1))
+    ctx = multiprocessing.get_context('spawn')
+    outbox = ctx.Queue()
+    inboxes = [ctx.Queue(maxsize=queue_size) for _ in range(shards)]
+    procs = [ctx.Process(target=_shard_main, args=(inboxes[i], outbox, engine_options), name=f'shard-{i}')
+             for i in range(shards)]
+    t_start = time.perf_counter()
+    for p in procs:
+        p.start()
+    errors = []
+    try:
+        tasks = [(path, start, end, shards) for path in paths for start, end in split_ranges(path, chunk_bytes)]
+        with ctx.Pool(readers) as pool:
+            # imap keeps range order, so each shard sees its fields' rows in file order
+            for groups in pool.imap(_route_range, tasks):
+                for shard, blob in enumerate(groups):
+                    if blob:
+                        _put(inboxes[shard], procs[shard], blob)
+    except RuntimeError as e:
+        # a dead shard's fields can no longer be written; stop reading and let the others finish
+        errors.append(f"stopped reading: {e}")
+    finally:
+        for inbox, p in zip(inboxes, procs):
+            try:
+                _put(inbox, p, None)
+            except RuntimeError:
+                pass
+        reports, missing = _collect(outbox, procs)
+        for p in procs:
+            p.join()
+    return merge_reports(reports, time.perf_counter() - t_start, errors + missing)
@@ -0,0 +1,132 @@
+"""Per-store writer stages for the fan-out ingest engine.
+
+Each sink takes a batch of parsed sensor rows and writes it through the bulk/batching API of its
+client wrapper. Sinks whose output depends on row order (rolling windows, latest values) set
+`max_workers = 1` so batches reach them in file order.
+"""
+import os
+
+from src.cache import field_keys, invalidate_shared
+from src.rollups import ROLLUP_TABLES, rollup_partials
+from src.rules import RuleEngine, load_rules
+
+from .aggregates import RollingAggregator
+
+LATEST_METRICS = ('ndvi', 'soil_moisture', 'grass_height')
+
+
+class CassandraSink:
+    """Writes each row to the per-field table and to the `(field_id, metric_type)` table read by the API."""
+    name = 'cassandra'
+    max_workers = None
+
+    def __init__(self, client, table='sensor_data_by_field', metric_table='sensor_data_by_field_metric',
+                 ttl=None, concurrency=64):
+        """`ttl` in seconds defaults to `SENSOR_TTL_DAYS` (90), the retention the API writes with."""
+        self.client = client
+        self.table = table
+        self.metric_table = metric_table
+        self.ttl = int(os.getenv('SENSOR_TTL_DAYS', 90)) * 24 * 3600 if ttl is None else ttl
+        self.concurrency = concurrency
+
+    def setup(self):
+        self.client.ensure_sensor_table(self.table)
+        if self.metric_table:
+            self.client.ensure_sensor_table(self.metric_table, by_metric=True)
+
+    def write(self, batch):
+        self.client.insert_sensor_rows(self.table, batch, ttl=self.ttl, concurrency=self.concurrency)
+        if self.metric_table:
+            self.client.insert_sensor_rows(self.metric_table, batch, ttl=self.ttl, concurrency=self.concurrency)
+
+
+class RollupSink:
+    """Merges each batch into the hourly and daily rollup tables; safe with several workers."""
+    name = 'rollups'
+    max_workers = None
+
+    def __init__(self, client, tables=ROLLUP_TABLES, concurrency=64):
+        self.client = client
+        self.tables = tables
+        self.concurrency = concurrency
+
+    def setup(self):
+        for table in self.tables.values():
+            self.client.ensure_rollup_table(table)
+
+    def write(self, batch):
+        for resolution, table in self.tables.items():
+            self.client.merge_rollups(table, rollup_partials(batch, resolution), concurrency=self.concurrency)
+
+
+class MongoLatestSink:
+    name = 'mongo'
+    # batches must land in order or an older batch could overwrite a newer latest value
+    max_workers = 1
+
+    def __init__(self, client, db_name='pasture', metrics=LATEST_METRICS, cache=None):
+        """`cache` is the `RedisClientWrapper` behind the API's field cache; updated fields are invalidated in it."""
+        self.client = client
+        self.db_name = db_name
+        self.metrics = metrics
+        self.cache = cache
+
+    def setup(self):
+        pass
+
+    def write(self, batch):
+        readings = [r for r in batch if r.get('metric_type') in self.metrics]
+        self.client.update_latest_metrics_many(self.db_name, readings)
+        if readings and self.cache is not None and not self.cache.dry_run:
+            # cached field documents carry latest_metrics
+            invalidate_shared(self.cache.client, field_keys({r['field_id'] for r in readings}))
+
+
+class RedisAggregateSink:
+    """Rolling 7-point aggregates and threshold alerts via `RollingAggregator`."""
+    name = 'redis'
+    max_workers = 1
+
+    def __init__(self, client, window=7):
+        self.client = client
+        # alert state goes to the same Redis as the alerts, so transitions survive restarts
+        self.aggregator = RollingAggregator(window=window, state=None if client.dry_run else client)
+        self.alerts = 0
+
+    def setup(self):
+        self.client.initialize()
+
+    def write(self, batch):
+        result = self.aggregator.update(batch)
+        with self.client.batch() as b:
+            for field_id, mapping in result.latest.items():
+                b.hset_latest(field_id, mapping)
+            for field_id, alert_type, payload in result.alerts:
+                b.push_alert(field_id, alert_type, payload)
+        self.aggregator.commit(result)
+        self.alerts += len(result.alerts)
+
+
+class Neo4jEventSink:
+    """Field events for readings matched by the `events` rules of `src/rules.py`."""
+    name = 'neo4j'
+    max_workers = None
+
+    def __init__(self, client, batch_size=500, rules=None, state=None):
+        """`state` stores per-field alert state, e.g. a `RedisClientWrapper`; in-process by default."""
+        self.client = client
+        self.batch_size = batch_size
+        self.engine = RuleEngine(load_rules().for_sink('events') if rules is None else rules, state=state)
+        if self.engine.ordered:
+            # rolling-window or transition rules need batches in file order
+            self.max_workers = 1
+
+    def setup(self):
+        pass
+
+    def write(self, batch):
+        matches, changed = self.engine.evaluate(batch)
+        with self.client.event_batch(batch_size=self.batch_size) as events:
+            for field_id, event_type, props in matches:
+                events.add_event(field_id, event_type, props)
+        self.engine.commit(changed)
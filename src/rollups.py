@@ -0,0 +1,110 @@
+"""Hourly and daily rollups (count, sum, min, max, last) of sensor readings.
+
+Ingest folds each batch into partial aggregates per (field_id, metric_type, period) and merges
+them into the rollup tables (see `CassandraClientWrapper.merge_rollups`). Long-range reads then
+return one row per period instead of every raw reading. Each aggregate carries the ids of the
+readings it covers (`reading_id`, the raw table's `sensor_ts, sensor_id` key) and the rollup row
+stores them, so a redelivered or re-run batch only merges readings the period has not seen. Periods are naive UTC datetimes
+aligned to the resolution, matching how Cassandra returns timestamps.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+RESOLUTIONS = {'hour': 3600, 'day': 86400}
+ROLLUP_TABLES = {'hour': 'sensor_rollup_hour', 'day': 'sensor_rollup_day'}
+
+# `auto` serves raw rows for short ranges, then the finest rollup needing at most MAX_POINTS periods
+RAW_MAX_SPAN = timedelta(days=2)
+MAX_POINTS = 1000
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _utc_naive(ts):
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def period_start(ts, resolution) -> datetime:
+    ts = _utc_naive(ts)
+    size = RESOLUTIONS[resolution]
+    return _EPOCH + timedelta(seconds=int((ts - _EPOCH).total_seconds() // size) * size)
+
+
+def reading_id(ts, sensor_id) -> str:
+    return f"{_utc_naive(ts).isoformat()}|{sensor_id or ''}"
+
+
+def merge_rollup(a: dict, b: dict) -> dict:
+    """Combine two aggregates of the same period over disjoint readings; `last` follows the newer `last_ts`."""
+    newer = b if b['last_ts'] >= a['last_ts'] else a
+    return {
+        'count': a['count'] + b['count'],
+        'sum': a['sum'] + b['sum'],
+        'min': min(a['min'], b['min']),
+        'max': max(a['max'], b['max']),
+        'last': newer['last'],
+        'last_ts': newer['last_ts'],
+        'readings': {**a['readings'], **b['readings']},
+    }
+
+
+def aggregate(readings: dict) -> dict:
+    """Aggregate of `{reading_id: (ts, value)}`."""
+    values = [value for _, value in readings.values()]
+    last_ts, last = max(readings.values(), key=lambda tv: tv[0])
+    return {'count': len(values), 'sum': sum(values), 'min': min(values), 'max': max(values),
+            'last': last, 'last_ts': last_ts, 'readings': readings}
+
+
+def unseen(partial: dict, applied) -> Optional[dict]:
+    """`partial` without the readings in `applied`; None when every reading was already merged."""
+    if applied.isdisjoint(partial['readings']):
+        return partial
+    fresh = {rid: tv for rid, tv in partial['readings'].items() if rid not in applied}
+    return aggregate(fresh) if fresh else None
+
+
+def rollup_partials(rows, resolution) -> dict:
+    """Aggregate sensor rows into `{(field_id, metric_type, period): aggregate}`.
+
+    A reading repeated in `rows` is counted once, the last copy winning as in the raw table.
+    """
+    readings = {}
+    for r in rows:
+        ts = _utc_naive(r['sensor_ts'])
+        key = (r['field_id'], r['metric_type'], period_start(ts, resolution))
+        readings.setdefault(key, {})[reading_id(ts, r.get('sensor_id'))] = (ts, float(r['metric_value']))
+    return {key: aggregate(rs) for key, rs in readings.items()}
+
+
+def choose_resolution(start, end) -> str:
+    """Pick `raw`, `hour` or `day` for a range; open-ended ranges read raw rows."""
+    if start is None or end is None:
+        return 'raw'
+    span = _utc_naive(end) - _utc_naive(start)
+    if span <= RAW_MAX_SPAN:
+        return 'raw'
+    for resolution, size in sorted(RESOLUTIONS.items(), key=lambda item: item[1]):
+        if span.total_seconds() / size <= MAX_POINTS:
+            return resolution
+    return max(RESOLUTIONS, key=RESOLUTIONS.get)
+
+
+def rollup_point(field_id, metric, period, agg) -> dict:
+    """API row for one period: raw-row keys (mean as `metric_value`) plus the aggregate columns."""
+    return {
+        'field_id': field_id,
+        'sensor_ts': period.isoformat(),
+        'metric_type': metric,
+        'metric_value': agg['sum'] / agg['count'] if agg['count'] else None,
+        'count': agg['count'],
+        'sum': agg['sum'],
+        'min': agg['min'],
+        'max': agg['max'],
+        'last': agg['last'],
+        'last_ts': agg['last_ts'].isoformat() if agg['last_ts'] else None,
+    }
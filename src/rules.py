@@ -0,0 +1,461 @@
+"""Declarative threshold rules for Neo4j events and Redis alerts.
+
+Rules are loaded from JSON (`src/rules.json`, or the file named by `THRESHOLD_RULES_PATH`). Each rule
+compares one metric against a threshold:
+
+    {"name": "low_soil_moisture", "metric": "soil_moisture", "op": "<", "threshold": 10.0, "clear": 12.0,
+     "severity": "medium", "escalate": [[8.0, "high"]], "sink": "events", "cooldown": 86400}
+
+Optional keys:
+
+    stat, window     compare a rolling `mean`/`min`/`max`/`std` over the last `window` readings
+                     instead of the reading itself (`stat` defaults to `value`)
+    where            further predicates that must also hold, each `{stat, window, op, threshold}`
+    escalate         `[threshold, severity]` bands checked in order with the rule's comparator
+    trigger          `transition` (the default) or `level` (every matching reading)
+    clear            hysteresis: an active alert clears only once the compared series is no longer
+                     beyond this value (defaults to `threshold`)
+    cooldown         seconds around a reported `entered` within which re-entering is tracked but not
+                     reported (by reading timestamps)
+    payload          extra properties copied into every match
+    threshold_env    environment variable that overrides `threshold` when set
+
+`sink` is `events` (Neo4j field events) or `alerts` (the Redis alert stream). Transition rules keep
+an active/inactive state per field and rule, so a dry spell yields one `entered` match and one
+`cleared` match (`payload['state']`) instead of one per low reading. The state lives in a store with
+`load_alert_states`/`save_alert_states`: the Redis client wrappers keep it in `alerts:state:{field}`
+hashes shared by every process, and `MemoryAlertState` keeps it in-process. Evaluating a batch
+returns its matches and the changed state; callers `commit` the state only once the matches are
+written, so a failed sink write leaves the state untouched and a retried batch reports them again.
+Each field's state carries a `_version`; saving is a compare-and-set on it (one Lua script in
+Redis), so when two processes evaluate the same field at once the later commit fails with
+`AlertStateConflict` and its batch is retried against the state the other one saved.
+
+A `RuleSet` is compiled per metric: rules sharing a compared series and comparator are evaluated
+together as one broadcast NumPy comparison over a batch, so adding a rule adds a column to that
+comparison, not a branch per row. State changes are found with a vectorized forward fill.
+"""
+import asyncio
+import contextlib
+import json
+import operator
+import os
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except Exception:
+    np = None
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+
+COMPARATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+STATS = ('value', 'mean', 'min', 'max', 'std')
+SINKS = ('events', 'alerts')
+TRIGGERS = ('transition', 'level')
+
+# (field_id, rule name, payload), the shape consumed by `add_event` and `push_alert`
+Match = Tuple[str, str, dict]
+
+_NONE, _ENTERED, _CLEARED = 0, 1, 2
+
+# locks shared by all fields of one engine; fields on different stripes never wait for each other
+LOCK_STRIPES = 64
+
+# per-field state entry holding the version the compare-and-set save checks
+VERSION_KEY = '_version'
+
+# (field_id, metric) series whose trailing readings an engine keeps; the least recently seen go
+MAX_CARRY = int(os.getenv('RULES_MAX_CARRY', 100000))
+
+
+class AlertStateConflict(RuntimeError):
+    """Another writer saved a field's alert state after it was loaded for this batch."""
+
+
+class Predicate:
+    def __init__(self, op: str, threshold: float, stat: str='value', window: Optional[int]=None):
+        if op not in COMPARATORS:
+            raise ValueError(f"Unknown comparator {op!r}; expected one of {', '.join(COMPARATORS)}")
+        if stat not in STATS:
+            raise ValueError(f"Unknown stat {stat!r}; expected one of {', '.join(STATS)}")
+        if stat != 'value' and (window is None or int(window) < 1):
+            raise ValueError(f"Stat {stat!r} needs a window of at least 1 reading")
+        self.op = op
+        self.threshold = float(threshold)
+        self.stat = stat
+        self.window = None if stat == 'value' else int(window)
+
+    @property
+    def series(self) -> Tuple[str, Optional[int]]:
+        return (self.stat, self.window)
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> 'Predicate':
+        return cls(spec['op'], spec['threshold'], spec.get('stat', 'value'), spec.get('window'))
+
+
+class Rule:
+    def __init__(self, name: str, metric: str, predicate: Predicate, sink: str='events', severity: Optional[str]=None,
+                 escalate: Iterable=(), where: Iterable[Predicate]=(), trigger: str='transition',
+                 clear: Optional[float]=None, cooldown: float=0, payload: Optional[dict]=None):
+        if sink not in SINKS:
+            raise ValueError(f"Unknown sink {sink!r} for rule {name!r}; expected one of {', '.join(SINKS)}")
+        if trigger not in TRIGGERS:
+            raise ValueError(f"Unknown trigger {trigger!r} for rule {name!r}; expected one of {', '.join(TRIGGERS)}")
+        self.name = name
+        self.metric = metric
+        self.predicate = predicate
+        self.sink = sink
+        self.severity = severity
+        self.escalate = [(float(t), level) for t, level in escalate]
+        self.where = list(where)
+        self.trigger = trigger
+        self.clear = predicate.threshold if clear is None else float(clear)
+        if COMPARATORS[predicate.op](self.clear, predicate.threshold) and self.clear != predicate.threshold:
+            raise ValueError(f"Clear level {self.clear} of rule {name!r} is inside its alert range")
+        self.cooldown = float(cooldown)
+        self.payload = dict(payload or {})
+
+    @property
+    def predicates(self) -> List[Predicate]:
+        return [self.predicate] + self.where
+
+    @property
+    def state_key(self) -> str:
+        """Hash field holding this rule's state in a field's alert-state hash."""
+        return f"{self.sink}:{self.name}"
+
+    def severity_for(self, value: float) -> Optional[str]:
+        compare = COMPARATORS[self.predicate.op]
+        for threshold, level in self.escalate:
+            if compare(value, threshold):
+                return level
+        return self.severity
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> 'Rule':
+        spec = dict(spec)
+        env = spec.pop('threshold_env', None)
+        if env and os.getenv(env):
+            threshold = float(os.getenv(env))
+            if spec.get('clear') is not None:
+                # keep the hysteresis band the same width around the new threshold
+                spec['clear'] = float(spec['clear']) + threshold - float(spec['threshold'])
+            spec['threshold'] = threshold
+        return cls(spec['name'], spec['metric'], Predicate.from_dict(spec),
+                   sink=spec.get('sink', 'events'),
+                   severity=spec.get('severity'),
+                   escalate=spec.get('escalate', ()),
+                   where=[Predicate.from_dict(p) for p in spec.get('where', ())],
+                   trigger=spec.get('trigger', 'transition'),
+                   clear=spec.get('clear'),
+                   cooldown=spec.get('cooldown', 0),
+                   payload=spec.get('payload'))
+
+
+class _MetricRules:
+    """The rules of one metric, compiled into grouped comparisons over a `(rows, rules)` mask."""
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self.windows = sorted({p.window for r in rules for p in r.predicates if p.window})
+        # (predicate slot, stat, window, op) -> (rule columns, thresholds)
+        groups = defaultdict(lambda: ([], []))
+        clears = defaultdict(lambda: ([], []))
+        for col, rule in enumerate(rules):
+            for slot, p in enumerate(rule.predicates):
+                cols, thresholds = groups[(slot, p.stat, p.window, p.op)]
+                cols.append(col)
+                thresholds.append(p.threshold)
+            cols, thresholds = clears[(rule.predicate.stat, rule.predicate.window, rule.predicate.op)]
+            cols.append(col)
+            thresholds.append(rule.clear)
+        self.groups = [((stat, window), COMPARATORS[op], cols, thresholds)
+                       for (_, stat, window, op), (cols, thresholds) in groups.items()]
+        self.clears = [((stat, window), COMPARATORS[op], cols, thresholds)
+                       for (stat, window, op), (cols, thresholds) in clears.items()]
+        self.transition = [r.trigger == 'transition' for r in rules]
+        if np is not None:
+            self.transition = np.asarray(self.transition, dtype=bool)
+            self.groups = [(series, compare, np.asarray(cols), np.asarray(thresholds, dtype=np.float64))
+                           for series, compare, cols, thresholds in self.groups]
+            self.clears = [(series, compare, np.asarray(cols), np.asarray(thresholds, dtype=np.float64))
+                           for series, compare, cols, thresholds in self.clears]
+
+    def mask(self, series: Dict[Tuple[str, Optional[int]], 'np.ndarray'], n: int) -> 'np.ndarray':
+        """Rows where every predicate of a rule holds."""
+        out = np.ones((n, len(self.rules)), dtype=bool)
+        for key, compare, cols, thresholds in self.groups:
+            out[:, cols] &= compare(series[key][:, None], thresholds[None, :])
+        return out
+
+    def cleared(self, series, n: int) -> 'np.ndarray':
+        """Rows where the compared series is back past each rule's clear level."""
+        out = np.zeros((n, len(self.rules)), dtype=bool)
+        for key, compare, cols, thresholds in self.clears:
+            s = series[key][:, None]
+            out[:, cols] = ~compare(s, thresholds[None, :]) & ~np.isnan(s)
+        return out
+
+    def transitions(self, entered: 'np.ndarray', cleared: 'np.ndarray', active: 'np.ndarray') -> 'np.ndarray':
+        """`_ENTERED`/`_CLEARED` where a rule's state changes, given its state before the batch.
+
+        The state after each row is the most recent of an enter or a clear, carried forward.
+        """
+        n, k = entered.shape
+        events = np.where(entered, 1, np.where(cleared, 0, -1)).astype(np.int8)
+        events = np.vstack([active.astype(np.int8)[None, :], events])
+        rows = np.where(events >= 0, np.arange(n + 1)[:, None], 0)
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        state = events[rows, np.arange(k)[None, :]]
+        change = np.diff(state, axis=0)
+        return np.where(change > 0, _ENTERED, np.where(change < 0, _CLEARED, _NONE))
+
+
+class RuleSet:
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules = list(rules)
+        by_metric = defaultdict(list)
+        for rule in self.rules:
+            by_metric[rule.metric].append(rule)
+        self._metrics = {metric: _MetricRules(rules) for metric, rules in by_metric.items()}
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def for_sink(self, sink: str) -> 'RuleSet':
+        return RuleSet(r for r in self.rules if r.sink == sink)
+
+    def compiled(self, metric: str) -> Optional[_MetricRules]:
+        return self._metrics.get(metric)
+
+    @property
+    def ordered(self) -> bool:
+        """True when matches depend on earlier batches (rolling windows or transitions)."""
+        return any(r.trigger == 'transition' or any(p.window for p in r.predicates) for r in self.rules)
+
+    @classmethod
+    def from_dicts(cls, specs: Iterable[dict]) -> 'RuleSet':
+        return cls(Rule.from_dict(spec) for spec in specs)
+
+
+def load_rules(path: Optional[str]=None) -> RuleSet:
+    """Load the rule set from `path`, `THRESHOLD_RULES_PATH` or the bundled `rules.json`."""
+    path = path or os.getenv('THRESHOLD_RULES_PATH') or DEFAULT_RULES_PATH
+    with open(path) as fh:
+        return RuleSet.from_dicts(json.load(fh))
+
+
+def rolling_windows(joined: 'np.ndarray', window: int, n: int) -> 'np.ndarray':
+    """Windows ending at each of the last `n` values; the front is NaN-padded like a filling deque."""
+    padded = np.concatenate([np.full(window - 1, np.nan), joined])
+    return sliding_window_view(padded, window)[-n:]
+
+
+def _epoch(ts) -> Optional[float]:
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(ts, datetime):
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class MemoryAlertState:
+    """In-process alert state, for single-process jobs and dry runs."""
+
+    def __init__(self):
+        self._states = {}
+
+    def load_alert_states(self, field_ids) -> Dict[str, dict]:
+        return {fid: dict(self._states.get(fid, {})) for fid in field_ids}
+
+    def save_alert_states(self, changed: Dict[str, dict]):
+        for fid, states in changed.items():
+            if states.get(VERSION_KEY, 0) != self._states.get(fid, {}).get(VERSION_KEY, 0):
+                raise AlertStateConflict(f"alert state of {fid} changed since it was loaded")
+        for fid, states in changed.items():
+            stored = self._states.setdefault(fid, {})
+            stored.update(states)
+            stored[VERSION_KEY] = states.get(VERSION_KEY, 0) + 1
+
+
+_REDUCERS = {'mean': 'nanmean', 'min': 'nanmin', 'max': 'nanmax', 'std': 'nanstd'}
+
+# (field_id, metric, values, timestamps, precomputed rolling series)
+Group = Tuple[str, str, 'np.ndarray', list, dict]
+
+
+class RuleEngine:
+    """Evaluates a `RuleSet` over batches, carrying rolling windows between them.
+
+    Alert state is read from `state` once per batch and written back by `commit`; the async API
+    passes its async Redis wrapper to `aevaluate` and `acommit` instead.
+    """
+
+    def __init__(self, rules: Optional[RuleSet]=None, state=None, max_carry: int=MAX_CARRY):
+        if np is None:
+            raise RuntimeError('numpy not available')
+        self.rules = load_rules() if rules is None else rules
+        self.state = MemoryAlertState() if state is None else state
+        # (field_id, metric) -> trailing readings needed by the widest window, least recently used first;
+        # an evicted series starts its windows afresh
+        self._carry = OrderedDict()
+        self.max_carry = max_carry
+        # fields hash onto a fixed set of locks, see `alocked`
+        self._locks = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+
+    @property
+    def ordered(self) -> bool:
+        return self.rules.ordered
+
+    def group(self, rows: Iterable[dict]) -> List[Group]:
+        """Group sensor rows into per-(field_id, metric_type) arrays, keeping row order."""
+        groups = defaultdict(lambda: ([], []))
+        for r in rows:
+            if self.rules.compiled(r['metric_type']) is None:
+                continue
+            values, stamps = groups[(r['field_id'], r['metric_type'])]
+            values.append(r['metric_value'])
+            stamps.append(r.get('sensor_ts'))
+        return [(field_id, metric, np.asarray(values, dtype=np.float64), stamps, {})
+                for (field_id, metric), (values, stamps) in groups.items()]
+
+    def evaluate(self, rows: Iterable[dict]) -> Tuple[List[Match], Dict[str, dict]]:
+        """Matches for a batch of sensor rows, in row order per (field_id, metric_type), and the changed state."""
+        return self.evaluate_groups(self.group(rows))
+
+    def evaluate_groups(self, groups: List[Group]) -> Tuple[List[Match], Dict[str, dict]]:
+        states = self.state.load_alert_states(self._stateful_fields(groups))
+        return self._evaluate(groups, states)
+
+    def commit(self, changed: Dict[str, dict]):
+        """Save the state returned with a batch's matches, once they are written."""
+        if changed:
+            self.state.save_alert_states(changed)
+
+    async def aevaluate(self, rows: Iterable[dict], state) -> Tuple[List[Match], Dict[str, dict]]:
+        """`evaluate` against an async state store such as `AsyncRedisClientWrapper`."""
+        groups = self.group(rows)
+        states = await state.load_alert_states(self._stateful_fields(groups))
+        return self._evaluate(groups, states)
+
+    async def acommit(self, changed: Dict[str, dict], state):
+        if changed:
+            await state.save_alert_states(changed)
+
+    @contextlib.asynccontextmanager
+    async def alocked(self, rows: Iterable[dict]):
+        """Hold the locks of the fields in `rows` around an `aevaluate`, sink write and `acommit`.
+
+        Concurrent ingest workers then take turns on a shared field instead of both reading the old
+        state and reporting the same transition. This serializes the workers of one process; across
+        processes the compare-and-set in `acommit` rejects the later of two overlapping saves.
+        """
+        stripes = sorted({hash(r['field_id']) % len(self._locks) for r in rows})
+        async with contextlib.AsyncExitStack() as stack:
+            # always in stripe order, so two batches cannot wait on each other
+            for i in stripes:
+                await stack.enter_async_context(self._locks[i])
+            yield
+
+    def _stateful_fields(self, groups: List[Group]) -> List[str]:
+        stateful = {metric for metric in {g[1] for g in groups}
+                    if self.rules.compiled(metric) is not None and self.rules.compiled(metric).transition.any()}
+        return sorted({fid for fid, metric, *_ in groups if metric in stateful})
+
+    def _evaluate(self, groups: List[Group], states: Dict[str, dict]):
+        matches = []
+        changed = defaultdict(dict)
+        for field_id, metric, x, stamps, series in groups:
+            compiled = self.rules.compiled(metric)
+            if compiled is None or not len(x):
+                continue
+            series = dict(series)
+            series[('value', None)] = x
+            self._fill_windows(field_id, metric, compiled, x, series)
+
+            n = len(x)
+            entered = compiled.mask(series, n)
+            kinds = np.where(entered, _ENTERED, _NONE)
+            if compiled.transition.any():
+                field_states = states.get(field_id) or {}
+                before = [field_states.get(r.state_key) or {} for r in compiled.rules]
+                active = np.asarray([bool(s.get('active')) for s in before], dtype=bool)
+                moves = compiled.transitions(entered, compiled.cleared(series, n), active)
+                kinds[:, compiled.transition] = moves[:, compiled.transition]
+                for col in np.flatnonzero(compiled.transition & moves.any(axis=0)):
+                    changed[field_id][compiled.rules[col].state_key] = dict(before[col])
+
+            for i, col in zip(*np.nonzero(kinds)):
+                rule = compiled.rules[col]
+                value = float(series[rule.predicate.series][i])
+                payload = {'value': value}
+                if stamps[i] is not None:
+                    payload['ts'] = stamps[i]
+                if rule.trigger == 'transition':
+                    state = changed[field_id][rule.state_key]
+                    if not self._transition(rule, state, kinds[i, col], stamps[i]):
+                        continue
+                    payload['state'] = 'entered' if kinds[i, col] == _ENTERED else 'cleared'
+                if kinds[i, col] == _ENTERED:
+                    severity = rule.severity_for(value)
+                    if severity is not None:
+                        payload['severity'] = severity
+                payload.update(rule.payload)
+                matches.append((field_id, rule.name, payload))
+        out = {}
+        for fid, s in changed.items():
+            if s:
+                # the save only applies while the field is still at the version this batch read
+                s[VERSION_KEY] = (states.get(fid) or {}).get(VERSION_KEY, 0)
+                out[fid] = s
+        return matches, out
+
+    @staticmethod
+    def _transition(rule: Rule, state: dict, kind: int, ts) -> bool:
+        """Apply one state change; False when it falls in a cooldown and is not reported."""
+        state['active'] = bool(kind == _ENTERED)
+        state['since'] = ts
+        if kind == _CLEARED:
+            # a muted episode ends as silently as it began
+            return not state.pop('muted', False)
+        now = _epoch(ts)
+        last = _epoch(state.get('notified'))
+        if rule.cooldown and now is not None and last is not None and abs(now - last) < rule.cooldown:
+            state['muted'] = True
+            return False
+        state.pop('muted', None)
+        state['notified'] = ts
+        return True
+
+    def _fill_windows(self, field_id, metric, compiled, x, series):
+        if not compiled.windows:
+            return
+        key = (field_id, metric)
+        carry = self._carry.get(key)
+        joined = x if carry is None else np.concatenate([carry, x])
+        keep = compiled.windows[-1] - 1
+        self._carry[key] = joined[-keep:] if keep else joined[:0]
+        self._carry.move_to_end(key)
+        while len(self._carry) > self.max_carry:
+            self._carry.popitem(last=False)
+        for window in compiled.windows:
+            needed = [stat for stat in _REDUCERS if (stat, window) not in series
+                      and any(p.series == (stat, window) for r in compiled.rules for p in r.predicates)]
+            if not needed:
+                continue
+            windows = rolling_windows(joined, window, len(x))
+            for stat in needed:
+                series[(stat, window)] = getattr(np, _REDUCERS[stat])(windows, axis=1)
@@ -0,0 +1,36 @@
+from collections import deque
+
+import pytest
+
+from src.generator import generate_sensor_series
+from src.pipeline.aggregates import RollingAggregator
+
+
+def test_rolling_stats_match_deque_across_batches():
+    rows = generate_sensor_series(field_id='field_1', periods=30) + generate_sensor_series(field_id='field_2', periods=30)
+    agg = RollingAggregator(window=7)
+    latest = {}
+    for i in range(0, len(rows), 13):
+        for fid, mapping in agg.update(rows[i:i+13]).latest.items():
+            latest.setdefault(fid, {}).update(mapping)
+
+    for fid in ('field_1', 'field_2'):
+        window = deque([r['metric_value'] for r in rows if r['field_id'] == fid and r['metric_type'] == 'soil_moisture'], maxlen=7)
+        got = latest[fid]
+        assert got['latest_soil_moisture'] == pytest.approx(sum(window) / len(window))
+        assert got['soil_moisture_7day_avg'] == got['latest_soil_moisture']
+        metrics = ('soil_moisture', 'ndvi', 'air_temp', 'grass_height')
+        assert set(got) == {f'latest_{m}' for m in metrics} | {f'{m}_7day_avg' for m in metrics}
+
+
+def test_alerts_fire_on_crossing_only():
+    def row(v, i):
+        return {'field_id': 'f', 'metric_type': 'ndvi', 'metric_value': v, 'sensor_ts': f't{i}'}
+
+    agg = RollingAggregator()
+    first = agg.update([row(v, i) for i, v in enumerate([0.5, 0.3, 0.3])])
+    agg.commit(first)
+    # still below threshold in the next batch: no new alert until it clears and drops again
+    second = agg.update([row(0.35, 3), row(0.6, 4), row(0.2, 5)])
+    assert [(a[2]['ts'], a[2]['state']) for a in first.alerts] == [('t1', 'entered')]
+    assert [(a[2]['ts'], a[2]['state']) for a in second.alerts] == [('t4', 'cleared'), ('t5', 'entered')]
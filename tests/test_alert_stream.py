@@ -0,0 +1,118 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from src.alert_stream import AlertBroadcaster
+from src.api import _sse_event, app
+from src.clients.redis_client import AsyncRedisClientWrapper, _decode_alerts
+
+
+class FakeAlertRedis:
+    dry_run = False
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.acked = []
+        self.groups = []
+
+    async def create_alert_group(self, group, start='$'):
+        self.groups.append((group, start))
+
+    async def destroy_alert_group(self, group):
+        self.groups.remove((group, '$'))
+
+    async def read_alert_group(self, group, consumer, count=100, block_ms=1000):
+        if self.batches:
+            return self.batches.pop(0)
+        await asyncio.sleep(block_ms / 1000)
+        return []
+
+    async def ack_alerts(self, group, ids):
+        self.acked += ids
+
+    async def trim_alerts(self, max_age=None, maxlen=None):
+        return 0
+
+    async def prune_alert_groups(self, prefix, idle_ms, keep=None):
+        self.pruned = (prefix, idle_ms, keep)
+        return []
+
+
+def test_broadcaster_fans_out_and_acks_every_entry():
+    async def scenario():
+        redis = FakeAlertRedis([[('1-0', {'type': 'a'}), ('2-0', {'type': 'b'})], [('3-0', {'type': 'c'})]])
+        hub = AlertBroadcaster(group='g', block_ms=10)
+        first, second = hub.subscribe(), hub.subscribe()
+        await hub.start(redis)
+        got = [await asyncio.wait_for(first.get(), 1.0) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        await hub.stop()
+        return redis, hub, got, [second.get_nowait() for _ in range(second.qsize())]
+
+    redis, hub, first, second = asyncio.run(scenario())
+    assert [entry_id for entry_id, _ in first] == ['1-0', '2-0', '3-0']
+    assert second == first
+    assert redis.acked == ['1-0', '2-0', '3-0']
+    assert redis.groups == []
+    assert redis.pruned == ('sse-', hub.stale_ms, 'g')
+
+
+def test_stale_groups_of_dead_processes_are_removed():
+    class FakeStreamGroups:
+        def __init__(self):
+            self.calls = []
+            self.consumers = {
+                'sse-dead': [{'name': b'api', 'pending': 2, 'idle': 900000}],
+                'sse-live': [{'name': b'api', 'pending': 0, 'idle': 500}],
+                'sse-starting': [],
+                'reports': [{'name': b'w', 'pending': 0, 'idle': 900000}],
+                'sse-me': [{'name': b'api', 'pending': 0, 'idle': 900000}],
+            }
+
+        async def xinfo_groups(self, stream):
+            return [{'name': name.encode()} for name in self.consumers]
+
+        async def xinfo_consumers(self, stream, group):
+            return self.consumers[group]
+
+        async def xpending_range(self, stream, group, min, max, count, consumername=None):
+            return [{'message_id': b'1-0'}, {'message_id': b'2-0'}][:count]
+
+        async def xack(self, stream, group, *ids):
+            self.calls.append(('XACK', group, ids))
+
+        async def xgroup_delconsumer(self, stream, group, consumer):
+            self.calls.append(('DELCONSUMER', group, consumer))
+
+        async def xgroup_destroy(self, stream, group):
+            self.calls.append(('DESTROY', group))
+
+    wrapper = AsyncRedisClientWrapper(dry_run=True)
+    wrapper.dry_run = False
+    wrapper.client = FakeStreamGroups()
+    removed = asyncio.run(wrapper.prune_alert_groups('sse-', 600000, keep='sse-me'))
+    assert removed == ['sse-dead']
+    # pending entries are settled before the consumer goes, so none are dropped unacknowledged
+    assert wrapper.client.calls == [('XACK', 'sse-dead', (b'1-0', b'2-0')), ('DELCONSUMER', 'sse-dead', 'api'),
+                                    ('DESTROY', 'sse-dead')]
+
+
+def test_slow_subscriber_loses_its_oldest_alerts():
+    async def scenario():
+        hub = AlertBroadcaster(group='g', queue_size=2)
+        slow = hub.subscribe()
+        hub.publish([('1-0', {}), ('2-0', {}), ('3-0', {})])
+        return [slow.get_nowait()[0] for _ in range(slow.qsize())]
+
+    assert asyncio.run(scenario()) == ['2-0', '3-0']
+
+
+def test_alert_entries_and_sse_frames():
+    entries = _decode_alerts([(b'5-1', {b'field': b'field_1', b'state': b'entered'})])
+    assert entries == [('5-1', {'field': 'field_1', 'state': 'entered'})]
+    assert _sse_event(*entries[0]) == b'id: 5-1\nevent: alert\ndata: {"field":"field_1","state":"entered"}\n\n'
+
+
+def test_alert_stream_unavailable_without_redis():
+    with TestClient(app) as client:
+        assert client.get('/api/alerts/stream').status_code == 503
@@ -36,4 +36,168 @@ def test_get_single_field_and_timeseries():
     # entries should have metric_type and metric_value
     if len(ts) > 0:
         assert 'metric_type' in ts[0]
-        assert 'metric_value' in ts[0]
\ No newline at end of file
+        assert 'metric_value' in ts[0]
+
+def test_cached_field_is_served_with_etag_and_304():
+    import asyncio
+    from src.api import field_cache
+
+    asyncio.run(field_cache.set('doc:field_cached', b'{"_id":"field_cached","name":"Cached"}'))
+    try:
+        resp = client.get('/api/fields/field_cached')
+        assert resp.status_code == 200
+        assert resp.json()['name'] == 'Cached'
+        etag = resp.headers['etag']
+
+        resp2 = client.get('/api/fields/field_cached', headers={'If-None-Match': etag})
+        assert resp2.status_code == 304
+        assert resp2.headers['etag'] == etag
+    finally:
+        asyncio.run(field_cache.invalidate('doc:field_cached'))
+
+
+def test_timeseries_fallback_applies_metric_and_time_range():
+    resp = client.get('/api/fields/field_1/timeseries?periods=10&metric=ndvi')
+    assert resp.status_code == 200
+    rows = resp.json()
+    assert len(rows) == 10 and {r['metric_type'] for r in rows} == {'ndvi'}
+    assert 'x-next-cursor' not in resp.headers
+
+    cutoff = rows[4]['sensor_ts']
+    resp = client.get('/api/fields/field_1/timeseries', params={'periods': 10, 'metric': 'ndvi', 'start': cutoff})
+    assert resp.json() and all(r['sensor_ts'] >= cutoff for r in resp.json())
+
+
+def test_timeseries_rollup_resolution_returns_one_row_per_period():
+    resp = client.get('/api/fields/field_1/timeseries', params={'periods': 48, 'metric': 'ndvi', 'resolution': 'day'})
+    assert resp.status_code == 200
+    rows = resp.json()
+    assert 2 <= len(rows) <= 3
+    assert sum(r['count'] for r in rows) == 48
+    assert all(r['min'] <= r['metric_value'] <= r['max'] for r in rows)
+    assert rows == sorted(rows, key=lambda r: r['sensor_ts'], reverse=True)
+
+
+def test_fields_keyset_pages_and_projection():
+    resp = client.get('/api/fields', params={'limit': 2, 'projection': '-boundary'})
+    assert resp.status_code == 200
+    page = resp.json()
+    assert len(page) == 2 and all('boundary' not in f and 'name' in f for f in page)
+    after = resp.headers['x-next-after']
+    assert after == page[-1]['_id']
+
+    rest = client.get('/api/fields', params={'after': after, 'projection': 'name'}).json()
+    assert all(f['_id'] > after and set(f) == {'_id', 'name'} for f in rest)
+    assert client.get('/api/fields', params={'projection': 'name,-boundary'}).status_code == 400
+
+
+def test_ndjson_streams_one_document_per_line():
+    import json
+
+    resp = client.get('/api/fields', headers={'Accept': 'application/x-ndjson'})
+    assert resp.headers['content-type'].startswith('application/x-ndjson')
+    docs = [json.loads(line) for line in resp.text.splitlines()]
+    assert len(docs) >= 1 and all('name' in d for d in docs)
+
+    resp = client.get('/api/fields/field_1/timeseries?periods=6', headers={'Accept': 'application/x-ndjson'})
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert len(rows) == 24 and 'metric_value' in rows[0]
+
+
+def test_ndjson_pages_carry_the_next_cursor(monkeypatch):
+    import json
+
+    import src.api as api
+
+    resp = client.get('/api/fields', params={'limit': 2}, headers={'Accept': 'application/x-ndjson'})
+    page = [json.loads(line) for line in resp.text.splitlines()]
+    assert len(page) == 2 and resp.headers['x-next-after'] == page[-1]['_id']
+
+    class FakeCursor:
+        def __init__(self, docs):
+            self.docs = docs
+
+        def sort(self, key, direction):
+            return self
+
+        def limit(self, n):
+            return FakeCursor(self.docs[:n])
+
+        async def __aiter__(self):
+            for d in self.docs:
+                yield d
+
+    class FakeMongo:
+        dry_run = False
+
+        def get_db(self, name):
+            return self
+
+        @property
+        def fields(self):
+            return self
+
+        def find(self, query, projection):
+            after = query.get('_id', {}).get('$gt', '')
+            return FakeCursor([{'_id': f'f{i}'} for i in range(5) if f'f{i}' > after])
+
+    class FakeClients:
+        async def mongo(self):
+            return FakeMongo()
+
+    monkeypatch.setattr(api, 'clients', FakeClients())
+    pages, after = [], None
+    while True:
+        params = {'limit': 2} if after is None else {'limit': 2, 'after': after}
+        resp = client.get('/api/fields', params=params, headers={'Accept': 'application/x-ndjson'})
+        pages.append([json.loads(line)['_id'] for line in resp.text.splitlines()])
+        after = resp.headers.get('x-next-after')
+        if after is None:
+            break
+    assert pages == [['f0', 'f1'], ['f2', 'f3'], ['f4']]
+
+
+def test_timeseries_columnar_response():
+    from src.columnar import MEDIA_TYPE, decode
+
+    resp = client.get('/api/fields/field_1/timeseries?periods=12', headers={'Accept': MEDIA_TYPE})
+    assert resp.headers['content-type'] == MEDIA_TYPE
+    series = decode(resp.content)
+    assert set(series) == {'soil_moisture', 'ndvi', 'air_temp', 'grass_height'}
+    assert all(len(ts) == len(vals) == 12 for ts, vals in series.values())
+
+
+def test_geo_endpoints_use_sample_index_without_mongo():
+    resp = client.get('/api/fields/near?lng=0.025&lat=0.015&radius=1000&projection=name')
+    assert resp.status_code == 200
+    near = resp.json()
+    assert near[0]['_id'] == 'field_3' and near[0]['distance_m'] == 0.0
+    assert set(near[0]) == {'_id', 'name', 'distance_m'}
+    assert [d['distance_m'] for d in near] == sorted(d['distance_m'] for d in near)
+
+    resp = client.get('/api/fields/within?bbox=-0.02,-0.02,0.025,0.02')
+    assert [d['_id'] for d in resp.json()] == ['field_1', 'field_2']
+    resp = client.get('/api/fields/within?polygon=-0.02,-0.02;0.025,-0.02;0.025,0.02;-0.02,0.02')
+    assert [d['_id'] for d in resp.json()] == ['field_1', 'field_2']
+    assert client.get('/api/fields/within').status_code == 400
+    assert client.get('/api/fields/within?bbox=1,2,3').status_code == 400
+
+
+def test_metrics_endpoint_exposes_route_and_client_metrics():
+    with TestClient(app) as c:
+        assert c.get('/api/fields/field_2').status_code == 200
+        row = {"field_id": "field_m", "sensor_ts": "2025-12-10T12:00:00Z", "sensor_id": "sensor_sm",
+               "metric_type": "soil_moisture", "metric_value": 15.0}
+        assert c.post('/api/fields/field_m/ingest-sensors', json=[row]).status_code == 200
+        field = {'_id': 'field_m', 'farm_id': 'farm_m', 'name': 'M',
+                 'boundary': {'type': 'Polygon', 'coordinates': [[[0, 0], [0, 1], [1, 1], [0, 0]]]}}
+        assert c.post('/api/fields', json=field).status_code == 201
+        resp = c.get('/metrics')
+    assert resp.headers['content-type'].startswith('text/plain; version=0.0.4')
+    text = resp.text
+    # labelled by route template, not by the concrete path
+    assert 'pasture_http_request_seconds_count{method="GET",route="/api/fields/{field_id}",status="200"}' in text
+    assert 'pasture_http_request_seconds_bucket{method="GET",route="/api/fields/{field_id}",status="200",le="+Inf"}' in text
+    # without databases the clients are dry-run, which is counted but not timed
+    assert 'pasture_client_ops_total{client="mongo",op="insert_field",outcome="dry_run"}' in text
+    assert 'pasture_ingest_backlog_rows ' in text
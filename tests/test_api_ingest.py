@@ -1,10 +1,13 @@
 from fastapi.testclient import TestClient
 from src.api import app
 
-client = TestClient(app)
+def test_ingest_field_and_sensors():
+    # the ingest queue workers start with the app lifespan
+    with TestClient(app) as client:
+        _ingest_field_and_sensors(client)
 
 
-def test_ingest_field_and_sensors():
+def _ingest_field_and_sensors(client):
     # Ingest field
     field = {
         "_id": "field_test",
@@ -32,3 +35,92 @@ def test_ingest_field_and_sensors():
     data = resp2.json()
     assert data.get('status') == 'accepted'
     assert data.get('rows') == 1
+
+
+def test_ingest_sensors_returns_429_when_queue_is_full(monkeypatch):
+    monkeypatch.setenv('INGEST_QUEUE_MAX_ROWS', '3')
+    monkeypatch.setenv('INGEST_WORKERS', '0')
+    row = {"field_id": "field_test", "sensor_ts": "2025-12-10T12:00:00Z", "sensor_id": "sensor_sm",
+           "metric_type": "soil_moisture", "metric_value": 15.0}
+    with TestClient(app) as client:
+        assert client.post('/api/fields/field_test/ingest-sensors', json=[row, row]).status_code == 200
+        resp = client.post('/api/fields/field_test/ingest-sensors', json=[row, row])
+        assert resp.status_code == 429
+        assert int(resp.headers['retry-after']) >= 1
+
+
+def test_sensor_batch_fails_after_every_sink_was_tried(monkeypatch):
+    import asyncio
+
+    import pytest
+
+    import src.api as api
+    from src.clients.neo4j_client import AsyncNeo4jClientWrapper
+    from src.clients.redis_client import AsyncRedisClientWrapper
+
+    class FailingCassandra:
+        async def insert_sensor_rows(self, table, rows, **options):
+            raise ConnectionError('cassandra down')
+
+    redis_client = AsyncRedisClientWrapper(dry_run=True)
+    flushed = []
+    monkeypatch.setattr(redis_client, 'batch', lambda: _RecordingBatch(flushed))
+
+    class FakeClients:
+        async def cassandra(self):
+            return FailingCassandra()
+
+        async def redis(self):
+            return redis_client
+
+        async def neo4j(self):
+            return AsyncNeo4jClientWrapper(dry_run=True)
+
+    monkeypatch.setattr(api, 'clients', FakeClients())
+    row = {"field_id": "field_test", "sensor_ts": "2025-12-10T12:00:00Z", "sensor_id": "sensor_sm",
+           "metric_type": "soil_moisture", "metric_value": 15.0}
+    # the worker must see the failure so the queue entries are not acknowledged
+    with pytest.raises(RuntimeError, match='1 of 3 sinks failed'):
+        asyncio.run(api._write_sensor_batch([row]))
+    assert flushed == ['field_test']
+
+
+class _RecordingBatch:
+    def __init__(self, flushed):
+        self.flushed = flushed
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hset_latest(self, field_id, mapping):
+        self.flushed.append(field_id)
+
+
+def test_ingest_field_stores_id_and_invalidates_cached_doc(monkeypatch):
+    import asyncio
+
+    import src.api as api
+
+    inserted = []
+
+    class FakeMongo:
+        async def insert_field(self, db_name, doc):
+            inserted.append(doc)
+
+    class FakeClients:
+        async def mongo(self):
+            return FakeMongo()
+
+    monkeypatch.setattr(api, 'clients', FakeClients())
+    asyncio.run(api.field_cache.set('doc:field_cached_post', b'{"_id":"field_cached_post","name":"Old"}'))
+    asyncio.run(api.field_cache.set('list', b'[]'))
+    field = {"_id": "field_cached_post", "farm_id": "farm_test", "name": "New",
+             "boundary": {"type": "Polygon", "coordinates": [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]}}
+    resp = TestClient(app).post('/api/fields', json=field)
+    assert resp.status_code == 201
+    assert inserted[0]['_id'] == 'field_cached_post' and 'id' not in inserted[0]
+    assert asyncio.run(api.field_cache.get('doc:field_cached_post')) is None
+    assert asyncio.run(api.field_cache.get('list')) is None
@@ -0,0 +1,44 @@
+from benchmarks.harness import compare, latency_summary, percentile
+
+
+def test_percentiles_use_nearest_rank():
+    samples = [i / 1000 for i in range(1, 101)]
+    assert percentile(samples, 50) == 0.05
+    assert percentile(samples, 99) == 0.099
+    summary = latency_summary(list(reversed(samples)))
+    assert summary['p95_ms'] == 95.0 and summary['max_ms'] == 100.0
+
+
+def test_compare_flags_regressions_by_metric_direction():
+    baseline = {'results': {'a': {'rows_per_sec': 1000.0, 'p99_ms': 10.0, 'rows': 5}}}
+    current = {'results': {'a': {'rows_per_sec': 800.0, 'p99_ms': 10.5, 'rows': 9}, 'new': {'rows_per_sec': 1.0}}}
+    rows = {r['metric']: r for r in compare(current, baseline, tolerance=0.1)}
+    # counts are not compared, and results missing from the baseline are skipped
+    assert set(rows) == {'rows_per_sec', 'p99_ms'}
+    assert rows['rows_per_sec']['regressed'] and rows['rows_per_sec']['change'] == -0.2
+    assert not rows['p99_ms']['regressed']
+    current['results']['a'].update(rows_per_sec=950.0, p99_ms=12.0)
+    assert {r['metric'] for r in compare(current, baseline, tolerance=0.1) if r['regressed']} == {'p99_ms'}
+
+
+def test_load_driver_reports_rates_against_the_app():
+    import asyncio
+
+    import httpx
+
+    from benchmarks.loadgen import drive, histogram, saturated
+    from src.api import app
+
+    async def scenario():
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://load') as client:
+                return await drive(client, rate=160, gateways=4, duration=0.5, readings=2)
+
+    summary = asyncio.run(scenario())
+    # 4 gateways posting 8 rows each every 0.2 s
+    assert summary['requests'] == summary['ok'] >= 8
+    assert summary['errors'] == 0 and summary['throttled'] == 0
+    assert sum(summary['histogram_ms'].values()) == summary['ok']
+    assert saturated(summary, slack=0.5) == []
+    assert 'throttled (429)' in saturated({**summary, 'throttle_rate': 0.2})
+    assert histogram([0.0005, 0.003, 9.0]) == {**{k: 0 for k in histogram([])}, 'le_1': 1, 'le_5': 1, 'gt_5000': 1}
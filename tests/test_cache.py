@@ -0,0 +1,91 @@
+import asyncio
+
+from src.cache import FieldCache, LRUTTLCache, etag_matches, make_etag
+
+
+class FakeAsyncRedis:
+    def __init__(self):
+        self.data = {}
+        self.published = []
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for k in keys:
+            self.data.pop(k, None)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+def test_lru_ttl_cache_evicts_oldest_and_expired():
+    c = LRUTTLCache(maxsize=2, ttl=60)
+    c.set('a', 1)
+    c.set('b', 2)
+    c.get('a')
+    c.set('c', 3)
+    assert c.get('b') is None
+    assert c.get('a') == 1 and c.get('c') == 3
+
+    c = LRUTTLCache(maxsize=2, ttl=-1)
+    c.set('a', 1)
+    assert c.get('a') is None
+
+
+def test_field_cache_reads_through_l2_and_invalidates_both_tiers():
+    async def scenario():
+        redis = FakeAsyncRedis()
+        writer, reader = FieldCache(), FieldCache()
+        writer.redis = reader.redis = redis
+
+        etag, body = await writer.set('doc:f1', b'{"_id":"f1"}')
+        assert etag == make_etag(body)
+        # another worker misses L1 and fills it from Redis
+        assert await reader.get('doc:f1') == (etag, body)
+        assert reader.l1.get('doc:f1') == (etag, body)
+
+        await writer.invalidate('list', 'doc:f1')
+        assert redis.data == {}
+        assert redis.published == [('cache:fields:invalidate', '["list", "doc:f1"]')]
+        assert await writer.get('doc:f1') is None
+
+    asyncio.run(scenario())
+
+
+def test_etag_matches_lists_and_weak_tags():
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches(None, '"abc"')
+    assert not etag_matches('"x"', '"abc"')
+
+
+def test_mongo_latest_sink_invalidates_cached_field_documents():
+    from src.pipeline.sinks import MongoLatestSink
+
+    class FakeMongo:
+        def update_latest_metrics_many(self, db_name, readings):
+            self.readings = list(readings)
+
+    class FakeRedis:
+        def __init__(self):
+            self.deleted, self.published = [], []
+
+        def delete(self, *keys):
+            self.deleted += keys
+
+        def publish(self, channel, message):
+            self.published.append((channel, message))
+
+    class FakeCache:
+        dry_run = False
+        client = FakeRedis()
+
+    sink = MongoLatestSink(FakeMongo(), cache=FakeCache())
+    sink.write([{'field_id': 'f1', 'metric_type': 'ndvi', 'metric_value': 0.5, 'sensor_ts': 't0'},
+                {'field_id': 'f1', 'metric_type': 'air_temp', 'metric_value': 20.0, 'sensor_ts': 't0'}])
+    assert FakeCache.client.deleted == ['cache:fields:list', 'cache:fields:doc:f1']
+    assert FakeCache.client.published == [('cache:fields:invalidate', '["list", "doc:f1"]')]
@@ -0,0 +1,524 @@
+import asyncio
+from datetime import datetime
+
+from src.clients.cassandra_client import (AsyncCassandraClientWrapper, CassandraClientWrapper, time_bucket,
+                                          timeseries_query)
+from src.clients.mongo_client import MongoClientWrapper
+from src.clients.neo4j_client import Neo4jClientWrapper
+from src.clients.redis_client import AsyncRedisClientWrapper, RedisClientWrapper
+from src.clients.registry import AsyncClientRegistry
+from src.rollups import rollup_partials
+
+
+class FakeFuture:
+    def __init__(self, error=None):
+        self.error = error
+
+    def result(self):
+        if self.error:
+            raise self.error
+        return []
+
+    def add_callbacks(self, callback, errback):
+        if self.error:
+            errback(self.error)
+        else:
+            callback([])
+
+
+class FakeCassandraSession:
+    def __init__(self):
+        self.prepared = []
+        self.executed = []
+
+    def prepare(self, q):
+        self.prepared.append(q)
+        return q
+
+    def execute_async(self, stmt, params=None):
+        self.executed.append((stmt, params))
+        return FakeFuture()
+
+
+def _rows(n, field_id='field_1'):
+    return [{
+        'field_id': field_id,
+        'sensor_ts': f'2025-12-10T12:{i:02d}:00Z',
+        'sensor_id': 'sensor_soil_moisture',
+        'metric_type': 'soil_moisture',
+        'metric_value': 10.0 + i,
+        'quality_flag': 0,
+    } for i in range(n)]
+
+
+def test_cassandra_bulk_insert_dry_run():
+    cass = CassandraClientWrapper(dry_run=True)
+    assert cass.insert_sensor_rows('sensor_data_by_field', _rows(3)) == 3
+
+
+def test_cassandra_bulk_insert_prepares_once():
+    cass = CassandraClientWrapper(dry_run=True)
+    cass.dry_run = False
+    cass.session = FakeCassandraSession()
+    written = cass.insert_sensor_rows('sensor_data_by_field', _rows(10), ttl=3600, concurrency=3)
+    assert written == 10
+    assert len(cass.session.prepared) == 1
+    assert 'USING TTL 3600' in cass.session.prepared[0]
+    # ISO strings are bound as datetimes
+    assert isinstance(cass.session.executed[0][1][1], datetime)
+
+
+def test_async_cassandra_bulk_insert_awaits_driver_futures():
+    cass = CassandraClientWrapper(dry_run=True)
+    cass.dry_run = False
+    cass.session = FakeCassandraSession()
+    acass = AsyncCassandraClientWrapper(cass)
+    written = asyncio.run(acass.insert_sensor_rows('sensor_data_by_field', _rows(10), concurrency=4))
+    assert written == 10
+    assert len(cass.session.executed) == 10
+    assert len(cass.session.prepared) == 1
+
+
+class FakeBound:
+    def __init__(self, params):
+        self.params = params
+        self.fetch_size = None
+
+
+class FakePrepared:
+    def bind(self, params):
+        return FakeBound(params)
+
+
+class FakeResultSet:
+    def __init__(self, rows, paging_state):
+        self.current_rows = rows
+        self.paging_state = paging_state
+
+
+class FakePagedFuture(FakeFuture):
+    def __init__(self, rows, paging_state):
+        super().__init__()
+        self.rs = FakeResultSet(rows, paging_state)
+
+    def result(self):
+        return self.rs
+
+
+class FakePagingSession:
+    """Serves `rows` in pages of the bound statement's fetch_size; paging state is the next offset."""
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute_async(self, bound, paging_state=None):
+        offset = int(paging_state or b'0')
+        end = offset + bound.fetch_size
+        return FakePagedFuture(self.rows[offset:end], str(end).encode() if end < len(self.rows) else None)
+
+
+def test_timeseries_query_pushes_filters_into_cql():
+    q, params = timeseries_query('by_metric', 'field_1', metric='ndvi', start='2025-12-01T00:00:00Z')
+    assert q.endswith('FROM by_metric WHERE field_id=? AND metric_type=? AND sensor_ts>=?')
+    assert params[:2] == ('field_1', 'ndvi') and isinstance(params[2], datetime)
+    q, params = timeseries_query('t', 'field_1', end=datetime(2025, 12, 2))
+    assert q.endswith('WHERE field_id=? AND sensor_ts<?') and len(params) == 2
+
+
+def test_async_cassandra_execute_page_returns_one_page_and_state():
+    cass = CassandraClientWrapper(dry_run=True)
+    cass.session = FakePagingSession(list(range(5)))
+    acass = AsyncCassandraClientWrapper(cass)
+
+    async def scenario():
+        pages, state = [], None
+        while True:
+            rows, state = await acass.execute_page(FakePrepared(), ('field_1',), fetch_size=2, paging_state=state)
+            pages.append(rows)
+            if state is None:
+                return pages
+
+    assert asyncio.run(scenario()) == [[0, 1], [2, 3], [4]]
+
+
+class FakeBucketSession(FakePagingSession):
+    """Rows per bucket (newest first); the bucket is the second bound parameter."""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.reads = 0
+
+    def prepare(self, q):
+        assert 'bucket=?' in q
+        return FakePrepared()
+
+    def execute_async(self, bound, paging_state=None):
+        self.reads += 1
+        self.rows = self.buckets.get(bound.params[1], [])
+        return super().execute_async(bound, paging_state)
+
+
+def test_bucketed_writes_route_rows_to_their_day():
+    cass = CassandraClientWrapper(dry_run=True, bucket='day')
+    cass.dry_run = False
+    cass.session = FakeCassandraSession()
+    rows = _rows(2) + [dict(_rows(1)[0], sensor_ts='2025-12-11T00:10:00Z')]
+    cass.insert_sensor_rows('t', rows)
+    assert cass.session.prepared[0].startswith('INSERT INTO t (field_id,sensor_ts,sensor_id,metric_type,metric_value,quality_flag,bucket)')
+    day = time_bucket('2025-12-10T12:00:00Z')
+    assert [params[-1] for _, params in cass.session.executed] == [day, day, day + 1]
+
+
+def test_bucketed_read_fans_out_and_resumes_in_order():
+    start, end = datetime(2025, 12, 1), datetime(2025, 12, 4)
+    b = time_bucket(end)
+    # newest bucket first; each bucket newest row first
+    data = {b: [], b - 1: ['d3-2', 'd3-1'], b - 2: ['d2-3', 'd2-2', 'd2-1'], b - 3: ['d1-1']}
+    cass = CassandraClientWrapper(dry_run=True, bucket='day')
+    cass.session = FakeBucketSession(data)
+    acass = AsyncCassandraClientWrapper(cass)
+
+    async def scenario():
+        pages, cursor = [], None
+        while True:
+            rows, cursor = await acass.read_buckets('t', 'field_1', start, end, limit=3, cursor=cursor)
+            pages.append(rows)
+            if cursor is None:
+                return pages
+
+    assert asyncio.run(scenario()) == [['d3-2', 'd3-1', 'd2-3'], ['d2-2', 'd2-1', 'd1-1']]
+
+
+class FakeRollupRow:
+    def __init__(self, agg):
+        (self.value_count, self.value_sum, self.value_min, self.value_max, self.value_last, self.last_ts,
+         self.readings) = agg
+
+
+class FakeRollupSession:
+    """Applies the rollup LWTs to `store`; `race` writes one competing update before the first merge."""
+    def __init__(self, store, race=None):
+        self.store = store
+        self.race = race
+        self.conditional = 0
+        self.updates = []
+
+    def prepare(self, q):
+        return q
+
+    def execute_async(self, q, params=None):
+        if q.startswith('SELECT'):
+            rows = [FakeRollupRow(self.store[params])] if params in self.store else []
+        elif q.endswith('IF NOT EXISTS'):
+            key, values = params[:3], params[3:]
+            applied = key not in self.store
+            if applied:
+                self.store[key] = values
+            rows = [(applied,)]
+        else:
+            self.conditional += 1
+            if self.race:
+                self.store.update(self.race)
+                self.race = None
+            values, key, expected = params[:7], params[7:10], params[10]
+            self.updates.append(values)
+            applied = self.store[key][0] == expected
+            if applied:
+                # readings=readings+? appends the fresh ids
+                self.store[key] = values[:6] + (set(self.store[key][6] or ()) | values[6],)
+            rows = [(applied,)]
+        return FakePagedFuture(rows, None)
+
+
+def _rollup_rows(*readings):
+    return [{'field_id': 'field_1', 'metric_type': 'soil_moisture', 'sensor_id': 's1', 'sensor_ts': ts,
+             'metric_value': value} for ts, value in readings]
+
+
+def _rollup_cassandra(store, race=None):
+    cass = CassandraClientWrapper(dry_run=True)
+    cass.dry_run = False
+    cass.session = FakeRollupSession(store, race)
+    return cass
+
+
+def test_merge_rollups_retries_lost_compare_and_merge():
+    key = ('field_1', 'soil_moisture', datetime(2025, 12, 10, 12))
+    ts = datetime(2025, 12, 10, 12, 5)
+    store = {key: (1, 10.0, 10.0, 10.0, 10.0, ts, {'2025-12-10T12:05:00|s1'})}
+    # another writer adds a reading between our read and our conditional update
+    race = {key: (2, 30.0, 10.0, 20.0, 20.0, ts.replace(minute=50),
+                  {'2025-12-10T12:05:00|s1', '2025-12-10T12:50:00|s1'})}
+    cass = _rollup_cassandra(store, race)
+    partials = rollup_partials(_rollup_rows((ts.replace(minute=20), 5.0), (ts.replace(hour=13), 5.0)), 'hour')
+    new_key = ('field_1', 'soil_moisture', datetime(2025, 12, 10, 13))
+    assert cass.merge_rollups('r', partials) == 2
+    assert store[key][:6] == (3, 35.0, 5.0, 20.0, 20.0, ts.replace(minute=50))
+    assert store[new_key][:6] == (1, 5.0, 5.0, 5.0, 5.0, ts.replace(hour=13))
+
+
+def test_merge_rollups_skips_readings_already_merged():
+    ts = datetime(2025, 12, 10, 12, 5)
+    key = ('field_1', 'soil_moisture', datetime(2025, 12, 10, 12))
+    store = {}
+    cass = _rollup_cassandra(store)
+    batch = _rollup_rows((ts, 10.0), (ts.replace(minute=20), 12.0))
+    cass.merge_rollups('r', rollup_partials(batch, 'hour'))
+    merged = store[key]
+    # a redelivered batch changes nothing; an overlapping one only adds its new reading
+    cass.merge_rollups('r', rollup_partials(batch, 'hour'))
+    assert store[key] == merged and cass.session.conditional == 0
+    cass.merge_rollups('r', rollup_partials(batch + _rollup_rows((ts.replace(minute=35), 8.0)), 'hour'))
+    assert store[key][:6] == (3, 30.0, 8.0, 12.0, 8.0, ts.replace(minute=35))
+    # only the new reading id is appended to the stored set
+    assert cass.session.updates[-1][6] == {'2025-12-10T12:35:00|s1'}
+    assert len(store[key][6]) == 3
+
+
+def test_async_registry_reuses_clients(monkeypatch):
+    for var in ('MONGO_URI', 'CASSANDRA_CONTACT_POINTS', 'REDIS_URL', 'REDIS_URI', 'NEO4J_URI'):
+        monkeypatch.delenv(var, raising=False)
+
+    async def scenario():
+        reg = AsyncClientRegistry()
+        cass = await reg.cassandra()
+        assert cass is await reg.cassandra()
+        assert cass.dry_run and (await reg.redis()).dry_run
+        await reg.close()
+
+    asyncio.run(scenario())
+
+
+def test_async_registry_backs_off_a_failing_client_without_blocking_others(monkeypatch):
+    monkeypatch.delenv('MONGO_URI', raising=False)
+    attempts = []
+
+    async def down():
+        attempts.append(1)
+        await asyncio.sleep(0.05)
+        raise ConnectionError('cassandra down')
+
+    async def scenario():
+        reg = AsyncClientRegistry(retry_backoff=60)
+        # mongo is not held up while cassandra is still trying to connect
+        slow = asyncio.ensure_future(reg._get('cassandra', down))
+        await asyncio.sleep(0)
+        assert (await reg.mongo()).dry_run and not slow.done()
+        assert await slow is None
+        # within the backoff no new connection attempt is made
+        assert await reg._get('cassandra', down) is None
+        assert len(attempts) == 1
+        await reg.close()
+
+    asyncio.run(scenario())
+
+
+class FakeRedisPipeline:
+    def __init__(self, sink):
+        self.sink = sink
+        self.commands = []
+
+    def hset(self, key, mapping=None):
+        self.commands.append(('HSET', key, mapping))
+
+    def xadd(self, stream, body, **options):
+        self.commands.append(('XADD', stream, body, options))
+
+    def execute(self):
+        self.sink.append(self.commands)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.executed = []
+
+    def pipeline(self, transaction=False):
+        return FakeRedisPipeline(self.executed)
+
+
+def test_redis_batch_merges_hashes_and_flushes_by_size():
+    r = RedisClientWrapper(dry_run=True)
+    r.dry_run = False
+    r.client = FakeRedis()
+    with r.batch(max_ops=4, max_interval=60) as b:
+        for i in range(6):
+            b.hset_latest('field_1', {'latest_soil_moisture': i})
+        b.push_alert('field_1', 'low_soil_moisture', {'value': 5})
+    # 4 buffered calls, then the remaining 3 on exit
+    assert len(r.client.executed) == 2
+    first, second = r.client.executed
+    assert first == [('HSET', 'field:field_1', {'latest_soil_moisture': 3})]
+    assert second[0] == ('HSET', 'field:field_1', {'latest_soil_moisture': 5})
+    assert second[1][0] == 'XADD'
+    # the alerts stream is capped on every add
+    assert second[1][3]['approximate'] and second[1][3]['maxlen'] > 0
+
+
+class FakeAsyncRedisPipeline(FakeRedisPipeline):
+    async def execute(self):
+        self.sink.append(self.commands)
+
+
+class FakeAsyncRedis(FakeRedis):
+    def pipeline(self, transaction=False):
+        return FakeAsyncRedisPipeline(self.executed)
+
+
+def test_async_redis_batch_flushes_on_exit():
+    r = AsyncRedisClientWrapper(dry_run=True)
+    r.dry_run = False
+    r.client = FakeAsyncRedis()
+
+    async def scenario():
+        async with r.batch() as b:
+            b.hset_latest('field_1', {'latest_ndvi': 0.5})
+            b.push_alert('field_1', 'ndvi_drop', {'value': 0.35})
+        return b
+
+    b = asyncio.run(scenario())
+    assert b.flushes == 1
+    assert len(r.client.executed[0]) == 2
+
+
+class FakeNeo4jTx:
+    def __init__(self, runs):
+        self.runs = runs
+
+    def run(self, query, **params):
+        self.runs.append((query, params))
+        return self
+
+    def consume(self):
+        return None
+
+
+class FakeNeo4jSession:
+    def __init__(self, runs):
+        self.runs = runs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, fn, *args):
+        return fn(FakeNeo4jTx(self.runs), *args)
+
+
+class FakeNeo4jDriver:
+    def __init__(self):
+        self.runs = []
+
+    def session(self):
+        return FakeNeo4jSession(self.runs)
+
+
+def test_neo4j_event_batch_uses_one_unwind_per_batch():
+    n = Neo4jClientWrapper(dry_run=True)
+    n.dry_run = False
+    n.driver = FakeNeo4jDriver()
+    with n.event_batch(batch_size=3, flush_interval=60) as batch:
+        for i in range(5):
+            batch.add_event('field_1', 'low_soil_moisture', {'value': i})
+    assert batch.written == 5
+    assert len(n.driver.runs) == 2
+    query, params = n.driver.runs[0]
+    assert 'UNWIND $events' in query
+    assert [e['props']['value'] for e in params['events']] == [0, 1, 2]
+
+
+class FakeMongoCollection:
+    def __init__(self):
+        self.bulk_calls = []
+
+    def bulk_write(self, requests, ordered=True):
+        self.bulk_calls.append((requests, ordered))
+
+
+class FakeMongoDb:
+    def __init__(self):
+        self.fields = FakeMongoCollection()
+
+
+def test_mongo_latest_metrics_are_coalesced_per_field():
+    mongo = MongoClientWrapper(dry_run=True)
+    mongo.dry_run = False
+    db = FakeMongoDb()
+    mongo.get_db = lambda name='pasture': db
+    # generator output is newest-first, so the newest value is not the last row
+    readings = [
+        {'field_id': 'field_1', 'metric_type': 'ndvi', 'metric_value': 0.7, 'sensor_ts': '2025-12-10T12:00:00'},
+        {'field_id': 'field_1', 'metric_type': 'ndvi', 'metric_value': 0.5, 'sensor_ts': '2025-12-10T11:00:00'},
+        {'field_id': 'field_1', 'metric_type': 'soil_moisture', 'metric_value': 12.0, 'sensor_ts': '2025-12-10T11:00:00'},
+        {'field_id': 'field_2', 'metric_type': 'ndvi', 'metric_value': 0.4, 'sensor_ts': '2025-12-10T11:00:00'},
+    ]
+    mongo.update_latest_metrics_many('pasture', readings)
+    requests, ordered = db.fields.bulk_calls[0]
+    assert ordered is False
+    assert len(requests) == 2
+    by_field = {r._filter['_id']: r._doc['$set'] for r in requests}
+    assert by_field['field_1'] == {'latest_metrics.ndvi': 0.7, 'latest_metrics.soil_moisture': 12.0}
+
+
+def test_latest_metric_updates_compare_timestamps_as_instants():
+    from datetime import datetime, timezone
+
+    from src.clients.mongo_client import _latest_metric_updates
+
+    def reading(value, ts):
+        return {'field_id': 'f', 'metric_type': 'ndvi', 'metric_value': value, 'sensor_ts': ts}
+
+    # compared as strings, the second reading of each pair would win
+    assert _latest_metric_updates([reading(1, '2025-12-10T11:30:00-01:00'), reading(2, '2025-12-10T12:00:00Z')]) \
+        == {'f': {'latest_metrics.ndvi': 1}}
+    assert _latest_metric_updates([reading(1, '2025-12-10T12:00:00.5+00:00'), reading(2, '2025-12-10T12:00:00Z')]) \
+        == {'f': {'latest_metrics.ndvi': 1}}
+    assert _latest_metric_updates([reading(1, '2025-12-10T12:00:00Z'),
+                                   reading(2, datetime(2025, 12, 10, 13, tzinfo=timezone.utc)),
+                                   reading(3, None)]) == {'f': {'latest_metrics.ndvi': 2}}
+
+
+def test_client_metrics_time_real_calls_and_skip_when_disabled(monkeypatch):
+    from src import metrics
+
+    r = RedisClientWrapper(dry_run=True)
+    r.dry_run = False
+    r.client = FakeRedis()
+    before = metrics.client_op_seconds.count('redis', 'pipeline')
+    with r.batch() as b:
+        b.hset_latest('field_1', {'latest_ndvi': 0.5})
+        b.push_alert('field_1', 'ndvi_drop', {'value': 0.35})
+    assert metrics.client_op_seconds.count('redis', 'pipeline') == before + 1
+    assert metrics.client_ops.value('redis', 'pipeline', 'ok') >= 1
+
+    monkeypatch.setattr(metrics, 'ENABLED', False)
+    with r.batch() as b:
+        b.hset_latest('field_1', {'latest_ndvi': 0.6})
+    assert metrics.client_op_seconds.count('redis', 'pipeline') == before + 1
+
+
+def test_mongo_bulk_field_upserts_are_instrumented():
+    from src import metrics
+
+    mongo = MongoClientWrapper(dry_run=True)
+    dry = metrics.client_rows.value('mongo', 'upsert_fields')
+    mongo.bulk_upsert_fields('pasture', [{'_id': 'field_1'}, {'_id': 'field_2'}])
+    assert metrics.client_rows.value('mongo', 'upsert_fields') == dry + 2
+
+    mongo.dry_run = False
+    db = FakeMongoDb()
+    mongo.get_db = lambda name='pasture': db
+    before = metrics.client_op_seconds.count('mongo', 'upsert_fields')
+    mongo.bulk_upsert_fields('pasture', [{'_id': 'field_1'}])
+    assert metrics.client_op_seconds.count('mongo', 'upsert_fields') == before + 1
+    assert len(db.fields.bulk_calls) == 1
+
+
+def test_bucket_migration_script_imports_and_dry_runs():
+    import importlib.util
+    import os
+
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'migrate_sensor_buckets.py')
+    spec = importlib.util.spec_from_file_location('migrate_sensor_buckets', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert module.migrate('sensor_data_by_field', 'sensor_data_by_field_daily', dry_run=True) == 0
@@ -0,0 +1,26 @@
+import math
+
+from src.columnar import HEADER, decode, encode, encode_frames
+
+
+def test_round_trip_groups_by_metric_across_frames():
+    rows = [
+        {'sensor_ts': '2025-12-10T12:00:00', 'metric_type': 'ndvi', 'metric_value': 0.5},
+        {'sensor_ts': '2025-12-10T12:00:00Z', 'metric_type': 'soil_moisture', 'metric_value': 11.25},
+        {'sensor_ts': '2025-12-10T11:00:00+00:00', 'metric_type': 'ndvi', 'metric_value': None},
+    ]
+    body = encode(rows[:2]) + encode_frames(rows[2:])
+    assert body.startswith(HEADER)
+    out = decode(body)
+    ms = 1765368000000
+    assert out['soil_moisture'] == ([ms], [11.25])
+    assert out['ndvi'][0] == [ms, ms - 3600000]
+    assert out['ndvi'][1][0] == 0.5 and math.isnan(out['ndvi'][1][1])
+
+
+def test_arrays_are_8_byte_aligned():
+    body = encode([{'sensor_ts': '2025-12-10T12:00:00', 'metric_type': 'air_temp', 'metric_value': 1.0}])
+    # header (8) + frame head (8) + 'air_temp' (8) needs no padding; the odd-length name below does
+    assert len(body) == 8 + 8 + 8 + 16
+    body = encode([{'sensor_ts': '2025-12-10T12:00:00', 'metric_type': 'ndvi', 'metric_value': 1.0}])
+    assert len(body) == 8 + 8 + 8 + 16
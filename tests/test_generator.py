@@ -11,3 +11,30 @@ def test_generate_series_length():
     rows = generate_sensor_series(field_id='field_test', periods=10, freq_minutes=60)
     # 4 sensors per timestamp
     assert len(rows) == 10 * 4
+
+
+def test_bulk_sensor_chunks_keep_schema_and_are_reproducible():
+    import json
+    from datetime import datetime
+    from src.generator import iter_bulk_sensor_chunks
+
+    start = datetime(2025, 12, 10, 6, 0, 0)
+    a = ''.join(iter_bulk_sensor_chunks(['field_1', 'field_2'], 25, start=start, seed=7, chunk_periods=10))
+    b = ''.join(iter_bulk_sensor_chunks(['field_1', 'field_2'], 25, start=start, seed=7, chunk_periods=4, processes=2))
+    assert a == b
+    rows = [json.loads(line) for line in a.splitlines()]
+    assert len(rows) == 2 * 25 * 4
+    reference = generate_sensor_series(field_id='field_1', start=start, periods=25)
+    assert [set(r) for r in rows[:100]] == [set(r) for r in reference]
+    assert [(r['sensor_ts'], r['metric_type']) for r in rows[:100]] == [(r['sensor_ts'], r['metric_type']) for r in reference]
+
+
+def test_bulk_sensor_chunks_accept_an_aware_start():
+    from datetime import datetime, timedelta, timezone
+    from src.generator import iter_bulk_sensor_chunks
+
+    aware = datetime(2025, 12, 10, 8, 0, 0, tzinfo=timezone(timedelta(hours=2)))
+    chunk = ''.join(iter_bulk_sensor_chunks(['field_1'], 2, start=aware, seed=7))
+    naive = ''.join(iter_bulk_sensor_chunks(['field_1'], 2, start=datetime(2025, 12, 10, 6, 0, 0), seed=7))
+    assert chunk == naive
+    assert '"sensor_ts": "2025-12-10T06:00:00"' in chunk
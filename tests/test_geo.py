@@ -0,0 +1,35 @@
+import math
+import random
+
+from src.generator import generate_field
+from src.geo import FieldIndex, STRTree, bbox_polygon, distance_to_geometry_m
+
+
+def test_str_tree_query_matches_brute_force():
+    rng = random.Random(3)
+    boxes = []
+    for i in range(500):
+        x, y = rng.uniform(-10, 10), rng.uniform(-10, 10)
+        boxes.append(((x, y, x + rng.uniform(0, 1), y + rng.uniform(0, 1)), i))
+    tree = STRTree(boxes, node_capacity=8)
+    for _ in range(20):
+        x, y = rng.uniform(-10, 10), rng.uniform(-10, 10)
+        q = (x, y, x + 2, y + 2)
+        expected = {i for b, i in boxes if b[0] <= q[2] and q[0] <= b[2] and b[1] <= q[3] and q[1] <= b[3]}
+        assert set(tree.query(q)) == expected
+
+
+def test_field_index_near_and_within():
+    docs = [generate_field(field_id=f'f{i}', center=(i * 0.1, 0.0)) for i in range(10)]
+    index = FieldIndex(docs)
+    assert len(index) == 10
+
+    # inside f2; the edges of f1 and f3 are 0.09 degrees (~10 km) away
+    hits = index.near(0.2, 0.0, radius=10100)
+    assert [d['_id'] for _, d in hits] == ['f2', 'f1', 'f3']
+    assert hits[0][0] == 0.0
+    assert math.isclose(hits[1][0], 0.09 * math.pi * 6371008.8 / 180, rel_tol=1e-6)
+
+    area = bbox_polygon((0.15, -0.05, 0.45, 0.05))
+    assert [d['_id'] for d in index.within(area)] == ['f2', 'f3', 'f4']
+    assert distance_to_geometry_m(0.2, 0.0, area) == 0.0
@@ -0,0 +1,80 @@
+from src.clients.mongo_client import INDEXES, MongoClientWrapper
+from src.index_advisor import QUERIES, assess, check_queries, plan_stages
+
+
+def _explain(plan):
+    return {'queryPlanner': {'winningPlan': plan}}
+
+
+COVERED = {'stage': 'PROJECTION_COVERED',
+           'inputStage': {'stage': 'IXSCAN', 'indexName': 'ndvi_threshold_covering'}}
+FETCHED = {'stage': 'PROJECTION_SIMPLE',
+           'inputStage': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'farm_id_1'}}}
+SCAN = {'stage': 'COLLSCAN'}
+
+
+def test_assess_flags_collscan_and_uncovered_plans():
+    low_ndvi = next(q for q in QUERIES if q['name'] == 'low_ndvi_fields')
+    by_farm = next(q for q in QUERIES if q['name'] == 'fields_by_farm')
+    assert plan_stages(FETCHED) == ['PROJECTION_SIMPLE', 'FETCH', 'IXSCAN']
+    ok = assess(low_ndvi, _explain(COVERED))
+    assert ok['problems'] == [] and ok['indexes'] == ['ndvi_threshold_covering']
+    assert assess(low_ndvi, _explain(FETCHED))['problems'] == ['not covered (FETCH)']
+    assert assess(by_farm, _explain(FETCHED))['problems'] == []
+    assert assess(by_farm, _explain(SCAN))['problems'] == ['COLLSCAN']
+    # slot-based engine nests the classic plan under queryPlan
+    assert assess(by_farm, _explain({'queryPlan': SCAN}))['problems'] == ['COLLSCAN']
+
+
+class FakeDb:
+    def __init__(self):
+        self.commands = []
+
+    def command(self, command):
+        self.commands.append(command)
+        return _explain(SCAN)
+
+
+def test_check_queries_explains_without_executing():
+    db = FakeDb()
+    results = check_queries(db, QUERIES[:2])
+    assert [r['problems'] for r in results] == [['COLLSCAN'], ['COLLSCAN']]
+    assert all(c['verbosity'] == 'queryPlanner' for c in db.commands)
+    assert db.commands[0]['explain']['projection'] == QUERIES[0]['projection']
+
+
+class FakeIndexedCollection:
+    def __init__(self, info):
+        self.info = info
+        self.created = []
+
+    def index_information(self):
+        return self.info
+
+    def create_index(self, keys, name=None, **options):
+        self.created.append(name)
+        self.info[name] = {'key': keys}
+
+
+def test_create_indexes_is_idempotent():
+    mongo = MongoClientWrapper(dry_run=True)
+    mongo.dry_run = False
+    # an index created by hand, with float directions, under another name
+    fields = FakeIndexedCollection({'_id_': {'key': [('_id', 1)]}, 'farm': {'key': [('farm_id', 1.0)]}})
+    mongo.get_db = lambda name='pasture': {'fields': fields}
+    report = mongo.create_indexes('pasture')['fields']
+    assert 'farm_id_1' in report['existing']
+    assert sorted(report['created']) == sorted(i['name'] for i in INDEXES['fields'] if i['name'] != 'farm_id_1')
+    again = mongo.create_indexes('pasture')['fields']
+    assert again['created'] == [] and fields.created == report['created']
+
+
+def test_check_script_imports():
+    import importlib.util
+    import os
+
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'check_mongo_indexes.py')
+    spec = importlib.util.spec_from_file_location('check_mongo_indexes', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert callable(module.main)
@@ -0,0 +1,92 @@
+import asyncio
+
+from src.ingest_queue import IngestWorkers, MemoryIngestQueue
+
+
+def _rows(n, field_id='field_1'):
+    return [{'field_id': field_id, 'metric_type': 'ndvi', 'metric_value': 0.5, 'sensor_ts': '2025-12-10T12:00:00'}] * n
+
+
+def test_workers_batch_rows_across_requests_and_release_depth():
+    batches = []
+
+    async def handler(rows):
+        batches.append(len(rows))
+
+    async def scenario():
+        workers = IngestWorkers(MemoryIngestQueue(), handler, workers=1, batch_rows=10, linger=0.5)
+        await workers.start()
+        for _ in range(5):
+            assert await workers.admit(_rows(2)) is None
+        for _ in range(100):
+            if sum(batches) == 10:
+                break
+            await asyncio.sleep(0.01)
+        depth = await workers.queue.depth()
+        await workers.stop()
+        return depth
+
+    assert asyncio.run(scenario()) == 0
+    # five requests of two rows arrive well within the linger window, so they land in one batch
+    assert batches == [10]
+
+
+def test_admit_refuses_rows_past_the_depth_limit():
+    async def handler(rows):
+        pass
+
+    async def scenario():
+        workers = IngestWorkers(MemoryIngestQueue(), handler, workers=0, max_depth=5)
+        await workers.start()
+        first = await workers.admit(_rows(4))
+        second = await workers.admit(_rows(2))
+        return first, second, await workers.queue.depth()
+
+    first, retry_after, depth = asyncio.run(scenario())
+    assert first is None and retry_after >= 1 and depth == 4
+
+
+class FakeStreamRedis:
+    """Pending entries for `xpending_range`; the registered scripts only record their calls."""
+
+    def __init__(self, pending):
+        self.pending = pending
+        self.calls = []
+
+    def register_script(self, script):
+        name = 'dead_letter' if 'XADD' in script else 'ack'
+
+        async def run(keys, args):
+            self.calls.append((name, keys, args))
+        return run
+
+    async def xpending_range(self, name, groupname, min, max, count, idle=None):
+        return self.pending
+
+    async def xautoclaim(self, name, groupname, consumername, min_idle_time, start_id, count):
+        return [b'0-0', [], []]
+
+    async def xreadgroup(self, groupname, consumername, streams, count, block):
+        return []
+
+
+def test_stream_queue_dead_letters_entries_past_the_delivery_cap():
+    from src.ingest_queue import RedisStreamIngestQueue
+
+    redis = FakeStreamRedis([
+        {'message_id': b'1-0', 'consumer': b'c', 'time_since_delivered': 90000, 'times_delivered': 5},
+        {'message_id': b'2-0', 'consumer': b'c', 'time_since_delivered': 90000, 'times_delivered': 2},
+    ])
+    queue = RedisStreamIngestQueue(redis, consumer='c', max_deliveries=5)
+    assert asyncio.run(queue.get(10, block=0.01)) == []
+    assert redis.calls == [('dead_letter', ['ingest:sensors', 'ingest:sensors:dead', 'ingest:sensors:rows'],
+                            ['ingest-workers', '1-0', 5])]
+
+
+def test_redis_queue_setting_falls_back_to_memory_without_redis(monkeypatch):
+    from src.api import _make_ingest_queue
+    from src.clients.redis_client import AsyncRedisClientWrapper
+
+    monkeypatch.setenv('INGEST_QUEUE', 'redis')
+    assert isinstance(_make_ingest_queue(None), MemoryIngestQueue)
+    assert isinstance(_make_ingest_queue(AsyncRedisClientWrapper(dry_run=True)), MemoryIngestQueue)
@@ -0,0 +1,127 @@
+import json
+import threading
+
+from src.clients.redis_client import RedisClientWrapper
+from src.generator import generate_sensor_series
+from src.pipeline import CassandraSink, IngestEngine, RedisAggregateSink, Stage
+
+
+class RecordingSink:
+    max_workers = None
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = []
+        self._lock = threading.Lock()
+
+    def setup(self):
+        pass
+
+    def write(self, batch):
+        with self._lock:
+            self.rows.extend(batch)
+
+
+def _write_jsonl(path, rows):
+    with open(path, 'w') as fh:
+        for r in rows:
+            fh.write(json.dumps(r) + '\n')
+
+
+def test_engine_fans_every_row_out_to_every_stage(tmp_path):
+    path = tmp_path / 'sensors.jsonl'
+    _write_jsonl(path, generate_sensor_series(field_id='field_1', periods=25))
+    a, b = RecordingSink('a'), RecordingSink('b')
+    engine = IngestEngine([Stage(a, workers=3, queue_size=2), Stage(b)], batch_size=7)
+    report = engine.run([str(path)])
+    assert report['rows_read'] == 100
+    assert len(a.rows) == len(b.rows) == 100
+    assert report['stages']['a']['batches'] == 15
+    assert report['stages']['b']['errors'] == 0
+
+
+def test_ordered_sink_runs_single_worker():
+    stage = Stage(RedisAggregateSink(RedisClientWrapper(dry_run=True)), workers=4)
+    assert stage.workers == 1
+
+
+def test_split_ranges_align_on_lines_and_route_keeps_field_order(tmp_path):
+    from src.pipeline.parallel import _route_range, shard_for, split_ranges
+    rows = []
+    for fid in ('field_1', 'field_2', 'field_3'):
+        rows.extend(generate_sensor_series(field_id=fid, periods=10))
+    path = tmp_path / 'sensors.jsonl'
+    _write_jsonl(path, rows)
+
+    ranges = split_ranges(str(path), chunk_bytes=500)
+    assert ranges[0][0] == 0 and ranges[-1][1] == path.stat().st_size
+    routed = [[] for _ in range(2)]
+    for start, end in ranges:
+        for shard, blob in enumerate(_route_range((str(path), start, end, 2))):
+            routed[shard].extend(json.loads(l) for l in blob.splitlines())
+    assert sum(len(r) for r in routed) == len(rows)
+    for fid in ('field_1', 'field_2', 'field_3'):
+        shard_rows = [r for r in routed[shard_for(fid, 2)] if r['field_id'] == fid]
+        assert shard_rows == [r for r in rows if r['field_id'] == fid]
+
+
+def test_run_parallel_dry_run(tmp_path):
+    from src.pipeline.parallel import run_parallel
+    path = tmp_path / 'sensors.jsonl'
+    _write_jsonl(path, generate_sensor_series(field_id='field_1', periods=5) + generate_sensor_series(field_id='field_2', periods=5))
+    report = run_parallel([str(path)], shards=2, readers=1, chunk_bytes=400, sinks=('redis',), dry_run=True)
+    assert report['rows_read'] == 40
+    assert report['stages']['redis']['rows'] == 40
+    assert not report['errors']
+
+
+def test_cli_exits_non_zero_when_a_sink_fails(tmp_path, monkeypatch):
+    from click.testing import CliRunner
+
+    from src.pipeline import cli
+
+    class FailingSink(RecordingSink):
+        def write(self, batch):
+            raise ConnectionError('store down')
+
+    path = tmp_path / 'sensors.jsonl'
+    _write_jsonl(path, generate_sensor_series(field_id='field_1', periods=5))
+    monkeypatch.setattr(cli, 'build_engine', lambda **options: (
+        IngestEngine([Stage(RecordingSink('ok')), Stage(FailingSink('bad'))]), []))
+    result = CliRunner().invoke(cli.main, [str(path)])
+    assert result.exit_code == 1
+    assert 'errors 1' in result.output
+
+
+def test_dead_shard_stops_feeding_and_is_reported_missing(monkeypatch):
+    import queue
+
+    import pytest
+
+    from src.pipeline import parallel
+
+    class ExitedShard:
+        def __init__(self, name, exitcode):
+            self.name, self.exitcode = name, exitcode
+
+        def is_alive(self):
+            return False
+
+    monkeypatch.setattr(parallel, '_POLL', 0.01)
+    full = queue.Queue(maxsize=1)
+    full.put('blob')
+    with pytest.raises(RuntimeError, match='shard-1 exited with code -9'):
+        parallel._put(full, ExitedShard('shard-1', -9), 'more')
+
+    outbox = queue.Queue()
+    outbox.put({'shard': 'shard-0', 'rows_read': 3, 'parse_seconds': 0.0, 'stages': {}})
+    reports, missing = parallel._collect(outbox, [ExitedShard('shard-0', 0), ExitedShard('shard-1', -9)])
+    assert [r['shard'] for r in reports] == ['shard-0']
+    assert missing == ['shard-1 exited with code -9 without a report']
+    assert parallel.merge_reports(reports, 1.0, missing)['errors'] == missing
+
+
+def test_cassandra_sink_ttl_follows_sensor_ttl_days(monkeypatch):
+    monkeypatch.setenv('SENSOR_TTL_DAYS', '30')
+    assert CassandraSink(None).ttl == 30 * 24 * 3600
+    assert CassandraSink(None, ttl=60).ttl == 60
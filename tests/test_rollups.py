@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+from src.rollups import choose_resolution, merge_rollup, period_start, rollup_partials
+
+
+def _row(ts, value, metric='soil_moisture', field_id='field_1'):
+    return {'field_id': field_id, 'sensor_ts': ts, 'metric_type': metric, 'metric_value': value}
+
+
+def test_partials_group_by_period_and_keep_latest_value():
+    rows = [_row('2025-12-10T12:40:00Z', 12.0), _row('2025-12-10T12:05:00Z', 10.0),
+            _row('2025-12-10T13:00:00Z', 11.0), _row('2025-12-10T12:20:00', 14.0, metric='air_temp')]
+    hourly = rollup_partials(rows, 'hour')
+    agg = hourly[('field_1', 'soil_moisture', datetime(2025, 12, 10, 12))]
+    assert (agg['count'], agg['sum'], agg['min'], agg['max']) == (2, 22.0, 10.0, 12.0)
+    # last follows sensor time, not row order
+    assert agg['last'] == 12.0 and agg['last_ts'] == datetime(2025, 12, 10, 12, 40)
+    assert len(hourly) == 3
+
+    daily = rollup_partials(rows, 'day')
+    assert daily[('field_1', 'soil_moisture', datetime(2025, 12, 10))]['count'] == 3
+
+
+def test_merging_partials_matches_one_pass():
+    rows = [_row(f'2025-12-10T12:{m:02d}:00', float(m)) for m in range(0, 60, 5)]
+    key = ('field_1', 'soil_moisture', datetime(2025, 12, 10, 12))
+    whole = rollup_partials(rows, 'hour')[key]
+    merged = merge_rollup(rollup_partials(rows[6:], 'hour')[key], rollup_partials(rows[:6], 'hour')[key])
+    assert merged == whole
+
+
+def test_choose_resolution_by_span():
+    end = datetime(2025, 12, 10)
+    assert choose_resolution(None, end) == 'raw'
+    assert choose_resolution(end - timedelta(hours=36), end) == 'raw'
+    assert choose_resolution(end - timedelta(days=30), end) == 'hour'
+    assert choose_resolution(end - timedelta(days=200), end) == 'day'
+    assert period_start('2025-12-10T23:59:59+02:00', 'day') == datetime(2025, 12, 10)
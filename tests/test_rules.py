@@ -0,0 +1,171 @@
+import pytest
+
+from src.pipeline.aggregates import RollingAggregator
+from src.rules import AlertStateConflict, MemoryAlertState, RuleEngine, RuleSet, load_rules
+
+
+def _rows(metric, values, field_id='f', hours=False):
+    return [{'field_id': field_id, 'metric_type': metric, 'metric_value': v,
+             'sensor_ts': f'2024-05-01T{i:02d}:00:00' if hours else f't{i}'}
+            for i, v in enumerate(values)]
+
+
+def test_bundled_event_rules_report_entered_once_per_episode():
+    engine = RuleEngine(load_rules().for_sink('events'))
+    rows = (_rows('soil_moisture', [25.0, 19.0, 7.5, 21.0]) + _rows('ndvi', [0.5, 0.3])
+            + _rows('air_temp', [31.0, 29.0]) + _rows('grass_height', [3.0]))
+    got, _ = engine.evaluate(rows)
+    assert got == [
+        ('f', 'LOW_MOISTURE', {'value': 19.0, 'ts': 't1', 'state': 'entered', 'severity': 'medium'}),
+        ('f', 'low_ndvi', {'value': 0.3, 'ts': 't1', 'state': 'entered', 'baseline': 0.55}),
+        ('f', 'high_temperature', {'value': 31.0, 'ts': 't0', 'state': 'entered'}),
+        ('f', 'low_grass_height', {'value': 3.0, 'ts': 't0', 'state': 'entered'}),
+    ]
+
+
+def test_hysteresis_and_state_carry_across_batches():
+    rules = RuleSet.from_dicts([
+        {'name': 'dry', 'metric': 'soil_moisture', 'op': '<', 'threshold': 10.0, 'clear': 12.0},
+    ])
+    state = MemoryAlertState()
+    engine = RuleEngine(rules, state=state)
+    first, changed = engine.evaluate(_rows('soil_moisture', [9.0, 10.5, 9.5]))
+    # nothing is saved until the caller has written the matches
+    assert state.load_alert_states(['f'])['f'] == {}
+    engine.commit(changed)
+    # a new engine (another process) picks the state up from the store
+    other = RuleEngine(rules, state=state)
+    second, changed = other.evaluate(_rows('soil_moisture', [11.9, 12.0, 9.0]))
+    other.commit(changed)
+    assert [(p['ts'], p['state']) for _, _, p in first] == [('t0', 'entered')]
+    assert [(p['ts'], p['state']) for _, _, p in second] == [('t1', 'cleared'), ('t2', 'entered')]
+    assert state.load_alert_states(['f'])['f']['events:dry']['active'] is True
+
+
+def test_cooldown_mutes_a_quick_reentry_and_its_clear():
+    rules = RuleSet.from_dicts([
+        {'name': 'dry', 'metric': 'soil_moisture', 'op': '<', 'threshold': 10.0, 'cooldown': 3 * 3600},
+    ])
+    got, _ = RuleEngine(rules).evaluate(_rows('soil_moisture', [9.0, 11.0, 9.0, 11.0, 11.0, 9.0], hours=True))
+    assert [(p['ts'][11:13], p['state']) for _, _, p in got] == [('00', 'entered'), ('01', 'cleared'), ('05', 'entered')]
+
+
+def test_threshold_env_overrides_rule_and_moves_clear_level(monkeypatch):
+    monkeypatch.setenv('MOISTURE_CRITICAL', '10')
+    engine = RuleEngine(load_rules().for_sink('events'))
+    got, _ = engine.evaluate(_rows('soil_moisture', [9.0, 11.0, 12.5]))
+    assert [(p['value'], p['state']) for _, _, p in got] == [(9.0, 'entered'), (12.5, 'cleared')]
+
+
+def test_level_rules_match_every_reading_with_window_predicates():
+    rules = RuleSet.from_dicts([
+        {'name': 'dry_spell', 'metric': 'soil_moisture', 'op': '<', 'threshold': 10.0, 'trigger': 'level',
+         'where': [{'stat': 'max', 'window': 3, 'op': '<', 'threshold': 12.0}]},
+    ])
+    engine = RuleEngine(rules)
+    assert engine.ordered
+    # the 3-reading max only drops below 12 once the 15 leaves the window
+    first, _ = engine.evaluate(_rows('soil_moisture', [15.0, 9.0, 9.0]))
+    second, _ = engine.evaluate(_rows('soil_moisture', [9.0, 9.5, 11.0, 9.0]))
+    assert first == []
+    assert [p['value'] for _, _, p in second] == [9.0, 9.5, 9.0]
+    assert all('state' not in p for _, _, p in second)
+
+
+def test_aggregator_alerts_use_rolling_mean_rule():
+    agg = RollingAggregator(window=3, rules=RuleSet.from_dicts([
+        {'name': 'low_avg', 'metric': 'soil_moisture', 'stat': 'mean', 'window': 3, 'op': '<',
+         'threshold': 10.0, 'sink': 'alerts'},
+    ]))
+    alerts = agg.update(_rows('soil_moisture', [12.0, 9.0, 8.0, 7.0])).alerts
+    assert alerts == [('f', 'low_avg', {'value': pytest.approx(29.0 / 3), 'ts': 't2', 'state': 'entered'})]
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError):
+        RuleSet.from_dicts([{'name': 'x', 'metric': 'ndvi', 'op': '!=', 'threshold': 1}])
+    with pytest.raises(ValueError):
+        RuleSet.from_dicts([{'name': 'x', 'metric': 'ndvi', 'op': '<', 'threshold': 1, 'stat': 'mean'}])
+    with pytest.raises(ValueError):
+        RuleSet.from_dicts([{'name': 'x', 'metric': 'ndvi', 'op': '<', 'threshold': 1, 'clear': 0.5}])
+
+
+def test_event_sink_keeps_state_when_the_write_fails():
+    from src.pipeline.sinks import Neo4jEventSink
+
+    class FlakyEvents:
+        fail = True
+        written = []
+
+        def event_batch(self, batch_size):
+            return self
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            if FlakyEvents.fail:
+                FlakyEvents.fail = False
+                raise ConnectionError('neo4j down')
+
+        def add_event(self, field_id, event_type, props):
+            FlakyEvents.written.append((event_type, props['state']))
+
+    rules = RuleSet.from_dicts([{'name': 'dry', 'metric': 'soil_moisture', 'op': '<', 'threshold': 10.0}])
+    sink = Neo4jEventSink(FlakyEvents(), rules=rules)
+    batch = _rows('soil_moisture', [9.0])
+    with pytest.raises(ConnectionError):
+        sink.write(batch)
+    # the retried batch reports the transition again, and only then is it saved
+    sink.write(batch)
+    sink.write(batch)
+    assert FlakyEvents.written == [('dry', 'entered'), ('dry', 'entered')]
+
+
+def test_concurrent_batches_of_a_field_report_a_transition_once():
+    import asyncio
+
+    rules = RuleSet.from_dicts([{'name': 'dry', 'metric': 'soil_moisture', 'op': '<', 'threshold': 10.0}])
+    engine = RuleEngine(rules)
+    reported = []
+
+    async def worker(values):
+        rows = _rows('soil_moisture', values)
+        async with engine.alocked(rows):
+            matches, changed = engine.evaluate(rows)
+            # the sink write yields to the other worker before the state is saved
+            await asyncio.sleep(0.01)
+            reported.extend(matches)
+            engine.commit(changed)
+
+    async def scenario():
+        await asyncio.gather(worker([9.0]), worker([8.0]))
+
+    asyncio.run(scenario())
+    assert [p['state'] for _, _, p in reported] == ['entered']
+
+
+def test_overlapping_commits_from_two_processes_conflict():
+    rules = RuleSet.from_dicts([{'name': 'dry', 'metric': 'soil_moisture', 'op': '<', 'threshold': 10.0}])
+    state = MemoryAlertState()
+    a, b = RuleEngine(rules, state=state), RuleEngine(rules, state=state)
+    first, changed_a = a.evaluate(_rows('soil_moisture', [9.0]))
+    second, changed_b = b.evaluate(_rows('soil_moisture', [8.0]))
+    a.commit(changed_a)
+    with pytest.raises(AlertStateConflict):
+        b.commit(changed_b)
+    # the redelivered batch sees the saved state and reports nothing new
+    retried, changed_b = b.evaluate(_rows('soil_moisture', [8.0]))
+    b.commit(changed_b)
+    assert [p['state'] for _, _, p in first + second] == ['entered', 'entered']
+    assert retried == []
+
+
+def test_window_carry_keeps_only_the_most_recent_series():
+    rules = RuleSet.from_dicts([
+        {'name': 'low_avg', 'metric': 'soil_moisture', 'stat': 'mean', 'window': 3, 'op': '<', 'threshold': 10.0},
+    ])
+    engine = RuleEngine(rules, max_carry=2)
+    for fid in ('a', 'b', 'a', 'c'):
+        engine.evaluate(_rows('soil_moisture', [9.0], field_id=fid))
+    assert list(engine._carry) == [('a', 'soil_moisture'), ('c', 'soil_moisture')]